@@ -363,7 +363,7 @@ class LTI13CallbackHandler(BaseHandler):
         Overrides the upstream post handler.
         """
         try:
-            id_token = self.decode_and_validate_launch_request()
+            id_token = await self.decode_and_validate_launch_request()
         except InvalidAudienceError as e:
             raise HTTPError(401, reason=str(e))
         except ValidationError as e:
@@ -384,7 +384,7 @@ class LTI13CallbackHandler(BaseHandler):
         self.redirect(next_url)
         self.log.debug(f"Redirecting user {user.name} to {next_url}")
 
-    def decode_and_validate_launch_request(self) -> Dict[str, Any]:
+    async def decode_and_validate_launch_request(self) -> Dict[str, Any]:
         """Decrypt, verify and validate launch request parameters.
 
         Raises subclasses of `ValidationError` of `HTTPError` if anything fails.
@@ -404,7 +404,7 @@ class LTI13CallbackHandler(BaseHandler):
         # constructed in `LTI13LoginInitHandler.post`, prevents CSRF
         self.check_state()
 
-        id_token = validator.verify_and_decode_jwt(
+        id_token = await validator.verify_and_decode_jwt(
             encoded_jwt=args.get("id_token"),
             issuer=self.authenticator.issuer,
             audience=self.authenticator.client_id,
@@ -1,8 +1,12 @@
+import asyncio
+import json
+import time
 from calendar import timegm
 from datetime import datetime, timezone
-from typing import Any, Dict, Iterable
+from typing import Any, Dict, Iterable, Optional, Tuple
 
 import jwt
+from tornado.httpclient import AsyncHTTPClient
 from traitlets import Int
 from traitlets.config import LoggingConfigurable
 
@@ -25,6 +29,88 @@ def now() -> int:
     return timegm(datetime.now(tz=timezone.utc).utctimetuple())
 
 
+class JWKSCache:
+    """Process-wide cache of the JSON Web Key Sets of LTI platforms.
+
+    Key sets are fetched asynchronously once per endpoint and reused until
+    they are older than the TTL. Concurrent launches wait for a single fetch.
+    If a token is signed with an unknown key id, e.g. because the platform
+    rotated its keys, the key set is fetched again, but at most once per
+    ``refresh_interval`` seconds so that forged key ids cannot be used to
+    flood the platform with requests.
+    """
+
+    def __init__(self):
+        self._key_sets: Dict[str, Tuple[float, jwt.PyJWKSet]] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    async def get_signing_key(
+        self, jwks_endpoint: str, kid: Optional[str], ttl: float, refresh_interval: float
+    ) -> jwt.PyJWK:
+        fetched_at, key_set = await self._get_key_set(jwks_endpoint, ttl)
+        signing_key = self._match_kid(key_set, kid)
+        if signing_key is None and time.monotonic() - fetched_at >= refresh_interval:
+            _, key_set = await self._get_key_set(jwks_endpoint, ttl, stale_before=fetched_at)
+            signing_key = self._match_kid(key_set, kid)
+        if signing_key is None:
+            raise jwt.PyJWKClientError(f'Unable to find a signing key that matches: "{kid}"')
+        return signing_key
+
+    def clear(self) -> None:
+        self._key_sets.clear()
+        self._locks.clear()
+
+    async def _get_key_set(
+        self, jwks_endpoint: str, ttl: float, stale_before: Optional[float] = None
+    ) -> Tuple[float, jwt.PyJWKSet]:
+        """Returns the cached key set of the endpoint and the time it was fetched.
+        Fetches it if it is missing, expired or was fetched at or before ``stale_before``.
+        """
+
+        def is_fresh(entry):
+            return (
+                entry is not None
+                and time.monotonic() - entry[0] < ttl
+                and (stale_before is None or entry[0] > stale_before)
+            )
+
+        entry = self._key_sets.get(jwks_endpoint)
+        if is_fresh(entry):
+            return entry
+        lock = self._locks.setdefault(jwks_endpoint, asyncio.Lock())
+        async with lock:
+            # another launch might have fetched the key set while we were waiting
+            entry = self._key_sets.get(jwks_endpoint)
+            if is_fresh(entry):
+                return entry
+            entry = (time.monotonic(), await self._fetch(jwks_endpoint))
+            self._key_sets[jwks_endpoint] = entry
+            return entry
+
+    @staticmethod
+    async def _fetch(jwks_endpoint: str) -> jwt.PyJWKSet:
+        try:
+            response = await AsyncHTTPClient().fetch(
+                jwks_endpoint, headers={"Accept": "application/json"}
+            )
+            data = json.loads(response.body)
+        except Exception as e:
+            raise jwt.PyJWKClientConnectionError(
+                f'Fail to fetch data from the url, err: "{e}"'
+            ) from e
+        return jwt.PyJWKSet.from_dict(data)
+
+    @staticmethod
+    def _match_kid(key_set: jwt.PyJWKSet, kid: Optional[str]) -> Optional[jwt.PyJWK]:
+        for key in key_set.keys:
+            if key.public_key_use in ("sig", None) and key.key_id and key.key_id == kid:
+                return key
+        return None
+
+
+jwks_cache = JWKSCache()
+
+
 class LTI13LaunchValidator(LoggingConfigurable):
     """
     Allows JupyterHub to verify LTI 1.3 compatible requests as a tool (known as a tool
@@ -49,6 +135,23 @@ class LTI13LaunchValidator(LoggingConfigurable):
         """,
     )
 
+    jwks_cache_ttl = Int(
+        3600,
+        config=True,
+        help="""
+        Seconds the JSON Web Key Set of a platform is cached.
+        """,
+    )
+
+    jwks_refresh_interval = Int(
+        30,
+        config=True,
+        help="""
+        Minimum number of seconds between fetches of a JSON Web Key Set
+        triggered by an unknown key id.
+        """,
+    )
+
     def validate_login_request(self, args: Dict[str, Any]) -> None:
         """
         Validates the initial authentication request and ensures the required
@@ -89,13 +192,13 @@ class LTI13LaunchValidator(LoggingConfigurable):
         self._check_arg_not_missing(args, required)
         self._check_arg_not_empty(args, required)
 
-    def verify_and_decode_jwt(
+    async def verify_and_decode_jwt(
         self, encoded_jwt, issuer, audience, jwks_endpoint, jwks_algorithms, **kwargs
     ):
         """
         Verify the JWT against the public keys provided in a JSON Web Key Set
         endpoint provided by the platform, and then return the payload in the
-        jwt.
+        jwt. The key sets are cached, see `JWKSCache`.
         """
         if not issuer:
             self.log.warning("No issuer identifyer configured")
@@ -108,8 +211,13 @@ class LTI13LaunchValidator(LoggingConfigurable):
 
         try:
             if verification_options["verify_signature"]:
-                jwks_client = jwt.PyJWKClient(jwks_endpoint)
-                signing_key = jwks_client.get_signing_key_from_jwt(encoded_jwt)
+                kid = jwt.get_unverified_header(encoded_jwt).get("kid")
+                signing_key = await jwks_cache.get_signing_key(
+                    jwks_endpoint,
+                    kid,
+                    ttl=self.jwks_cache_ttl,
+                    refresh_interval=self.jwks_refresh_interval,
+                )
                 key = signing_key.key
             else:
                 key = ""
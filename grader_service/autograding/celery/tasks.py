@@ -1,4 +1,5 @@
 import asyncio
+from http import HTTPStatus
 from typing import Union
 
 from celery import Celery, Task
@@ -7,6 +8,9 @@ from tornado.web import HTTPError
 from grader_service.autograding.celery.app import CeleryApp
 from grader_service.autograding.local_feedback import LocalFeedbackExecutor
 from grader_service.handlers.base_handler import RequestHandlerConfig
+from grader_service.orm.assignment import Assignment
+from grader_service.orm.base import DeleteState
+from grader_service.orm.lti_sync_queue import LTISyncBatch, LTISyncQueue
 from grader_service.orm.submission import FeedbackStatus, Submission
 from grader_service.plugins.lti import LTISyncGrades
 
@@ -105,6 +109,19 @@ def lti_sync_task(
     if lti_plugin.check_if_lti_enabled(
         lecture, assignment, submissions, feedback_sync=feedback_sync
     ):
+        if feedback_sync and lti_plugin.feedback_sync_window > 0:
+            # collect the submissions and sync them together with the ones of other
+            # feedback generations of the assignment
+            sub_ids = [submission["id"] for submission in submissions]
+            LTISyncQueue.push(self.session, assignment["id"], sub_ids)
+            if LTISyncBatch.schedule(
+                self.session, assignment["id"], lti_plugin.feedback_sync_window
+            ):
+                lti_sync_batch_task.apply_async(
+                    (lecture["id"], assignment["id"]), countdown=lti_plugin.feedback_sync_window
+                )
+            self.log.info(f"Queued LTI grade synchronisation of submissions {sub_ids}")
+            return None
         try:
             results = asyncio.run(lti_plugin.start(lecture, assignment, submissions))
             return results
@@ -123,3 +140,94 @@ def lti_sync_task(
             # else tell the user that the plugin is disabled
             raise HTTPError(403, reason="LTI plugin is not enabled by administator.")
     return None
+
+
+@app.task(bind=True, base=GraderTask)
+def lti_sync_batch_task(self: GraderTask, lecture_id: int, assignment_id: int) -> Union[dict, None]:
+    """Syncs all submissions of an assignment queued by feedback generations as one batch.
+    If several submissions of a user are queued, only the latest one is synced. The queued
+    entries are only removed once the sync succeeded, otherwise they are retried with
+    exponential backoff until LTISyncGrades.feedback_sync_max_attempts is reached.
+    Entries rejected by the platform with an error that does not go away by retrying,
+    i.e. a 4xx response other than 429, are dropped immediately.
+    :param lecture_id: id of the lecture
+    :param assignment_id: id of the assignment
+    """
+    lti_plugin = LTISyncGrades.instance()
+    try:
+        entry_ids, sub_ids = LTISyncQueue.peek(self.session, assignment_id)
+        assignment = self.session.get(Assignment, assignment_id)
+        if assignment is None or assignment.lecture.id != lecture_id:
+            LTISyncQueue.remove(self.session, entry_ids)
+            raise ValueError(f"invalid assignment {assignment_id=:}, {lecture_id=:}")
+        submissions = (
+            self.session.query(Submission)
+            .filter(Submission.id.in_(sub_ids), Submission.deleted == DeleteState.active)
+            .order_by(Submission.date)
+            .all()
+        )
+        latest = {submission.user_id: submission for submission in submissions}
+        if len(latest) == 0:
+            LTISyncQueue.remove(self.session, entry_ids)
+            return None
+
+        lecture_model = assignment.lecture.serialize()
+        assignment_model = assignment.serialize()
+        submissions_model = [submission.serialize_with_user() for submission in latest.values()]
+        if not lti_plugin.check_if_lti_enabled(
+            lecture_model, assignment_model, submissions_model, feedback_sync=True
+        ):
+            self.log.info("Skipping LTI grade synchronisation, because it is not enabled")
+            LTISyncQueue.remove(self.session, entry_ids)
+            return None
+        self.log.info(f"Syncing {len(submissions_model)} queued submissions to LTI platform")
+        try:
+            results = asyncio.run(
+                lti_plugin.start(lecture_model, assignment_model, submissions_model)
+            )
+        except HTTPError as e:
+            self.session.rollback()
+            if e.status_code < 500 and e.status_code != HTTPStatus.TOO_MANY_REQUESTS:
+                self.log.error(
+                    f"Dropping LTI grade synchronisation of submissions {sub_ids}: {e.reason}"
+                )
+                LTISyncQueue.remove(self.session, entry_ids)
+            else:
+                self.log.info(f"Could not sync grades: {e.reason}")
+                LTISyncQueue.record_failure(self.session, entry_ids)
+            raise e
+        except Exception as e:
+            self.log.error("Could not sync grades: " + str(e))
+            self.session.rollback()
+            LTISyncQueue.record_failure(self.session, entry_ids)
+            raise HTTPError(500, reason="An unexpected error occured.")
+        LTISyncQueue.remove(self.session, entry_ids)
+        return results
+    finally:
+        self.session.rollback()
+        _schedule_next_lti_sync_batch(self, lti_plugin, lecture_id, assignment_id)
+
+
+def _schedule_next_lti_sync_batch(
+    task: GraderTask, lti_plugin: LTISyncGrades, lecture_id: int, assignment_id: int
+) -> None:
+    """Schedules the batch sync of the submissions queued while a batch was running and
+    of the ones of a failed sync, unless another batch is already scheduled.
+    """
+    dropped = LTISyncQueue.drop_exhausted(
+        task.session, assignment_id, lti_plugin.feedback_sync_max_attempts
+    )
+    if dropped:
+        task.log.error(
+            f"Giving up LTI grade synchronisation of submissions {dropped} after "
+            f"{lti_plugin.feedback_sync_max_attempts} attempts"
+        )
+    # the claim has to be released before checking for pending entries, otherwise entries
+    # queued in between would neither be synced by this nor by a new batch
+    LTISyncBatch.release(task.session, assignment_id)
+    attempts = LTISyncQueue.pending_attempts(task.session, assignment_id)
+    if attempts is None:
+        return
+    countdown = lti_plugin.feedback_sync_window * 2**attempts
+    if LTISyncBatch.schedule(task.session, assignment_id, countdown):
+        lti_sync_batch_task.apply_async((lecture_id, assignment_id), countdown=countdown)
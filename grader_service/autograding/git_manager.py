@@ -8,6 +8,7 @@ from traitlets.config import LoggingConfigurable
 from grader_service.autograding.utils import executable_validator
 from grader_service.handlers.handler_utils import GitRepoType
 from grader_service.orm import Assignment, Lecture, Submission
+from grader_service.shared_objects import share_objects
 
 
 class GitSubmissionManager(LoggingConfigurable):
@@ -47,6 +48,8 @@ class GitSubmissionManager(LoggingConfigurable):
             path = os.path.join(base_repo_path, str(self.submission.id))
         elif repo_type == GitRepoType.USER:
             path = os.path.join(base_repo_path, repo_name)
+        elif repo_type == GitRepoType.RELEASE:
+            path = base_repo_path
         else:
             raise ValueError(f"Cannot determine repo path for repo type {repo_type}")
 
@@ -91,6 +94,7 @@ class GitSubmissionManager(LoggingConfigurable):
         if not os.path.exists(output_repo_path):
             os.makedirs(output_repo_path)
             self._run_git([self.git_executable, "init", "--bare", output_repo_path], output_path)
+            self._share_release_objects(output_repo_path)
 
         self.log.info(f"Initialising repo at {output_path}")
         self._run_git([self.git_executable, "init"], output_path)
@@ -99,6 +103,14 @@ class GitSubmissionManager(LoggingConfigurable):
         self._run_git(command, output_path)
         self.log.info(f"Now at branch {self.output_branch}")
 
+    def _share_release_objects(self, repo_path: str) -> None:
+        """Lets the new repository borrow the objects of the release repository,
+        if shared-object mode is enabled."""
+        from grader_service.handlers.base_handler import RequestHandlerConfig
+
+        if RequestHandlerConfig.instance().git_share_release_objects:
+            share_objects(repo_path, self._get_repo_path(GitRepoType.RELEASE))
+
     def _commit_files(self, filenames: List[str], output_path: str) -> None:
         """
         Commits the provided files in the repo at `output_path`.
@@ -24,6 +24,7 @@ from grader_service.convert.converters.autograde import Autograde
 from grader_service.convert.gradebook.models import GradeBookModel
 from grader_service.orm.assignment import Assignment
 from grader_service.orm.submission import AutoStatus, ManualStatus, Submission
+from grader_service.orm.submission_grade import SubmissionGrade
 from grader_service.orm.submission_logs import SubmissionLogs
 from grader_service.orm.submission_properties import SubmissionProperties
 
@@ -262,7 +263,7 @@ class LocalAutogradeExecutor(LoggingConfigurable):
     def _set_properties(self) -> None:
         """
         Loads the contents of the gradebook.json file
-        and sets them as the submission properties.
+        and sets them as the submission properties and per-cell grades.
         Also calculates the score of the submission
         after autograding based on the updated properties.
 
@@ -277,6 +278,7 @@ class LocalAutogradeExecutor(LoggingConfigurable):
 
         gradebook_dict = json.loads(gradebook_str)
         book = GradeBookModel.from_dict(gradebook_dict)
+        SubmissionGrade.replace(self.session, self.submission.id, book)
         score = 0
         for id, n in book.notebooks.items():
             score += n.score
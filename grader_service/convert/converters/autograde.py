@@ -1,7 +1,13 @@
+import datetime
 import os
-from typing import Any
+import sys
+from typing import Any, Tuple
 
-from traitlets import List
+import nbformat
+from nbconvert.exporters import Exporter
+from nbconvert.exporters.exporter import ResourcesDict
+from nbformat.notebooknode import NotebookNode
+from traitlets import Bool, List
 
 from grader_service.api.models.assignment_settings import AssignmentSettings
 from grader_service.convert import utils
@@ -33,6 +39,12 @@ class Autograde(BaseConverter):
 
     preprocessors = List([])
 
+    sanitize_checkpoint = Bool(
+        False,
+        help="Write the sanitized notebook to the output directory before it is autograded, "
+        "so that it is kept if autograding fails. Otherwise it is only passed in memory.",
+    ).tag(config=True)
+
     def _init_preprocessors(self) -> None:
         self.exporter._preprocessors = []
         if self._sanitizing:
@@ -56,20 +68,53 @@ class Autograde(BaseConverter):
         self.log.info("Sanitizing %s", notebook_filename)
         self._sanitizing = True
         self._init_preprocessors()
-        super().convert_single_notebook(notebook_filename)
-
-        notebook_filename = os.path.join(
-            self.writer.build_directory, os.path.basename(notebook_filename)
+        resources = self.init_single_notebook_resources(notebook_filename)
+        self._init_notebook_metadata(
+            resources, notebook_filename, os.path.dirname(notebook_filename)
+        )
+        nb, resources = self._preprocess_notebook(
+            nbformat.read(notebook_filename, as_version=4), resources
         )
+        if self.sanitize_checkpoint:
+            self.write_single_notebook(nbformat.writes(nb), resources)
+
+        # the sanitized notebook is autograded as if it was read from the output directory
         self.log.info("Autograding %s", notebook_filename)
         self._sanitizing = False
         self._init_preprocessors()
+        resources = self.init_single_notebook_resources(notebook_filename)
+        self._init_notebook_metadata(resources, notebook_filename, self._output_directory)
         try:
             with utils.setenv(NBGRADER_EXECUTION="autograde"):
-                super().convert_single_notebook(notebook_filename)
+                output, resources = self.exporter.from_notebook_node(nb, resources=resources)
+                self.write_single_notebook(output, resources)
         finally:
             self._sanitizing = True
 
+    @staticmethod
+    def _init_notebook_metadata(
+        resources: ResourcesDict, notebook_filename: str, path: str
+    ) -> None:
+        """Sets the name, path and modified date of the notebook like Exporter.from_filename,
+        as if the notebook was read from path.
+        """
+        if not resources.get("metadata"):
+            resources["metadata"] = ResourcesDict()
+        modified_date = datetime.datetime.fromtimestamp(
+            os.path.getmtime(notebook_filename), tz=datetime.timezone.utc
+        )
+        date_format = "%B %d, %Y" if sys.platform == "win32" else "%B %-d, %Y"
+        resources["metadata"]["name"] = os.path.splitext(os.path.basename(notebook_filename))[0]
+        resources["metadata"]["path"] = path
+        resources["metadata"]["modified_date"] = modified_date.strftime(date_format)
+
+    def _preprocess_notebook(
+        self, nb: NotebookNode, resources: ResourcesDict
+    ) -> Tuple[NotebookNode, ResourcesDict]:
+        # Exporter.from_notebook_node only runs the preprocessors, the exporter class
+        # would serialize the notebook
+        return Exporter.from_notebook_node(self.exporter, nb, resources=resources)
+
     def convert_notebooks(self) -> None:
         # check for missing notebooks and give them a score of zero if they do not exist
         json_path = os.path.join(self._output_directory, "gradebook.json")
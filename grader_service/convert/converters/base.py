@@ -15,8 +15,13 @@ from traitlets import Any, Bool, Instance, Integer, List, TraitError, Type, defa
 from traitlets.config import LoggingConfigurable
 
 from grader_service.api.models.assignment_settings import AssignmentSettings
+from grader_service.convert import utils
 from grader_service.convert.gradebook.gradebook import Gradebook
-from grader_service.convert.nbgraderformat import SchemaTooNewError, SchemaTooOldError
+from grader_service.convert.nbgraderformat import (
+    MetadataValidator,
+    SchemaTooNewError,
+    SchemaTooOldError,
+)
 from grader_service.convert.nbgraderformat.common import ValidationError
 from grader_service.convert.preprocessors.execute import UnresponsiveKernelError
 
@@ -169,6 +174,8 @@ class BaseConverter(LoggingConfigurable):
             self.convert_notebooks()
         finally:
             os.chdir(currdir)
+            utils.clear_checksum_cache()
+            MetadataValidator.clear_validation_cache()
 
     @default("classes")
     def _classes_default(self):
@@ -1,14 +1,29 @@
+import hashlib
 import json
 import os
+from functools import lru_cache
+from typing import Any, ClassVar, Dict, Optional, Set, Tuple
 
 import jsonschema
 from jsonschema import ValidationError  # noqa: F401
+from jsonschema.exceptions import best_match
+from jsonschema.protocols import Validator
 from nbformat.notebooknode import NotebookNode
 from traitlets.config import LoggingConfigurable
 
 root = os.path.dirname(__file__)
 
 
+@lru_cache(maxsize=None)
+def load_schema(schema_version: int) -> Tuple[Dict[str, Any], Validator]:
+    """Loads the schema of the version and compiles its validator once per process."""
+    with open(os.path.join(root, "v{:d}.json".format(schema_version)), "r") as fh:
+        schema = json.loads(fh.read())
+    cls = jsonschema.validators.validator_for(schema)
+    cls.check_schema(schema)
+    return schema, cls(schema)
+
+
 class SchemaMismatchError(Exception):
     def __init__(self, message, actual_version, expected_version):
         super(SchemaMismatchError, self).__init__(message)
@@ -25,9 +40,17 @@ class SchemaTooNewError(SchemaMismatchError):
 
 
 class BaseMetadataValidator(LoggingConfigurable):
+    #: checksums of the cells that passed validate_cell, shared by all validators until
+    #: clear_validation_cache is called, e.g. at the end of a conversion
+    _valid_cells: ClassVar[Set[str]] = set()
+    max_valid_cells: ClassVar[int] = 100000
+
+    @classmethod
+    def clear_validation_cache(cls) -> None:
+        BaseMetadataValidator._valid_cells.clear()
+
     def __init__(self) -> None:
-        with open(os.path.join(root, "v{:d}.json".format(self.schema_version)), "r") as fh:
-            self.schema = json.loads(fh.read())
+        self.schema, self._validator = load_schema(self.schema_version)
 
     def _remove_extra_keys(self, cell: NotebookNode) -> None:
         meta = cell.metadata["nbgrader"]
@@ -64,8 +87,31 @@ class BaseMetadataValidator(LoggingConfigurable):
                 schema,
                 self.schema_version,
             )
-        jsonschema.validate(cell.metadata["nbgrader"], self.schema)
+        error = best_match(self._validator.iter_errors(cell.metadata["nbgrader"]))
+        if error is not None:
+            raise error
+
+    def _cell_checksum(self, cell: NotebookNode) -> Optional[str]:
+        # validate_cell only depends on the cell type and the nbgrader metadata
+        if "nbgrader" not in cell.metadata:
+            return None
+        m = hashlib.md5()
+        m.update(type(self).__name__.encode("utf-8"))
+        m.update(cell.cell_type.encode("utf-8"))
+        m.update(json.dumps(cell.metadata["nbgrader"], sort_keys=True).encode("utf-8"))
+        return m.hexdigest()
 
-    def validate_nb(self, nb: NotebookNode) -> None:
+    def validate_nb(self, nb: NotebookNode) -> int:
+        """Validates the cells of the notebook and returns the number of cells that were
+        validated. Cells that passed the validation before without changes are skipped."""
+        validated = 0
         for cell in nb.cells:
+            checksum = self._cell_checksum(cell)
+            if checksum is None or checksum in self._valid_cells:
+                continue
             self.validate_cell(cell)
+            validated += 1
+            if len(self._valid_cells) >= self.max_valid_cells:
+                self._valid_cells.clear()
+            self._valid_cells.add(checksum)
+        return validated
@@ -101,8 +101,8 @@ class MetadataValidatorV1(BaseMetadataValidator):
                 "Markdown solution cell is not marked as a grade cell: {}".format(cell.source)
             )
 
-    def validate_nb(self, nb: NotebookNode) -> None:
-        super(MetadataValidatorV1, self).validate_nb(nb)
+    def validate_nb(self, nb: NotebookNode) -> int:
+        validated = super(MetadataValidatorV1, self).validate_nb(nb)
 
         ids = set([])
         for cell in nb.cells:
@@ -121,6 +121,8 @@ class MetadataValidatorV1(BaseMetadataValidator):
                 raise ValidationError("Duplicate grade id: {}".format(grade_id))
             ids.add(grade_id)
 
+        return validated
+
 
 def read_v1(source: typing.TextIO, as_version: int, **kwargs: typing.Any) -> NotebookNode:
     nb = _read(source, as_version, **kwargs)
@@ -94,8 +94,8 @@ class MetadataValidatorV2(BaseMetadataValidator):
                 "Markdown solution cell is not marked as a grade cell: {}".format(cell.source)
             )
 
-    def validate_nb(self, nb: NotebookNode) -> None:
-        super(MetadataValidatorV2, self).validate_nb(nb)
+    def validate_nb(self, nb: NotebookNode) -> int:
+        validated = super(MetadataValidatorV2, self).validate_nb(nb)
 
         ids = set([])
         for cell in nb.cells:
@@ -114,6 +114,8 @@ class MetadataValidatorV2(BaseMetadataValidator):
                 raise ValidationError("Duplicate grade id: {}".format(grade_id))
             ids.add(grade_id)
 
+        return validated
+
 
 def read_v2(source: typing.TextIO, as_version: int, **kwargs: typing.Any) -> NotebookNode:
     nb = _read(source, as_version, **kwargs)
@@ -100,8 +100,8 @@ class MetadataValidatorV3(BaseMetadataValidator):
             if cell.cell_type != "markdown":
                 raise ValidationError("Task cells have to be markdown: {}".format(cell.source))
 
-    def validate_nb(self, nb: NotebookNode) -> None:
-        super(MetadataValidatorV3, self).validate_nb(nb)
+    def validate_nb(self, nb: NotebookNode) -> int:
+        validated = super(MetadataValidatorV3, self).validate_nb(nb)
 
         ids = set([])
         for cell in nb.cells:
@@ -120,6 +120,8 @@ class MetadataValidatorV3(BaseMetadataValidator):
                 raise ValidationError("Duplicate grade id: {}".format(grade_id))
             ids.add(grade_id)
 
+        return validated
+
 
 def read_v3(source: typing.TextIO, as_version: int, **kwargs: typing.Any) -> NotebookNode:
     nb = _read(source, as_version, **kwargs)
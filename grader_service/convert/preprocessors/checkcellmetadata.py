@@ -1,3 +1,4 @@
+import time
 import traceback
 from typing import Dict, Tuple
 
@@ -11,12 +12,20 @@ class CheckCellMetadata(NbGraderPreprocessor):
     """A preprocessor for checking that grade ids are unique."""
 
     def preprocess(self, nb: NotebookNode, resources: Dict) -> Tuple[NotebookNode, Dict]:
+        start = time.perf_counter()
         try:
-            MetadataValidator().validate_nb(nb)
+            validated = MetadataValidator().validate_nb(nb)
         except ValidationError as e:
             self.log.error(traceback.format_exc())
             msg = "Notebook failed to validate: " + e.message
             self.log.error(msg)
             raise ValidationError(msg)
 
+        self.log.debug(
+            "Validated metadata of %d of %d cells of %s in %.3fs",
+            validated,
+            len(nb.cells),
+            resources.get("unique_key", "notebook"),
+            time.perf_counter() - start,
+        )
         return nb, resources
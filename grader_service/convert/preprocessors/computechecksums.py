@@ -2,6 +2,7 @@ from typing import Tuple
 
 from nbconvert.exporters.exporter import ResourcesDict
 from nbformat.notebooknode import NotebookNode
+from traitlets import Enum
 
 from grader_service.convert import utils
 from grader_service.convert.preprocessors.base import NbGraderPreprocessor
@@ -10,12 +11,19 @@ from grader_service.convert.preprocessors.base import NbGraderPreprocessor
 class ComputeChecksums(NbGraderPreprocessor):
     """A preprocessor to compute checksums of grade cells."""
 
+    checksum_algorithm = Enum(
+        list(utils.CHECKSUM_ALGORITHMS),
+        "md5",
+        help="The hash algorithm of the checksums. Checksums computed with another "
+        "algorithm are still verified with their own algorithm.",
+    ).tag(config=True)
+
     def preprocess_cell(
         self, cell: NotebookNode, resources: ResourcesDict, cell_index: int
     ) -> Tuple[NotebookNode, ResourcesDict]:
         # compute checksums of grade cell and solution cells
         if utils.is_grade(cell) or utils.is_solution(cell) or utils.is_locked(cell):
-            checksum = utils.compute_checksum(cell)
+            checksum = utils.compute_checksum(cell, self.checksum_algorithm)
             cell.metadata.nbgrader["checksum"] = checksum
             cell.metadata.nbgrader["cell_type"] = cell.cell_type
 
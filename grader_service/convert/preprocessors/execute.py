@@ -14,6 +14,18 @@ class UnresponsiveKernelError(Exception):
     pass
 
 
+TRUNCATED_MESSAGE = "... Output truncated ..."
+
+
+class _OutputBudget:
+    __slots__ = ("bytes", "lines", "truncated")
+
+    def __init__(self) -> None:
+        self.bytes = 0
+        self.lines = 0
+        self.truncated = False
+
+
 class Execute(NbGraderPreprocessor, ExecutePreprocessor):
     interrupt_on_timeout = Bool(True)
     allow_errors = Bool(True)
@@ -40,6 +52,28 @@ class Execute(NbGraderPreprocessor, ExecutePreprocessor):
         ),
     ).tag(config=True)
 
+    max_output_bytes = Integer(
+        10 * 1024 * 1024,
+        help=dedent(
+            """
+            The maximum number of bytes of stream and display output of a cell that is kept
+            while the cell is executed. Further output is dropped as it arrives from the
+            kernel (-1 means no limit).
+            """
+        ),
+    ).tag(config=True)
+
+    max_output_lines = Integer(
+        10000,
+        help=dedent(
+            """
+            The maximum number of lines of stream output of a cell that is kept while the
+            cell is executed. Further output is dropped as it arrives from the kernel
+            (-1 means no limit). LimitOutput truncates the output further.
+            """
+        ),
+    ).tag(config=True)
+
     def preprocess(
         self, nb: NotebookNode, resources: ResourcesDict, retries: Optional[Any] = None
     ) -> Tuple[NotebookNode, ResourcesDict]:
@@ -73,3 +107,74 @@ class Execute(NbGraderPreprocessor, ExecutePreprocessor):
             f"CellTimeoutInterrupt: Cell execution timed out after maximum execution time of {self.timeout} seconds."
         ]
         cell.outputs.append(error_output)
+
+    def reset_execution_trackers(self) -> None:
+        super().reset_execution_trackers()
+        self._output_budgets: t.Dict[int, _OutputBudget] = {}
+
+    def clear_output(
+        self, outs: t.List[NotebookNode], msg: t.Dict[str, t.Any], cell_index: int
+    ) -> None:
+        super().clear_output(outs, msg, cell_index)
+        if not outs:
+            self._output_budgets.pop(cell_index, None)
+
+    def output(
+        self,
+        outs: t.List[NotebookNode],
+        msg: t.Dict[str, t.Any],
+        display_id: Optional[str],
+        cell_index: int,
+    ) -> Optional[NotebookNode]:
+        if self.clear_before_next_output:
+            self._output_budgets.pop(cell_index, None)
+        out = super().output(outs, msg, display_id, cell_index)
+        if out is None:
+            return out
+        budget = self._output_budgets.setdefault(cell_index, _OutputBudget())
+        if out.output_type == "stream":
+            if budget.truncated:
+                # the stream output is the last one, so the indices of display ids stay valid
+                outs.pop()
+                return None
+            self._limit_stream(out, budget)
+        elif out.output_type in ("display_data", "execute_result"):
+            self._limit_display(out, budget)
+        return out
+
+    def _limit_stream(self, out: NotebookNode, budget: _OutputBudget) -> None:
+        text = out.text
+        size = len(text.encode("utf-8"))
+        lines = text.count("\n")
+        budget.bytes += size
+        budget.lines += lines
+        over_bytes = -1 < self.max_output_bytes < budget.bytes
+        over_lines = -1 < self.max_output_lines < budget.lines
+        if not (over_bytes or over_lines):
+            return
+
+        if over_lines:
+            # keep the lines up to the limit without splitting the whole text
+            end = -1
+            for _ in range(self.max_output_lines - (budget.lines - lines)):
+                end = text.find("\n", end + 1)
+            text = text[: end + 1]
+        if over_bytes:
+            remaining = self.max_output_bytes - (budget.bytes - size)
+            text = text.encode("utf-8")[:remaining].decode("utf-8", errors="ignore")
+        if text and not text.endswith("\n"):
+            text += "\n"
+        out.text = text + TRUNCATED_MESSAGE + "\n"
+        budget.truncated = True
+        self.log.warning("Truncated the output of a cell while executing it")
+
+    def _limit_display(self, out: NotebookNode, budget: _OutputBudget) -> None:
+        size = sum(len(value) for value in out.data.values() if isinstance(value, str))
+        budget.bytes += size
+        if budget.truncated or -1 < self.max_output_bytes < budget.bytes:
+            # display outputs are kept so that the indices of display ids stay valid
+            out.data = NotebookNode({"text/plain": TRUNCATED_MESSAGE})
+            out.metadata = NotebookNode()
+            if not budget.truncated:
+                budget.truncated = True
+                self.log.warning("Truncated the output of a cell while executing it")
@@ -29,13 +29,19 @@ class LimitOutput(NbGraderPreprocessor):
                 if length == self.max_lines:
                     continue
 
-                text = output.text.split("\n")
-                if (len(text) + length) > self.max_lines:
-                    text = text[: (self.max_lines - length - 1)]
-                    text.append("... Output truncated ...")
-
-                length += len(text)
-                output.text = "\n".join(text)
+                text = output.text
+                lines = text.count("\n") + 1
+                if (lines + length) > self.max_lines:
+                    # keep the first lines without splitting the whole text
+                    keep = self.max_lines - length - 1
+                    end = -1
+                    for _ in range(keep):
+                        end = text.find("\n", end + 1)
+                    head = text[:end] + "\n" if keep > 0 else ""
+                    output.text = head + "... Output truncated ..."
+                    lines = keep + 1
+
+                length += lines
 
             new_outputs.append(output)
 
@@ -266,14 +266,15 @@ class OverwriteCells(NbGraderPreprocessor):
         # if it's locked, check that the checksum hasn't changed
         if source_cell.locked:
             old_checksum = source_cell.checksum
-            new_checksum = utils.compute_checksum(cell)
+            algorithm = utils.checksum_algorithm(old_checksum)
+            new_checksum = utils.compute_checksum(cell, algorithm)
             if old_checksum != new_checksum:
                 self.log.info(
                     "Source of cell {} in overwritten order to prove checksum.".format(grade_id)
                 )
                 cell.source = source_cell.source
                 # check the checksum is correct now
-                double_checksum = utils.compute_checksum(cell)
+                double_checksum = utils.compute_checksum(cell, algorithm)
                 if double_checksum != old_checksum:
                     self.log.error(
                         "Checksums of the cell {} and source cell {} are not the same.".format(
@@ -54,8 +54,8 @@ class SaveAutoGrades(NbGraderPreprocessor):
         comment = self.gradebook.find_comment(
             cell.metadata["nbgrader"]["grade_id"], self.notebook_id
         )
-        if cell.metadata.nbgrader.get("checksum", None) == utils.compute_checksum(
-            cell
+        if utils.verify_checksum(
+            cell, cell.metadata.nbgrader.get("checksum", None)
         ) and not utils.is_task(cell):
             comment.auto_comment = "No response."
         else:
@@ -13,6 +13,7 @@ import tarfile
 import traceback
 import zipfile
 from datetime import datetime
+from functools import lru_cache
 from logging import Logger
 from typing import Any, Iterator, List, Optional, Tuple, Union
 
@@ -147,9 +148,7 @@ def determine_grade(cell: NotebookNode, log: Logger = None) -> Tuple[Optional[fl
         # if it's a solution cell and the checksum hasn't changed, that means
         # they didn't provide a response, so we can automatically give this a
         # zero grade
-        if "checksum" in cell.metadata.nbgrader and cell.metadata.nbgrader[
-            "checksum"
-        ] == compute_checksum(cell):
+        if verify_checksum(cell, cell.metadata.nbgrader.get("checksum")):
             return 0, max_points
         else:
             return None, max_points
@@ -185,25 +184,93 @@ def to_bytes(string: str) -> bytes:
     return bytes(string.encode("utf-8"))
 
 
-def compute_checksum(cell: NotebookNode) -> str:
-    m = hashlib.md5()
+#: algorithms of the cell checksums, checksums other than md5 are prefixed with the algorithm
+CHECKSUM_ALGORITHMS = ("md5", "blake2b")
+
+
+@lru_cache(maxsize=4096)
+def _checksum(
+    source: str,
+    cell_type: str,
+    grade: str,
+    solution: str,
+    locked: str,
+    grade_id: str,
+    points: Optional[str],
+    algorithm: str,
+) -> str:
+    if algorithm == "md5":
+        m = hashlib.md5()
+    elif algorithm == "blake2b":
+        m = hashlib.blake2b(digest_size=16)
+    else:
+        raise ValueError("unknown checksum algorithm: {}".format(algorithm))
     # add the cell source and type
-    m.update(to_bytes(cell.source))
-    m.update(to_bytes(cell.cell_type))
+    m.update(to_bytes(source))
+    m.update(to_bytes(cell_type))
 
     # add whether it's a grade cell and/or solution cell
-    m.update(to_bytes(str(is_grade(cell))))
-    m.update(to_bytes(str(is_solution(cell))))
-    m.update(to_bytes(str(is_locked(cell))))
+    m.update(to_bytes(grade))
+    m.update(to_bytes(solution))
+    m.update(to_bytes(locked))
 
     # include the cell id
-    m.update(to_bytes(cell.metadata.nbgrader["grade_id"]))
+    m.update(to_bytes(grade_id))
 
     # include the number of points that the cell is worth, if it is a grade cell
-    if is_grade(cell):
-        m.update(to_bytes(str(float(cell.metadata.nbgrader["points"]))))
+    if points is not None:
+        m.update(to_bytes(points))
+
+    if algorithm == "md5":
+        return m.hexdigest()
+    return "{}:{}".format(algorithm, m.hexdigest())
+
+
+def compute_checksum(cell: NotebookNode, algorithm: str = "md5") -> str:
+    """Computes the checksum of a grade, solution or locked cell. The checksums of the
+    cells of a conversion are cached by their contents."""
+    # same as is_grade, is_solution and is_locked, but without the slow attribute access
+    # of NotebookNode
+    nbgrader = cell["metadata"]["nbgrader"]
+    grade = nbgrader.get("grade", False)
+    solution = nbgrader.get("solution", False)
+    if solution:
+        locked = False
+    elif grade:
+        locked = True
+    else:
+        locked = nbgrader.get("locked", False)
+    return _checksum(
+        cell["source"],
+        cell["cell_type"],
+        str(grade),
+        str(solution),
+        str(locked),
+        nbgrader["grade_id"],
+        str(float(nbgrader["points"])) if grade else None,
+        algorithm,
+    )
+
+
+def checksum_algorithm(checksum: str) -> str:
+    """Returns the algorithm the checksum was computed with."""
+    algorithm, _, _ = checksum.rpartition(":")
+    return algorithm or "md5"
+
+
+def verify_checksum(cell: NotebookNode, checksum: Optional[str]) -> bool:
+    """Returns True if the checksum, computed with any of the CHECKSUM_ALGORITHMS,
+    matches the cell."""
+    if not checksum:
+        return False
+    algorithm = checksum_algorithm(checksum)
+    if algorithm not in CHECKSUM_ALGORITHMS:
+        return False
+    return compute_checksum(cell, algorithm) == checksum
 
-    return m.hexdigest()
+
+def clear_checksum_cache() -> None:
+    _checksum.cache_clear()
 
 
 def parse_utc(ts: Union[datetime, str]) -> datetime:
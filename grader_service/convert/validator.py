@@ -214,9 +214,7 @@ class Validator(LoggingConfigurable):
 
             # verify checksums of cells
             if utils.is_locked(cell) and "checksum" in cell.metadata.nbgrader:
-                old_checksum = cell.metadata.nbgrader["checksum"]
-                new_checksum = utils.compute_checksum(cell)
-                if old_checksum != new_checksum:
+                if not utils.verify_checksum(cell, cell.metadata.nbgrader["checksum"]):
                     changed.append(cell)
 
         return changed
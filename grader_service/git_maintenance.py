@@ -0,0 +1,397 @@
+# Copyright (c) 2022, TU Wien
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+"""Maintenance of the bare git repositories below ``grader_service_dir/git``.
+
+Pushes and autograding leave loose objects and many small packs in the repositories, and the
+autograde and feedback repositories get a branch for every submission.
+``grader-service-maintain`` is meant to be run periodically, e.g. by cron, and for every
+repository
+
+- deletes the ``submission_<hash>`` and ``feedback_<hash>`` branches of submissions that
+  were deleted longer than the retention period ago,
+- packs loose objects incrementally and updates the commit-graph,
+- runs ``git gc``, which writes reachability bitmaps, once a repository has too many packs,
+- reports the size of the repository.
+
+The edit repositories and the logs and properties of these submissions are removed as well,
+so that storage and the refs advertised to clients do not grow over the semesters.
+
+To not compete with the requests to the service, maintenance runs with a lower CPU
+priority, pauses between repositories and can be limited to a maximum duration. The
+repositories that were maintained least recently are processed first, so that a limited
+run continues where the previous one stopped.
+"""
+
+import argparse
+import logging
+import os
+import re
+import shutil
+import subprocess
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, Iterator, List, NamedTuple, Optional, Set
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+from traitlets import Float, Integer
+from traitlets.config import LoggingConfigurable
+
+from grader_service.handlers.handler_utils import GitRepoType
+from grader_service.orm import (
+    Assignment,
+    Lecture,
+    Submission,
+    SubmissionLogs,
+    SubmissionProperties,
+    User,
+)
+from grader_service.orm.base import DeleteState
+from grader_service.shared_objects import get_alternates
+
+# the time of the last maintenance is the modification time of this file in the repository
+STAMP_FILE = "grader_maintenance"
+
+SUBMISSION_BRANCH = re.compile(r"refs/heads/(?:submission|feedback)_([0-9a-f]+)")
+
+
+class Repo(NamedTuple):
+    path: str
+    repo_type: GitRepoType
+    assignment_id: str
+    # user name for user, autograde and feedback repositories, submission id for edit repositories
+    name: Optional[str] = None
+
+
+class RepoReport(NamedTuple):
+    path: str
+    size_before: int
+    size_after: int
+    pruned_branches: List[str]
+    maintained: bool
+
+
+def _is_bare_repo(path: str) -> bool:
+    return os.path.isdir(os.path.join(path, "objects")) and os.path.isfile(
+        os.path.join(path, "HEAD")
+    )
+
+
+def iter_repos(gitbase: str) -> Iterator[Repo]:
+    """Yields all repositories below gitbase, based on the layout created by
+    GraderBaseHandler.construct_git_dir.
+    """
+    for lecture in sorted(os.listdir(gitbase)):
+        lecture_path = os.path.join(gitbase, lecture)
+        if not os.path.isdir(lecture_path):
+            continue
+        for assignment in sorted(os.listdir(lecture_path)):
+            assignment_path = os.path.join(lecture_path, assignment)
+            if not os.path.isdir(assignment_path):
+                continue
+            for repo_type in GitRepoType:
+                type_path = os.path.join(assignment_path, repo_type)
+                if repo_type in {GitRepoType.SOURCE, GitRepoType.RELEASE}:
+                    if _is_bare_repo(type_path):
+                        yield Repo(type_path, repo_type, assignment)
+                    continue
+                if repo_type in {GitRepoType.AUTOGRADE, GitRepoType.FEEDBACK}:
+                    type_path = os.path.join(type_path, "user")
+                if not os.path.isdir(type_path):
+                    continue
+                for name in sorted(os.listdir(type_path)):
+                    repo_path = os.path.join(type_path, name)
+                    if _is_bare_repo(repo_path):
+                        yield Repo(repo_path, repo_type, assignment, name)
+
+
+def count_objects(repo_path: str) -> Dict[str, int]:
+    """Returns the statistics of ``git count-objects -v``, sizes are in KiB."""
+    out = subprocess.run(
+        ["git", "count-objects", "-v"], cwd=repo_path, check=True, capture_output=True, text=True
+    ).stdout
+    return {key: int(value) for key, value in (line.split(": ") for line in out.splitlines())}
+
+
+def repo_size(stats: Dict[str, int]) -> int:
+    """Returns the size of the objects of a repository in bytes."""
+    return (stats["size"] + stats["size-pack"] + stats["size-garbage"]) * 1024
+
+
+def last_maintenance(repo_path: str) -> float:
+    try:
+        return os.path.getmtime(os.path.join(repo_path, STAMP_FILE))
+    except FileNotFoundError:
+        return 0.0
+
+
+class GitMaintenance(LoggingConfigurable):
+    """Maintains the git repositories of the grader service, see the module docstring."""
+
+    loose_objects_threshold = Integer(
+        default_value=100,
+        allow_none=False,
+        help="Pack the loose objects of a repository once it has at least this many.",
+    ).tag(config=True)
+
+    pack_threshold = Integer(
+        default_value=8,
+        allow_none=False,
+        help="Repack a repository into a single pack with git gc "
+        "once it has at least this many packs.",
+    ).tag(config=True)
+
+    pause = Float(
+        default_value=0.5, allow_none=False, help="Seconds to wait after maintaining a repository."
+    ).tag(config=True)
+
+    max_duration = Integer(
+        default_value=0,
+        allow_none=False,
+        help="Stop a maintenance run after this many seconds, 0 means no limit. "
+        "The next run continues with the repositories that were not maintained.",
+    ).tag(config=True)
+
+    niceness = Integer(
+        default_value=10,
+        allow_none=False,
+        help="Value added to the niceness of the maintenance process and git.",
+    ).tag(config=True)
+
+    deleted_submission_retention = Integer(
+        default_value=30,
+        allow_none=False,
+        help="Days after which the branches, edit repository, logs and properties of a "
+        "deleted submission are removed. Deleted submissions are not updated anymore, "
+        "so their updated_at is the time of the deletion.",
+    ).tag(config=True)
+
+    def __init__(self, session: Optional[Session] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.session = session
+        self._retained_commits: Dict[str, Dict[str, Set[str]]] = {}
+
+    @property
+    def retention_cutoff(self) -> datetime:
+        return datetime.now(tz=timezone.utc) - timedelta(days=self.deleted_submission_retention)
+
+    def get_retained_commits(self, assignment_id: str) -> Dict[str, Set[str]]:
+        """Returns the commit hashes of the submissions of the assignment whose branches are
+        kept by user, which are the active ones and the ones within the retention period.
+        """
+        if assignment_id not in self._retained_commits:
+            rows = (
+                self.session.query(User.name, Submission.commit_hash)
+                .join(Submission.user)
+                .filter(
+                    Submission.assignid == int(assignment_id),
+                    or_(
+                        Submission.deleted == DeleteState.active,
+                        Submission.updated_at >= self.retention_cutoff,
+                    ),
+                )
+                .all()
+            )
+            commits: Dict[str, Set[str]] = {}
+            for username, commit_hash in rows:
+                commits.setdefault(username, set()).add(commit_hash)
+            self._retained_commits[assignment_id] = commits
+        return self._retained_commits[assignment_id]
+
+    def collect_deleted_submissions(self, gitbase: str, dry_run: bool = False) -> List[int]:
+        """Removes the edit repositories, logs and properties of the submissions that were
+        deleted longer than the retention period ago, together with the ref that protects
+        the objects borrowed by the edit repository. Returns the ids of the submissions
+        that had any of them.
+        """
+        gitbase = os.path.normpath(gitbase)
+        rows = (
+            self.session.query(Submission.id, Submission.assignid, Lecture.code, User.name)
+            .join(Submission.assignment)
+            .join(Assignment.lecture)
+            .join(Submission.user)
+            .filter(
+                Submission.deleted == DeleteState.deleted,
+                Submission.updated_at < self.retention_cutoff,
+            )
+            .all()
+        )
+        sub_ids = [sub_id for sub_id, _, _, _ in rows]
+        with_rows = set()
+        for model in [SubmissionLogs, SubmissionProperties]:
+            with_rows.update(
+                sub_id
+                for (sub_id,) in self.session.query(model.sub_id).filter(model.sub_id.in_(sub_ids))
+            )
+
+        collected = []
+        for sub_id, assignment_id, code, username in rows:
+            assignment_path = os.path.join(gitbase, code, str(assignment_id))
+            edit_path = os.path.normpath(
+                os.path.join(assignment_path, GitRepoType.EDIT, str(sub_id))
+            )
+            has_repo = edit_path.startswith(gitbase) and os.path.isdir(edit_path)
+            if not has_repo and sub_id not in with_rows:
+                continue
+            collected.append(sub_id)
+            if has_repo and not dry_run:
+                shutil.rmtree(edit_path)
+                user_path = os.path.normpath(
+                    os.path.join(assignment_path, GitRepoType.USER, username)
+                )
+                if user_path.startswith(gitbase) and os.path.isdir(user_path):
+                    self._git(user_path, "update-ref", "-d", f"refs/edit/{sub_id}")
+
+        if collected and not dry_run:
+            for model in [SubmissionLogs, SubmissionProperties]:
+                self.session.query(model).filter(model.sub_id.in_(collected)).delete(
+                    synchronize_session=False
+                )
+            self.session.commit()
+        return collected
+
+    @staticmethod
+    def _git(repo_path: str, *args: str, input: Optional[str] = None) -> str:
+        return subprocess.run(
+            ["git", *args], cwd=repo_path, input=input, check=True, capture_output=True, text=True
+        ).stdout
+
+    def stale_branches(self, repo: Repo) -> List[str]:
+        """Returns the submission and feedback branches of submissions that were deleted
+        longer than the retention period ago or do not exist anymore.
+        """
+        if self.session is None or repo.repo_type not in {
+            GitRepoType.AUTOGRADE,
+            GitRepoType.FEEDBACK,
+        }:
+            return []
+        try:
+            retained = self.get_retained_commits(repo.assignment_id).get(repo.name, set())
+        except ValueError:
+            return []
+        refs = self._git(repo.path, "for-each-ref", "--format=%(refname)", "refs/heads/")
+        stale = []
+        for ref in refs.splitlines():
+            match = SUBMISSION_BRANCH.fullmatch(ref)
+            if match and match.group(1) not in retained:
+                stale.append(ref)
+        return stale
+
+    def delete_branches(self, repo_path: str, refs: List[str]) -> None:
+        commands = "".join(f"delete {ref}\n" for ref in refs)
+        self._git(repo_path, "update-ref", "--stdin", input=commands)
+
+    def needs_maintenance(self, repo_path: str, stats: Dict[str, int]) -> bool:
+        if stats["count"] >= self.loose_objects_threshold:
+            return True
+        if stats["packs"] >= self.pack_threshold:
+            return True
+        # the commit-graph is written once for every repository
+        info_path = os.path.join(repo_path, "objects", "info")
+        has_graph = os.path.exists(os.path.join(info_path, "commit-graph")) or os.path.isdir(
+            os.path.join(info_path, "commit-graphs")
+        )
+        return not has_graph and stats["count"] + stats["in-pack"] > 0
+
+    def repack(self, repo_path: str, stats: Dict[str, int]) -> None:
+        if stats["packs"] >= self.pack_threshold:
+            # bitmaps need all reachable objects in one pack,
+            # which is not the case if objects are borrowed from the release repository
+            write_bitmaps = "false" if get_alternates(repo_path) else "true"
+            self._git(repo_path, "-c", f"repack.writeBitmaps={write_bitmaps}", "gc", "--quiet")
+        else:
+            # pack the loose objects into a new pack, without touching the existing packs
+            self._git(repo_path, "repack", "-d", "-l", "-q")
+            self._git(repo_path, "commit-graph", "write", "--reachable", "--split")
+        self._git(repo_path, "pack-refs", "--all")
+
+    def maintain(self, repo: Repo, dry_run: bool = False) -> RepoReport:
+        stats = count_objects(repo.path)
+        size_before = repo_size(stats)
+        stale = self.stale_branches(repo)
+        if dry_run:
+            return RepoReport(repo.path, size_before, size_before, stale, False)
+
+        if stale:
+            self.delete_branches(repo.path, stale)
+        maintained = bool(stale) or self.needs_maintenance(repo.path, stats)
+        if maintained:
+            self.repack(repo.path, stats)
+            stats = count_objects(repo.path)
+        Path(repo.path, STAMP_FILE).touch()
+        return RepoReport(repo.path, size_before, repo_size(stats), stale, maintained)
+
+    def run(self, gitbase: str, dry_run: bool = False) -> List[RepoReport]:
+        """Maintains the repositories below gitbase, least recently maintained first."""
+        if self.session is not None:
+            collected = self.collect_deleted_submissions(gitbase, dry_run=dry_run)
+            self.log.info(f"Collected {len(collected)} deleted submissions")
+        repos = sorted(iter_repos(gitbase), key=lambda r: last_maintenance(r.path))
+        deadline = time.monotonic() + self.max_duration if self.max_duration > 0 else None
+        reports = []
+        for i, repo in enumerate(repos):
+            if deadline is not None and time.monotonic() >= deadline:
+                self.log.info(f"Maximum duration reached, skipping {len(repos) - i} repositories")
+                break
+            try:
+                report = self.maintain(repo, dry_run=dry_run)
+            except subprocess.CalledProcessError as e:
+                self.log.error(f"Could not maintain {repo.path}: {e.stderr}")
+                continue
+            self.log.info(
+                f"{report.path}: {report.size_before} -> {report.size_after} bytes, "
+                f"{len(report.pruned_branches)} stale branches"
+            )
+            reports.append(report)
+            if not dry_run and self.pause > 0:
+                time.sleep(self.pause)
+        return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Prune stale branches, repack and report the size of the git "
+        "repositories of the grader service."
+    )
+    parser.add_argument("--config", "-f", required=True, help="Path to the config file")
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Only report the size and stale branches of the repositories",
+    )
+    parser.add_argument(
+        "--no-prune",
+        action="store_true",
+        help="Do not remove the branches, edit repositories, logs and properties "
+        "of deleted submissions",
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    from grader_service.main import GraderService, get_session_maker
+
+    service = GraderService.instance()
+    service.load_config_file(args.config)
+    session = None if args.no_prune else get_session_maker(service.db_url)()
+    maintenance = GitMaintenance(session=session, config=service.config)
+    if maintenance.niceness > 0:
+        os.nice(maintenance.niceness)
+
+    gitbase = os.path.join(service.grader_service_dir, "git")
+    reports = maintenance.run(gitbase, dry_run=args.dry_run)
+    total = sum(report.size_after for report in reports)
+    pruned = sum(len(report.pruned_branches) for report in reports)
+    maintenance.log.info(
+        f"Checked {len(reports)} repositories with {total} bytes, "
+        f"{sum(r.maintained for r in reports)} maintained, {pruned} stale branches"
+    )
+    if session is not None:
+        session.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -14,6 +14,7 @@ from grader_service.handlers import (
     health,
     lectures,
     permission,
+    statistics,
     submissions,
 )
 from grader_service.handlers.handler_utils import GitRepoType
@@ -23,6 +24,7 @@ __all__ = [
     "grading",
     "lectures",
     "submissions",
+    "statistics",
     "git",
     "permission",
     "health",
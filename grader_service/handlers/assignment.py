@@ -1,14 +1,12 @@
 import datetime
 import json
-import os
-import shutil
 from http import HTTPStatus
-from pathlib import Path
 from typing import Union
 
 import isodate
 import tornado
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import undefer
 from tornado.web import HTTPError
 
 from grader_service.api.models.assignment import Assignment as AssignmentModel
@@ -77,20 +75,14 @@ class AssignmentBaseHandler(GraderBaseHandler):
         if role.lecture.deleted == DeleteState.deleted:
             raise HTTPError(HTTPStatus.NOT_FOUND, reason="Lecture not found")
 
+        # settings are part of the serialized assignment, so load them in the same query
+        query = self.session.query(Assignment).options(undefer(Assignment._settings))
+        query = query.filter(
+            Assignment.lectid == role.lecture.id, Assignment.deleted == DeleteState.active
+        )
         if role.role == Scope.student:  # students do not get assignments that are created
-            assignments = (
-                self.session.query(Assignment)
-                .filter(
-                    Assignment.lectid == role.lecture.id,
-                    Assignment.deleted == DeleteState.active,
-                    Assignment.status != "created",
-                    Assignment.status != "pushed",
-                )
-                .all()
-            )
-
-        else:
-            assignments = [a for a in role.lecture.assignments if (a.deleted == DeleteState.active)]
+            query = query.filter(Assignment.status != "created", Assignment.status != "pushed")
+        assignments = query.all()
 
         # Handle the case that the user wants to include submissions
         include_submissions = self.get_argument("include-submissions", "true") == "true"
@@ -306,32 +298,14 @@ class AssignmentResetHandler(GraderBaseHandler):
         lecture_id, assignment_id = parse_ids(lecture_id, assignment_id)
         assignment = self.get_assignment(lecture_id, assignment_id)
 
-        grader_service_dir = Path(self.application.grader_service_dir)
-        git_path_base = grader_service_dir.joinpath(
-            "tmp", assignment.lecture.code, assignment.name, self.user.name
-        )
-        self.log.info(git_path_base)
-        # Deleting dir
-        if os.path.exists(git_path_base):
-            shutil.rmtree(git_path_base)
-
-        self.log.info(f"DIR {git_path_base}")
-        os.makedirs(git_path_base, exist_ok=True)
-        git_path_release = os.path.join(git_path_base, "release")
-        git_path_user = os.path.join(git_path_base, self.user.name)
-        self.log.info(f"GIT BASE {git_path_base}")
-        self.log.info(f"GIT RELEASE {git_path_release}")
-        self.log.info(f"GIT USER {git_path_user}")
-
         repo_path_release = self.construct_git_dir(
             GitRepoType.RELEASE, assignment.lecture, assignment
         )
         repo_path_user = self.construct_git_dir(GitRepoType.USER, assignment.lecture, assignment)
 
-        self.duplicate_release_repo(
+        await self.duplicate_release_repo(
             repo_path_release=repo_path_release,
             repo_path_user=repo_path_user,
-            assignment=assignment,
             message="Reset Assignment",
         )
 
@@ -3,21 +3,18 @@
 #
 # This source code is licensed under the BSD-style license found in the
 # LICENSE file in the root directory of this source tree.
-import asyncio
 import base64
 import datetime
 import functools
 import json
 import os
 import re
-import shlex
-import shutil
 import subprocess
+import tempfile
 import time
 import uuid
 from _decimal import Decimal
 from http import HTTPStatus
-from pathlib import Path
 from typing import Any, Awaitable, Callable, List, Optional, Union
 from urllib.parse import parse_qsl, urlparse
 
@@ -30,7 +27,7 @@ from tornado import httputil, web
 from tornado.escape import json_decode
 from tornado.httputil import url_concat
 from tornado.web import HTTPError
-from traitlets import Integer, TraitType, Type, Unicode
+from traitlets import Bool, Integer, TraitType, Type, Unicode
 from traitlets import List as ListTrait
 from traitlets.config import SingletonConfigurable
 
@@ -44,12 +41,20 @@ from grader_service.orm.lecture import Lecture
 from grader_service.orm.submission import FeedbackStatus
 from grader_service.orm.takepart import Role, Scope
 from grader_service.orm.user import User
+from grader_service.process import ProcessRunner
 from grader_service.registry import VersionSpecifier, register_handler
 from grader_service.server import GraderServer
 from grader_service.utils import get_browser_protocol, maybe_future, url_path_join, utcnow
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 SESSION_COOKIE_NAME = "grader-session-id"
 
+_JSON_SCALARS = frozenset({str, int, float, bool, type(None)})
+
 auth_header_pat = re.compile(r"^(token|bearer|basic)\s+([^\s]+)$", flags=re.IGNORECASE)
 
 
@@ -347,14 +352,28 @@ class BaseHandler(web.RequestHandler):
         else:
             return match.group(2)
 
-    @functools.lru_cache
     def get_token(self) -> Optional[APIToken]:
-        """get token from authorization header"""
-        token = self.get_auth_token()
-        if token is None:
-            return None
-        orm_token = APIToken.find(self.session, token)
-        return orm_token
+        """get token from authorization header
+
+        The token is looked up once per request.
+        """
+        if not hasattr(self, "_api_token"):
+            token = self.get_auth_token()
+            self._api_token = None if token is None else APIToken.find(self.session, token)
+        return self._api_token
+
+    async def verify_token(self) -> Optional[APIToken]:
+        """verify the token from the authorization header without blocking the event loop
+
+        The token is looked up once per request and verified tokens are cached across
+        requests, so that following lookups skip the hash comparison.
+        """
+        if not hasattr(self, "_api_token"):
+            token = self.get_auth_token()
+            self._api_token = (
+                None if token is None else await APIToken.find_async(self.session, token)
+            )
+        return self._api_token
 
     def get_current_user_token(self) -> Optional[User]:
         """get_current_user from Authorization header token"""
@@ -437,6 +456,9 @@ class BaseHandler(web.RequestHandler):
             user = None
             try:
                 if self._accept_token_auth:
+                    # the slow hash comparison runs in a thread here,
+                    # get_token then returns the memoised token
+                    await self.verify_token()
                     user = self.get_current_user_token()
                 if user is None and self._accept_cookie_auth:
                     user = self.get_current_user_cookie()
@@ -933,78 +955,91 @@ class GraderBaseHandler(BaseHandler):
         return path
 
     @staticmethod
-    def is_base_git_dir(path: str) -> bool:
+    async def is_base_git_dir(path: str) -> bool:
         try:
-            out = subprocess.run(
-                ["git", "rev-parse", "--is-bare-repository"], cwd=path, capture_output=True
+            out = await ProcessRunner.instance().run(
+                ["git", "rev-parse", "--is-bare-repository"], cwd=path, check=False
             )
-            is_git = (out.returncode == 0) and ("true" in out.stdout.decode("utf-8"))
         except FileNotFoundError:
-            is_git = False
-        return is_git
+            return False
+        return (out.returncode == 0) and ("true" in out.stdout.decode("utf-8"))
 
-    def duplicate_release_repo(
-        self,
-        repo_path_release: str,
-        repo_path_user: str,
-        assignment: Assignment,
-        message: str,
-        checkout_main: bool = False,
-    ):
-        tmp_path_base = Path(
-            self.application.grader_service_dir,
-            "tmp",
-            assignment.lecture.code,
-            str(assignment.id),
-            str(self.user.name),
-        )
-
-        # Deleting dir
-        if os.path.exists(tmp_path_base):
-            shutil.rmtree(tmp_path_base)
-
-        os.makedirs(tmp_path_base, exist_ok=True)
-        tmp_path_release = tmp_path_base.joinpath("release")
-        tmp_path_user = tmp_path_base.joinpath(self.user.name)
+    async def duplicate_release_repo(
+        self, repo_path_release: str, repo_path_user: str, message: str
+    ) -> None:
+        """Commits the files of the main branch of the release repository onto the
+        main branch of the user repository.
 
+        The commit is created with git plumbing directly in the bare user repository,
+        so no working copies are needed.
+        """
         self.log.info(f"Duplicating release repository {repo_path_release}")
-        self.log.info(f"Temporary path used for copying: {tmp_path_base}")
-
         try:
-            self._run_command(f"git clone -b main '{repo_path_release}'", cwd=tmp_path_base)
-            if checkout_main:
-                self._run_command(f"git clone '{repo_path_user}'", cwd=tmp_path_base)
-                self._run_command("git checkout -b main", cwd=tmp_path_user)
-            else:
-                self._run_command(f"git clone -b main '{repo_path_user}'", cwd=tmp_path_base)
-
-            msg = f"Copying repo from {tmp_path_release} to {tmp_path_user}"
-            self.log.info(msg)
-            ignore = shutil.ignore_patterns(".git", "__pycache__")
-            shutil.copytree(tmp_path_release, tmp_path_user, ignore=ignore, dirs_exist_ok=True)
-            self._run_command("git add -A", tmp_path_user)
-            self._run_command(f'git commit --allow-empty -m "{message}"', tmp_path_user)
-            self._run_command("git push -u origin main", tmp_path_user)
-        finally:
-            shutil.rmtree(tmp_path_base)
-
-    def _run_command(
-        self, command: str, cwd: Optional[Path] = None, capture_output: bool = False
-    ) -> Optional[str]:
-        # TODO currently there are two run_command functions,
-        #  because duplicate_release_repo does not work
-        #  with the _run_command_async
-        self.log.info("Running: %r", command)
-        try:
-            ret = subprocess.run(shlex.split(command), check=True, cwd=cwd, capture_output=True)
+            await self._commit_release_tree(repo_path_release, repo_path_user, message)
         except subprocess.CalledProcessError as e:
             self.log.error(e.stderr)
             raise HTTPError(500, reason="Subprocess Error")
-        except FileNotFoundError as e:
+        except subprocess.TimeoutExpired as e:
             self.log.error(e)
-            raise HTTPError(404, reason="File not found")
-        if capture_output:
-            return str(ret.stdout, "utf-8")
+            raise HTTPError(500, reason="Subprocess timed out")
+
+    @staticmethod
+    async def _commit_release_tree(
+        repo_path_release: str, repo_path_user: str, message: str
+    ) -> str:
+        """Creates a commit on the main branch of the user repository whose tree is the
+        tree of the user main branch (if it exists) overlaid with the files of the release
+        main branch. Returns the id of the new commit.
+        """
+        runner = ProcessRunner.instance()
+
+        async def git(
+            *args: str, env: Optional[dict] = None, input: Optional[bytes] = None, check=True
+        ) -> str:
+            out = await runner.run(
+                ["git", *args], cwd=repo_path_user, env=env, input=input, check=check
+            )
+            return out.stdout.decode().strip() if out.returncode == 0 else ""
+
+        # only objects missing in the user repository are transferred,
+        # which are none if it borrows the objects of the release repository
+        await git("fetch", "--quiet", "--no-tags", repo_path_release, "main")
+        parent = await git(
+            "rev-parse", "--verify", "--quiet", "refs/heads/main^{commit}", check=False
+        )
+        # paths are kept as bytes, since git does not require them to be valid UTF-8
+        tree_entries = await runner.run(
+            ["git", "ls-tree", "-r", "-z", "--full-tree", "FETCH_HEAD"], cwd=repo_path_user
+        )
+        entries = [
+            entry
+            for entry in tree_entries.stdout.split(b"\0")
+            if entry and b"__pycache__" not in entry.split(b"\t", 1)[1].split(b"/")
+        ]
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            env = {**os.environ, "GIT_INDEX_FILE": os.path.join(tmp_dir, "index")}
+            if parent:
+                await git("read-tree", parent, env=env)
+            index_info = b"".join(entry + b"\0" for entry in entries)
+            await git(
+                "update-index",
+                "--add",
+                "--replace",
+                "-z",
+                "--index-info",
+                env=env,
+                input=index_info,
+            )
+            tree = await git("write-tree", env=env)
+
+        commit_args = ["commit-tree", tree, "-m", message]
+        if parent:
+            commit_args += ["-p", parent]
+        commit = await git(*commit_args)
+        await git("update-ref", "-m", message, "refs/heads/main", commit, parent)
+        await git("symbolic-ref", "HEAD", "refs/heads/main")
+        return commit
 
     async def _run_command_async(self, command_args: List[str], cwd: Optional[str] = None):
         """Runs a command asynchronously in a subprocess.
@@ -1015,43 +1050,47 @@ class GraderBaseHandler(BaseHandler):
                                  Defaults to None.
 
         Raises:
-            GitError: returns appropriate git error
+            HTTPError: if the command could not be run, failed or timed out
         """
         self.log.info("Running: %s", " ".join(command_args))
         try:
-            ret = await asyncio.create_subprocess_exec(
-                *command_args,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE,
-                cwd=cwd,
-            )
+            ret = await ProcessRunner.instance().run(command_args, cwd=cwd)
         except FileNotFoundError as e:
             self.log.error(e)
             raise HTTPError(404, reason="File not found")
-
-        stdout, stderr = await ret.communicate()
-        if ret.returncode != 0:
-            self.log.error(stderr.decode())
+        except subprocess.CalledProcessError as e:
+            self.log.error(e.stderr.decode())
             raise HTTPError(500, reason="Subprocess Error")
-        return stdout.decode()
+        except subprocess.TimeoutExpired as e:
+            self.log.error(e)
+            raise HTTPError(500, reason="Subprocess timed out")
+        return ret.stdout.decode()
 
     def write_json(self, obj) -> None:
         self.set_header("Content-Type", "application/json")
         chunk = GraderBaseHandler._serialize(obj)
-        self.write(json.dumps(chunk))
+        self.write(GraderBaseHandler._dumps(chunk))
+
+    @staticmethod
+    def _dumps(chunk) -> Union[str, bytes]:
+        if orjson is not None and RequestHandlerConfig.instance().use_orjson:
+            return orjson.dumps(chunk, option=orjson.OPT_NON_STR_KEYS)
+        return json.dumps(chunk)
 
     @classmethod
     def _serialize(cls, obj: object):
+        # scalars are by far the most common values, so they are checked first
+        # and exact scalar types in containers are not passed through recursion
+        if isinstance(obj, (str, int, float, complex)) or obj is None:
+            return obj
         if isinstance(obj, list):
-            return [cls._serialize(o) for o in obj]
+            return [o if type(o) in _JSON_SCALARS else cls._serialize(o) for o in obj]
         if isinstance(obj, dict):
-            return {k: cls._serialize(v) for k, v in obj.items()}
+            return {k: v if type(v) in _JSON_SCALARS else cls._serialize(v) for k, v in obj.items()}
         if isinstance(obj, tuple):
             return tuple(cls._serialize(o) for o in obj)
         if isinstance(obj, Serializable):
             return cls._serialize(obj.serialize())
-        if isinstance(obj, (str, int, float, complex)) or obj is None:
-            return obj
         if isinstance(obj, datetime.datetime):
             obj = obj.replace(tzinfo=datetime.timezone.utc)
             return str(obj)
@@ -1115,3 +1154,51 @@ class RequestHandlerConfig(SingletonConfigurable):
     git_allowed_file_extensions = ListTrait(
         TraitType(Unicode), default_value=[], allow_none=False, config=True
     )
+    git_share_release_objects = Bool(
+        False,
+        allow_none=False,
+        config=True,
+        help="Let new user, autograde, feedback and edit repositories borrow the objects of "
+        "the release repository (git alternates) instead of storing their own copies. "
+        "Existing repositories can be migrated with grader-service-share-objects.",
+    )
+    git_protocol_v2 = Bool(
+        True,
+        allow_none=False,
+        config=True,
+        help="Allow clients to fetch with git wire protocol version 2 if they request it.",
+    )
+    git_response_chunk_size = Integer(
+        64 * 1024,
+        allow_none=False,
+        config=True,
+        help="Maximum number of bytes read from git at once and streamed to the client.",
+    )
+
+    use_orjson = Bool(
+        True,
+        allow_none=False,
+        config=True,
+        help="Encode JSON responses with orjson if it is installed.",
+    )
+
+    token_cache_size = Integer(
+        1024,
+        allow_none=False,
+        config=True,
+        help="Maximum number of verified API tokens cached by the service process.",
+    )
+    token_cache_ttl = Integer(
+        300,
+        allow_none=False,
+        config=True,
+        help="Seconds a verified API token is cached before its hash is compared again.",
+    )
+
+    assignment_stats_cache_ttl = Integer(
+        60,
+        allow_none=False,
+        config=True,
+        help="Seconds assignment statistics are cached. Commits in this process invalidate "
+        "the cache immediately, the TTL bounds staleness for commits of other processes.",
+    )
@@ -3,12 +3,14 @@
 #
 # This source code is licensed under the BSD-style license found in the
 # LICENSE file in the root directory of this source tree.
+import asyncio
 import os
+import re
 import shlex
 import subprocess
+import sys
 from pathlib import Path
-from string import Template
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 
 from sqlalchemy.orm.exc import MultipleResultsFound, NoResultFound
 from tornado.ioloop import IOLoop
@@ -21,12 +23,25 @@ from grader_service.handlers.handler_utils import GitRepoType
 from grader_service.orm.lecture import Lecture
 from grader_service.orm.submission import Submission
 from grader_service.orm.takepart import Role, Scope
+from grader_service.process import ProcessRunner
 from grader_service.registry import VersionSpecifier, register_handler
+from grader_service.shared_objects import BORROWING_REPO_TYPES, share_objects
+
+# value of the Git-Protocol header, e.g. "version=2" (key=value pairs separated by colons)
+GIT_PROTOCOL_PATTERN = re.compile(r"^[\w.=:-]+$")
 
 
 class GitBaseHandler(GraderBaseHandler):
     async def data_received(self, chunk: bytes):
-        return self.process.stdin.write(chunk)
+        # waiting for the write makes tornado stop reading the request body
+        # until git has consumed the chunk
+        if self.process.stdin.closed():
+            return
+        try:
+            await self.process.stdin.write(chunk)
+        except StreamClosedError:
+            # git exited early, its output contains the reason
+            self.log.warning("git closed stdin before the request body was consumed")
 
     def write_error(self, status_code: int, **kwargs) -> None:
         self.clear()
@@ -47,8 +62,9 @@ class GitBaseHandler(GraderBaseHandler):
             IOLoop.current().spawn_callback(self.process.wait_for_exit)
 
     async def git_response(self):
+        chunk_size = RequestHandlerConfig.instance().git_response_chunk_size
         try:
-            while data := await self.process.stdout.read_bytes(8192, partial=True):
+            while data := await self.process.stdout.read_bytes(chunk_size, partial=True):
                 self.write(data)
                 await self.flush()
         except StreamClosedError:
@@ -86,7 +102,7 @@ class GitBaseHandler(GraderBaseHandler):
         ):
             raise HTTPError(403)
 
-    def gitlookup(self, rpc: str) -> Optional[str]:
+    async def gitlookup(self, rpc: str) -> Optional[str]:
         pathlets = self.request.path.strip("/").split("/")
         # check if request is sent using jupyterhub as a proxy
         # if yes, remove services/grader path prefix
@@ -152,55 +168,110 @@ class GitBaseHandler(GraderBaseHandler):
             return None
 
         os.makedirs(os.path.dirname(path), exist_ok=True)
-        is_git = self.is_base_git_dir(path)
+        is_git = await self.is_base_git_dir(path)
         # return git repo
         if os.path.exists(path) and is_git:
-            self.write_pre_receive_hook(path)
             return path
         else:
             os.mkdir(path)
             # this path has to be a git dir -> call git init
             try:
                 self.log.info("Running: git init --bare")
-                subprocess.run(["git", "init", "--bare", path], check=True)
+                await ProcessRunner.instance().run(["git", "init", "--bare", path])
             except subprocess.CalledProcessError:
                 return None
 
+            repo_path_release = self.construct_git_dir(
+                GitRepoType.RELEASE, assignment.lecture, assignment
+            )
+            if (
+                repo_type in BORROWING_REPO_TYPES
+                and RequestHandlerConfig.instance().git_share_release_objects
+            ):
+                loop = asyncio.get_running_loop()
+                await loop.run_in_executor(None, share_objects, path, repo_path_release)
+
             if repo_type == GitRepoType.USER:
-                repo_path_release = self.construct_git_dir(
-                    GitRepoType.RELEASE, assignment.lecture, assignment
-                )
                 if not os.path.exists(repo_path_release):
                     return None
-                self.duplicate_release_repo(
+                await self.duplicate_release_repo(
                     repo_path_release=repo_path_release,
                     repo_path_user=path,
-                    assignment=assignment,
                     message="Initialize with Release",
-                    checkout_main=True,
                 )
 
-            self.write_pre_receive_hook(path)
             return path
 
-    def write_pre_receive_hook(self, path: str):
-        hook_dir = os.path.join(path, "hooks")
-        if not os.path.exists(hook_dir):
-            os.mkdir(hook_dir)
-
-        hook_file = os.path.join(hook_dir, "pre-receive")
-        if not os.path.exists(hook_file):
-            tpl = Template(self._read_hook_template())
-            hook = tpl.safe_substitute(
-                {
-                    "tpl_max_file_size": self._get_hook_max_file_size(),
-                    "tpl_file_extensions": self._get_hook_file_allow_pattern(),
-                    "tpl_max_file_count": self._get_hook_max_file_count(),
-                }
-            )
-            with open(hook_file, "wt") as f:
-                os.chmod(hook_file, 0o755)
+    # stat of the hook files written by this process, so that the content of an unchanged
+    # file does not have to be compared on every push
+    _installed_hooks: Dict[str, Tuple[int, int, int]] = {}
+
+    @property
+    def hooks_path(self) -> str:
+        """Directory of the git hooks used for all repositories, see install_hooks."""
+        return os.path.join(self.application.grader_service_dir, "git_hooks")
+
+    @classmethod
+    def install_hooks(cls, hooks_path: str) -> None:
+        """Writes the pre-receive policy hook to hooks_path, which is passed to
+        git receive-pack as core.hooksPath instead of copying the hook into every
+        repository. The hook is rewritten if it was removed or its content changed.
+        """
+        hook_file = os.path.join(hooks_path, "pre-receive")
+        stat = cls._hook_stat(hook_file)
+        if stat is not None and cls._installed_hooks.get(hook_file) == stat:
+            return
+        hook = cls._read_hook_template()
+        # run the hook with the interpreter of the service
+        hook = f"#!{sys.executable}\n" + hook.split("\n", 1)[1]
+        os.makedirs(hooks_path, exist_ok=True)
+        if (
+            not os.path.exists(hook_file)
+            or not os.access(hook_file, os.X_OK)
+            or Path(hook_file).read_text() != hook
+        ):
+            tmp_file = f"{hook_file}.{os.getpid()}.tmp"
+            with open(tmp_file, "wt") as f:
                 f.write(hook)
+            os.chmod(tmp_file, 0o755)
+            os.replace(tmp_file, hook_file)
+        cls._installed_hooks[hook_file] = cls._hook_stat(hook_file)
+
+    @staticmethod
+    def _hook_stat(hook_file: str) -> Optional[Tuple[int, int, int]]:
+        try:
+            stat = os.stat(hook_file)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_mode
+
+    def get_protocol_env(self) -> Dict[str, str]:
+        """Passes the Git-Protocol header of the client to git upload-pack as GIT_PROTOCOL,
+        like git http-backend does. This lets clients fetch with protocol v2, where refs are
+        only listed on request and can be filtered by prefix (ls-refs). Pushes always use v0.
+        """
+        protocol = self.request.headers.get("Git-Protocol")
+        if (
+            protocol is None
+            or self.rpc != "upload-pack"
+            or not RequestHandlerConfig.instance().git_protocol_v2
+            or not GIT_PROTOCOL_PATTERN.match(protocol)
+        ):
+            return {}
+        return {"GIT_PROTOCOL": protocol}
+
+    def is_protocol_v2(self) -> bool:
+        return "version=2" in self.get_protocol_env().get("GIT_PROTOCOL", "").split(":")
+
+    @classmethod
+    def get_hook_env(cls) -> Dict[str, str]:
+        """Environment of git receive-pack passing the file policy to the pre-receive hook."""
+        return {
+            **os.environ,
+            "GRADER_GIT_MAX_FILE_SIZE_MB": str(cls._get_hook_max_file_size()),
+            "GRADER_GIT_MAX_FILE_COUNT": str(cls._get_hook_max_file_count()),
+            "GRADER_GIT_FILE_ALLOW_PATTERN": cls._get_hook_file_allow_pattern(),
+        }
 
     @staticmethod
     def _get_hook_file_allow_pattern(extensions: Optional[List[str]] = None) -> str:
@@ -232,9 +303,9 @@ class GitBaseHandler(GraderBaseHandler):
         if not os.path.exists(path):
             os.mkdir(path)
 
-    def get_gitdir(self, rpc: str):
+    async def get_gitdir(self, rpc: str):
         """Determine the git repository for this request"""
-        gitdir = self.gitlookup(rpc)
+        gitdir = await self.gitlookup(rpc)
         if gitdir is None:
             raise HTTPError(404, reason="unable to find repository")
         self.log.info("Accessing git at: %s", gitdir)
@@ -253,17 +324,29 @@ class RPCHandler(GitBaseHandler):
     async def prepare(self):
         await super().prepare()
         self.rpc = self.path_args[0]
-        self.gitdir = self.get_gitdir(rpc=self.rpc)
-        self.cmd = f'git {self.rpc} --stateless-rpc "{self.gitdir}"'
+        self.gitdir = await self.get_gitdir(rpc=self.rpc)
+        if self.rpc == "receive-pack":
+            self.install_hooks(self.hooks_path)
+            self.cmd = (
+                f'git -c core.hooksPath="{self.hooks_path}" '
+                f'{self.rpc} --stateless-rpc "{self.gitdir}"'
+            )
+            env = self.get_hook_env()
+        else:
+            self.cmd = f'git {self.rpc} --stateless-rpc "{self.gitdir}"'
+            env = {**os.environ, **self.get_protocol_env()}
         self.log.info(f"Running command: {self.cmd}")
         self.process = Subprocess(
             shlex.split(self.cmd),
             stdin=Subprocess.STREAM,
             stderr=Subprocess.STREAM,
             stdout=Subprocess.STREAM,
+            env=env,
         )
 
     async def post(self, rpc):
+        # the request body has been streamed to git completely
+        self.process.stdin.close()
         self.set_header("Content-Type", "application/x-git-%s-result" % rpc)
         self.set_header("Cache-Control", "no-store, no-cache, must-revalidate, max-age=0")
         await self.git_response()
@@ -281,24 +364,28 @@ class InfoRefsHandler(GitBaseHandler):
         if self.get_status() != 200:
             return
         self.rpc = self.get_argument("service")[4:]
-        self.cmd = f'git {self.rpc} --stateless-rpc --advertise-refs "{self.get_gitdir(self.rpc)}"'
+        gitdir = await self.get_gitdir(self.rpc)
+        self.cmd = f'git {self.rpc} --stateless-rpc --advertise-refs "{gitdir}"'
         self.log.info(f"Running command: {self.cmd}")
         self.process = Subprocess(
             shlex.split(self.cmd),
             stdin=Subprocess.STREAM,
             stderr=Subprocess.STREAM,
             stdout=Subprocess.STREAM,
+            env={**os.environ, **self.get_protocol_env()},
         )
 
     async def get(self):
         self.set_header("Content-Type", "application/x-git-%s-advertisement" % self.rpc)
         self.set_header("Cache-Control", "no-store, no-cache, must-revalidate, max-age=0")
 
-        prelude = f"# service=git-{self.rpc}\n0000"
-        size = str(hex(len(prelude))[2:].rjust(4, "0"))
-        self.write(size)
-        self.write(prelude)
-        await self.flush()
+        # with protocol v2, git advertises its capabilities without the service line
+        if not self.is_protocol_v2():
+            prelude = f"# service=git-{self.rpc}\n0000"
+            size = str(hex(len(prelude))[2:].rjust(4, "0"))
+            self.write(size)
+            self.write(prelude)
+            await self.flush()
 
         await self.git_response()
         await self.finish()
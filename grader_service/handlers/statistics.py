@@ -0,0 +1,293 @@
+# Copyright (c) 2022, TU Wien
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+import threading
+import time
+from collections import OrderedDict
+from http import HTTPStatus
+from typing import Dict, Hashable, List, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+from tornado.web import HTTPError
+
+from grader_service.handlers.base_handler import GraderBaseHandler, RequestHandlerConfig, authorize
+from grader_service.handlers.handler_utils import parse_ids
+from grader_service.orm.base import DeleteState
+from grader_service.orm.submission import Submission
+from grader_service.orm.submission_grade import SubmissionGrade
+from grader_service.orm.takepart import Scope
+from grader_service.registry import VersionSpecifier, register_handler
+
+PERCENTILES = (10, 25, 50, 75, 90)
+
+
+class AssignmentStatisticsCache:
+    """Bounded in-process cache of computed assignment statistics.
+
+    Entries expire after ``ttl`` seconds and are dropped as soon as a session
+    commits changes to a submission of the assignment, see register_cache_invalidation.
+    The TTL bounds the staleness for commits done by other processes (e.g. the celery
+    workers).
+    """
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, ttl: float) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            created, value = entry
+            if time.monotonic() - created > ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: dict) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, assignment_id: int) -> None:
+        """Drop all entries of an assignment. Keys have to start with the assignment id."""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == assignment_id]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+statistics_cache = AssignmentStatisticsCache()
+
+
+def register_cache_invalidation(session_maker) -> None:
+    """Drops the cached statistics of an assignment when a session of session_maker commits
+    changes to its submissions. Called at startup for the sessions of the web server only,
+    so that other processes using the ORM, e.g. the celery workers, do not track changes.
+    """
+    if event.contains(session_maker, "after_commit", _invalidate_changed_assignments):
+        return
+    event.listen(session_maker, "after_flush", _collect_changed_assignments)
+    event.listen(session_maker, "after_commit", _invalidate_changed_assignments)
+    event.listen(session_maker, "after_rollback", _discard_changed_assignments)
+
+
+def _collect_changed_assignments(session: Session, flush_context) -> None:
+    changed = session.info.setdefault("changed_assignment_ids", set())
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, Submission) and obj.assignid is not None:
+            changed.add(obj.assignid)
+
+
+def _invalidate_changed_assignments(session: Session) -> None:
+    for assignment_id in session.info.pop("changed_assignment_ids", ()):
+        statistics_cache.invalidate(assignment_id)
+
+
+def _discard_changed_assignments(session: Session) -> None:
+    session.info.pop("changed_assignment_ids", None)
+
+
+def _describe(values: np.ndarray) -> Dict[str, Optional[float]]:
+    if values.size == 0:
+        return {"count": 0, "mean": None, "median": None, "std": None, "min": None, "max": None}
+    return {
+        "count": int(values.size),
+        "mean": float(values.mean()),
+        "median": float(np.median(values)),
+        "std": float(values.std()),
+        "min": float(values.min()),
+        "max": float(values.max()),
+    }
+
+
+def compute_score_statistics(
+    scores: np.ndarray, bins: int, max_score: Optional[float] = None
+) -> dict:
+    """Summarise the total scores of the selected submissions.
+
+    :param scores: array of submission scores
+    :param bins: number of histogram bins
+    :param max_score: upper bound of the histogram range, defaults to the highest score
+    """
+    stats = _describe(scores)
+    if scores.size == 0:
+        stats["percentiles"] = {str(p): None for p in PERCENTILES}
+        stats["histogram"] = {"bin_edges": [], "counts": []}
+        return stats
+
+    stats["percentiles"] = {
+        str(p): float(v) for p, v in zip(PERCENTILES, np.percentile(scores, PERCENTILES))
+    }
+    upper = max(max_score or 0.0, float(scores.max()))
+    counts, edges = np.histogram(scores, bins=bins, range=(min(0.0, scores.min()), upper or 1.0))
+    stats["histogram"] = {"bin_edges": edges.tolist(), "counts": counts.tolist()}
+    return stats
+
+
+def compute_cell_statistics(rows: Sequence[tuple]) -> List[dict]:
+    """Summarise the per-cell grades of the selected submissions.
+
+    :param rows: tuples of (notebook_id, cell_id, auto_score, manual_score,
+        extra_credit, max_score, failed_tests) as stored in ``submission_grade``
+    """
+    if len(rows) == 0:
+        return []
+
+    notebook_ids, cell_ids, auto, manual, extra, max_scores, failed = zip(*rows)
+    auto = np.array(auto, dtype=float)
+    manual = np.array(manual, dtype=float)
+    extra = np.nan_to_num(np.array(extra, dtype=float))
+    max_scores = np.array(max_scores, dtype=float)
+    # failed_tests is nullable, NaN marks cells without test information
+    failed = np.array([np.nan if f is None else float(f) for f in failed])
+    # the manual score takes precedence over the automatic score (see models.Grade.score)
+    scores = np.nan_to_num(np.where(np.isnan(manual), auto, manual)) + extra
+
+    keys = np.array([f"{n}\x00{c}" for n, c in zip(notebook_ids, cell_ids)])
+    unique_keys, group = np.unique(keys, return_inverse=True)
+    order = np.argsort(group, kind="stable")
+    boundaries = np.flatnonzero(np.diff(group[order])) + 1
+
+    cells = []
+    for key, indices in zip(unique_keys, np.split(order, boundaries)):
+        notebook_id, cell_id = key.split("\x00", 1)
+        cell_scores = scores[indices]
+        cell_max = max_scores[indices]
+        cell_failed = failed[indices]
+        known = cell_failed[~np.isnan(cell_failed)]
+        graded_max = cell_max[~np.isnan(cell_max)]
+        stats = _describe(cell_scores)
+        stats.update(
+            notebook_id=notebook_id,
+            cell_id=cell_id,
+            max_score=float(graded_max.max()) if graded_max.size else None,
+            full_score_rate=float(np.mean(cell_scores >= np.nan_to_num(cell_max)))
+            if graded_max.size
+            else None,
+            pass_rate=float(1.0 - known.mean()) if known.size else None,
+        )
+        cells.append(stats)
+    return cells
+
+
+@register_handler(
+    path=r"\/api\/lectures\/(?P<lecture_id>\d*)\/assignments\/(?P<assignment_id>\d*)\/stats\/?",
+    version_specifier=VersionSpecifier.ALL,
+)
+class AssignmentStatisticsHandler(GraderBaseHandler):
+    """Tornado Handler class for http requests to
+    /lectures/{lecture_id}/assignments/{assignment_id}/stats.
+    """
+
+    @authorize([Scope.tutor, Scope.instructor])
+    async def get(self, lecture_id: int, assignment_id: int):
+        """Returns score statistics of an assignment.
+
+        Two query parameters:
+        1 - filter
+            latest: use the latest submission of every user (default).
+            best: use the best submission of every user.
+        2 - bins: number of bins of the score histogram (default 10).
+
+        :param lecture_id: id of the lecture
+        :type lecture_id: int
+        :param assignment_id: id of the assignment
+        :type assignment_id: int
+        :raises HTTPError: throws err if the assignment was not found or
+        the parameters are invalid
+        """
+        lecture_id, assignment_id = parse_ids(lecture_id, assignment_id)
+        self.validate_parameters("filter", "bins")
+        submission_filter = self.get_argument("filter", "latest")
+        if submission_filter not in ["latest", "best"]:
+            raise HTTPError(
+                HTTPStatus.BAD_REQUEST,
+                reason="Filter parameter has to be either 'latest' or 'best'",
+            )
+        try:
+            bins = int(self.get_argument("bins", "10"))
+        except ValueError:
+            bins = 0
+        if not 1 <= bins <= 100:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, reason="Bins have to be between 1 and 100")
+
+        assignment = self.get_assignment(lecture_id, assignment_id)
+        key = (assignment.id, submission_filter, bins)
+        ttl = RequestHandlerConfig.instance().assignment_stats_cache_ttl
+        stats = statistics_cache.get(key, ttl)
+        if stats is None:
+            stats = self._compute_statistics(
+                assignment.id, assignment.points, submission_filter, bins
+            )
+            statistics_cache.set(key, stats)
+        self.write_json(stats)
+
+    def _compute_statistics(
+        self, assignment_id: int, points, submission_filter: str, bins: int
+    ) -> dict:
+        # one submission per user, ties on the score or date are broken by the newest submission
+        if submission_filter == "latest":
+            order = (Submission.date.desc(), Submission.id.desc())
+        else:
+            order = (Submission.score.desc(), Submission.date.desc(), Submission.id.desc())
+        query = (
+            self.session.query(
+                Submission.id,
+                Submission.score,
+                func.row_number()
+                .over(partition_by=Submission.user_id, order_by=order)
+                .label("rank"),
+            )
+            .filter(Submission.assignid == assignment_id)
+            .filter(Submission.deleted == DeleteState.active)
+        )
+        if submission_filter == "best":
+            query = query.filter(Submission.score.isnot(None))
+        ranked = query.subquery()
+        selected = (
+            self.session.query(ranked.c.id, ranked.c.score)
+            .filter(ranked.c.rank == 1)
+            .order_by(ranked.c.id)
+            .all()
+        )
+        sub_ids = [s.id for s in selected]
+        scores = np.array([s.score for s in selected if s.score is not None], dtype=float)
+
+        grade_rows = []
+        if sub_ids:
+            grade_rows = (
+                self.session.query(
+                    SubmissionGrade.notebook_id,
+                    SubmissionGrade.cell_id,
+                    SubmissionGrade.auto_score,
+                    SubmissionGrade.manual_score,
+                    SubmissionGrade.extra_credit,
+                    SubmissionGrade.max_score,
+                    SubmissionGrade.failed_tests,
+                )
+                .filter(SubmissionGrade.sub_id.in_(sub_ids))
+                .all()
+            )
+
+        max_score = float(points) if points is not None else None
+        return {
+            "assignment_id": assignment_id,
+            "filter": submission_filter,
+            "submission_count": len(sub_ids),
+            "max_score": max_score,
+            "score": compute_score_statistics(scores, bins, max_score),
+            "cells": compute_cell_statistics(grade_rows),
+        }
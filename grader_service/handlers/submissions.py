@@ -4,6 +4,7 @@
 # This source code is licensed under the BSD-style license found in the
 # LICENSE file in the root directory of this source tree.
 # grader_s/grader_s/handlers
+import asyncio
 import datetime
 import json
 import os.path
@@ -34,12 +35,15 @@ from grader_service.orm.assignment import Assignment
 from grader_service.orm.base import DeleteState
 from grader_service.orm.lecture import Lecture
 from grader_service.orm.submission import AutoStatus, FeedbackStatus, ManualStatus, Submission
+from grader_service.orm.submission_grade import SubmissionGrade
 from grader_service.orm.submission_logs import SubmissionLogs
 from grader_service.orm.submission_properties import SubmissionProperties
 from grader_service.orm.takepart import Role, Scope
 from grader_service.orm.user import User
 from grader_service.plugins.lti import LTISyncGrades
+from grader_service.process import ProcessRunner
 from grader_service.registry import VersionSpecifier, register_handler
+from grader_service.shared_objects import share_objects
 
 # Commit hash is used to differentiate between submissions created by instructors for students and
 # normal submissions by any user.
@@ -343,10 +347,8 @@ class SubmissionHandler(GraderBaseHandler):
                     HTTPStatus.UNPROCESSABLE_ENTITY, reason="User git repository not found"
                 )
             try:
-                subprocess.run(
-                    ["git", "branch", "main", "--contains", commit_hash],
-                    cwd=git_repo_path,
-                    capture_output=True,
+                await ProcessRunner.instance().run(
+                    ["git", "branch", "main", "--contains", commit_hash], cwd=git_repo_path
                 )
             except subprocess.CalledProcessError:
                 raise HTTPError(HTTPStatus.NOT_FOUND, reason="Commit not found")
@@ -649,6 +651,7 @@ class SubmissionPropertiesHandler(GraderBaseHandler):
         properties = SubmissionProperties(properties=properties_string, sub_id=submission.id)
 
         self.session.merge(properties)
+        SubmissionGrade.replace(self.session, submission.id, gradebook)
 
         if submission.feedback_status == FeedbackStatus.GENERATED:
             submission.feedback_status = FeedbackStatus.FEEDBACK_OUTDATED
@@ -727,65 +730,24 @@ class SubmissionEditHandler(GraderBaseHandler):
             ["git", "init", "--bare", "--initial-branch=main"], git_repo_path
         )
 
-        # Create temporary paths to copy the submission files in the edit repository
-        tmp_path = os.path.join(
-            self.application.grader_service_dir,
-            "tmp",
-            lecture.code,
-            str(assignment.id),
-            "edit",
-            str(submission.id),
-        )
-
-        tmp_input_path = os.path.join(tmp_path, "input")
-
-        tmp_output_path = os.path.join(tmp_path, "output")
-
-        if os.path.exists(tmp_path):
-            shutil.rmtree(tmp_path, ignore_errors=True)
-
-        os.makedirs(tmp_input_path, exist_ok=True)
-
-        # Init local repository
-        await self._run_command_async(["git", "init", "--initial-branch=main"], tmp_input_path)
-
-        # Pull user repository
+        # The edit repository borrows the objects of the user repository, so the tree of
+        # the submission can be committed without copying any files or history. The ref
+        # keeps the borrowed objects from being pruned if the student rewrites the branch.
         await self._run_command_async(
-            ["git", "pull", str(submission_repo_path), "main"], tmp_input_path
+            ["git", "update-ref", f"refs/edit/{submission.id}", submission.commit_hash],
+            submission_repo_path,
         )
-        self.log.info("Successfully cloned repo")
-
-        # Checkout to correct submission commit
-        await self._run_command_async(["git", "checkout", submission.commit_hash], tmp_input_path)
-        self.log.info(f"Now at commit {submission.commit_hash}")
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, share_objects, git_repo_path, submission_repo_path, False)
 
-        # Copy files to output directory
-        shutil.copytree(tmp_input_path, tmp_output_path, ignore=shutil.ignore_patterns(".git"))
-
-        # Init local repository
-        await self._run_command_async(["git", "init", "--initial-branch=main"], tmp_output_path)
-
-        # Add edit remote
+        tree = f"{submission.commit_hash}^{{tree}}"
+        commit = await self._run_command_async(
+            ["git", "commit-tree", tree, "-m", "Initial commit"], git_repo_path
+        )
         await self._run_command_async(
-            ["git", "remote", "add", "edit", str(git_repo_path)], tmp_output_path
+            ["git", "update-ref", "refs/heads/main", commit.strip()], git_repo_path
         )
-        self.log.info("Successfully added edit remote")
-
-        # Switch to main
-        await self._run_command_async(["git", "switch", "-c", "main"], tmp_output_path)
-        self.log.info("Successfully switched to branch main")
-
-        # Add files to staging
-        await self._run_command_async(["git", "add", "-A"], tmp_output_path)
-        self.log.info("Successfully added files to staging")
-
-        # Commit Files
-        await self._run_command_async(["git", "commit", "-m", "Initial commit"], tmp_output_path)
-        self.log.info("Successfully commited files")
-
-        # Push copied files
-        await self._run_command_async(["git", "push", "edit", "main"], tmp_output_path)
-        self.log.info("Successfully pushed copied files")
+        self.log.info(f"Created edit repository from commit {submission.commit_hash}")
 
         submission.edited = True
         self.session.commit()
@@ -797,8 +759,6 @@ class SubmissionEditHandler(GraderBaseHandler):
     version_specifier=VersionSpecifier.ALL,
 )
 class LtiSyncHandler(GraderBaseHandler):
-    cache_token = {"token": None, "ttl": datetime.datetime.now()}
-
     @authorize([Scope.instructor])
     async def put(self, lecture_id: int, assignment_id: int):
         """Starts the LTI sync process (if enabled).
@@ -23,6 +23,7 @@ from traitlets import (
     Bool,
     Dict,
     Enum,
+    Float,
     HasTraits,
     Instance,
     Int,
@@ -45,13 +46,16 @@ from grader_service.auth.dummy import DummyAuthenticator
 from grader_service.autograding.celery.app import CeleryApp
 from grader_service.handlers.base_handler import RequestHandlerConfig
 from grader_service.handlers.static import CacheControlStaticFilesHandler
+from grader_service.handlers.statistics import register_cache_invalidation
 from grader_service.oauth2 import handlers as oauth_handlers
 from grader_service.oauth2.provider import make_provider
 from grader_service.orm import Lecture, Role, User
+from grader_service.orm.api_token import verified_tokens
 from grader_service.orm.base import DeleteState
 from grader_service.orm.lecture import LectureState
 from grader_service.orm.takepart import Scope
 from grader_service.plugins.lti import LTISyncGrades
+from grader_service.process import ProcessRunner
 from grader_service.registry import HandlerPathRegistry
 from grader_service.server import GraderServer
 from grader_service.utils import url_path_join
@@ -118,6 +122,12 @@ class GraderService(config.Application):
         104857600, help="Sets the max buffer size in bytes, default to 100mb"
     ).tag(config=True)
 
+    slow_callback_duration = Float(
+        0.1,
+        help="When the log level is DEBUG, callbacks that block the event loop "
+        "longer than this many seconds are logged",
+    ).tag(config=True)
+
     service_git_username = Unicode("grader-service", allow_none=False).tag(config=True)
 
     service_git_email = Unicode("", allow_none=False).tag(config=True)
@@ -345,8 +355,28 @@ class GraderService(config.Application):
         """Pass config to singletons."""
         RequestHandlerConfig.config = self.config
         LTISyncGrades.config = self.config
+        ProcessRunner.config = self.config
         CeleryApp.instance(config=self.config)
 
+        handler_config = RequestHandlerConfig.instance()
+        verified_tokens.maxsize = handler_config.token_cache_size
+        verified_tokens.ttl = handler_config.token_cache_ttl
+
+    def init_slow_callback_detection(self):
+        """Logs the callbacks that block the event loop, e.g. synchronous subprocess
+        calls in handlers, when the log level is DEBUG."""
+        if not self.log.isEnabledFor(logging.DEBUG):
+            return
+        loop = asyncio.get_running_loop()
+        loop.set_debug(True)
+        loop.slow_callback_duration = self.slow_callback_duration
+        # slow callbacks are logged as warnings, the other debug output of asyncio is skipped
+        logging.getLogger("asyncio").setLevel(logging.WARNING)
+        self.log.debug(
+            f"Logging callbacks blocking the event loop for more than "
+            f"{self.slow_callback_duration}s"
+        )
+
     async def cleanup(self):
         pass
 
@@ -428,6 +458,7 @@ class GraderService(config.Application):
 
         self.log.info("Starting Grader Service...")
         self.io_loop = tornado.ioloop.IOLoop.current()
+        self.init_slow_callback_detection()
 
         self._setup_environment()
 
@@ -438,6 +469,7 @@ class GraderService(config.Application):
 
         handlers = HandlerPathRegistry.handler_list(self.base_url_path)
         self.log.info(handlers)
+        register_cache_invalidation(self.session_maker)
         # Add the handlers of the authenticator
         auth_handlers = self.authenticator.get_handlers(self.base_url_path)
         handlers.extend(auth_handlers)
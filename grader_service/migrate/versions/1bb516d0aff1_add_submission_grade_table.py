@@ -0,0 +1,98 @@
+"""add submission grade table
+
+Revision ID: 1bb516d0aff1
+Revises: 4a88dacd888f
+Create Date: 2026-10-19 10:12:41.318227
+
+"""
+
+import base64
+import gzip
+import json
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "1bb516d0aff1"
+down_revision = "4a88dacd888f"
+branch_labels = None
+depends_on = None
+
+COMPRESSED_MARKER = "gzip+b64:"
+
+
+def _load_gradebook(properties):
+    """Parse the (possibly compressed) gradebook JSON of a submission."""
+    if properties is None:
+        return None
+    if properties.startswith(COMPRESSED_MARKER):
+        data = base64.b64decode(properties[len(COMPRESSED_MARKER) :])
+        properties = gzip.decompress(data).decode("utf-8")
+    try:
+        gradebook = json.loads(properties)
+        return gradebook if isinstance(gradebook, dict) else None
+    except ValueError:
+        return None
+
+
+def _max_score(grade: dict):
+    return grade.get("max_score_taskcell") or grade.get("max_score_gradecell")
+
+
+def upgrade():
+    submission_grade = op.create_table(
+        "submission_grade",
+        sa.Column("sub_id", sa.Integer(), nullable=False),
+        sa.Column("notebook_id", sa.String(length=255), nullable=False),
+        sa.Column("cell_id", sa.String(length=255), nullable=False),
+        sa.Column("auto_score", sa.Float(), nullable=True),
+        sa.Column("manual_score", sa.Float(), nullable=True),
+        sa.Column("extra_credit", sa.Float(), nullable=True),
+        sa.Column("max_score", sa.Float(), nullable=True),
+        sa.Column("failed_tests", sa.Boolean(), nullable=True),
+        sa.Column("needs_manual_grade", sa.Boolean(), nullable=True),
+        sa.ForeignKeyConstraint(
+            ["sub_id"], ["submission.id"], name="fk_submission_grade_sub_id", ondelete="CASCADE"
+        ),
+        sa.PrimaryKeyConstraint("sub_id", "notebook_id", "cell_id"),
+    )
+    op.create_index(
+        "ix_submission_grade_notebook_cell", "submission_grade", ["notebook_id", "cell_id"]
+    )
+
+    # Backfill the grades from the gradebooks that are already stored
+    conn = op.get_bind()
+    rows = conn.execute(
+        sa.text(
+            "SELECT sp.sub_id, sp.properties FROM submission_properties sp "
+            "JOIN submission s ON s.id = sp.sub_id"
+        )
+    )
+    grades = []
+    for sub_id, properties in rows:
+        gradebook = _load_gradebook(properties)
+        if gradebook is None:
+            continue
+        for notebook_id, notebook in (gradebook.get("notebooks") or {}).items():
+            for cell_id, grade in (notebook.get("grades_dict") or {}).items():
+                grades.append(
+                    {
+                        "sub_id": sub_id,
+                        "notebook_id": notebook_id,
+                        "cell_id": cell_id,
+                        "auto_score": grade.get("auto_score"),
+                        "manual_score": grade.get("manual_score"),
+                        "extra_credit": grade.get("extra_credit"),
+                        "max_score": _max_score(grade),
+                        "failed_tests": grade.get("failed_tests"),
+                        "needs_manual_grade": grade.get("needs_manual_grade"),
+                    }
+                )
+    if grades:
+        op.bulk_insert(submission_grade, grades)
+
+
+def downgrade():
+    op.drop_index("ix_submission_grade_notebook_cell", table_name="submission_grade")
+    op.drop_table("submission_grade")
@@ -0,0 +1,36 @@
+"""add lti sync attempts and batch table
+
+Revision ID: 3c9a7e5d2f6b
+Revises: 6f2d0c8e4b1a
+Create Date: 2026-10-19 16:41:52.208113
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "3c9a7e5d2f6b"
+down_revision = "6f2d0c8e4b1a"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        "lti_sync_queue", sa.Column("attempts", sa.Integer(), server_default="0", nullable=False)
+    )
+    op.create_table(
+        "lti_sync_batch",
+        sa.Column("assignid", sa.Integer(), nullable=False),
+        sa.Column("due_at", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["assignid"], ["assignment.id"], name="fk_lti_sync_batch_assignid", ondelete="CASCADE"
+        ),
+        sa.PrimaryKeyConstraint("assignid"),
+    )
+
+
+def downgrade():
+    op.drop_table("lti_sync_batch")
+    op.drop_column("lti_sync_queue", "attempts")
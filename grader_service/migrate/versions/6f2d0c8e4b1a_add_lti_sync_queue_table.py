@@ -0,0 +1,38 @@
+"""add lti sync queue table
+
+Revision ID: 6f2d0c8e4b1a
+Revises: 1bb516d0aff1
+Create Date: 2026-10-19 14:03:17.512946
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "6f2d0c8e4b1a"
+down_revision = "1bb516d0aff1"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "lti_sync_queue",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("assignid", sa.Integer(), nullable=False),
+        sa.Column("sub_id", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["assignid"], ["assignment.id"], name="fk_lti_sync_queue_assignid", ondelete="CASCADE"
+        ),
+        sa.ForeignKeyConstraint(
+            ["sub_id"], ["submission.id"], name="fk_lti_sync_queue_sub_id", ondelete="CASCADE"
+        ),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_lti_sync_queue_assignid", "lti_sync_queue", ["assignid"])
+
+
+def downgrade():
+    op.drop_index("ix_lti_sync_queue_assignid", table_name="lti_sync_queue")
+    op.drop_table("lti_sync_queue")
@@ -0,0 +1,119 @@
+# Copyright (c) 2022, TU Wien
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+"""Compiled decoders of the OpenAPI models in grader_service.api.
+
+The generated ``util.deserialize_model`` reflects over the ``openapi_types`` of a model on
+every call. :func:`install` replaces it with a decoder that is compiled once per model
+class, so that the generated code is kept as is and can be regenerated.
+"""
+
+import datetime
+from typing import Any, Callable, Dict
+
+from grader_service.api import typing_utils, util
+
+# the generated implementation, kept before install replaces it
+deserialize_model_reflective = util.deserialize_model
+
+_model_decoders: Dict[type, Callable[[Any], Any]] = {}
+
+
+def deserialize_model(data, klass):
+    """Deserializes a dict into a klass instance with the decoder compiled for klass on
+    first use, see :func:`compile_model_decoder`.
+    """
+    decoder = _model_decoders.get(klass)
+    if decoder is None:
+        decoder = _model_decoders[klass] = compile_model_decoder(klass)
+    return decoder(data)
+
+
+def _decode_primitive(klass: type) -> Callable[[Any], Any]:
+    def decode(data):
+        if data is None or type(data) is klass:
+            return data
+        return util._deserialize_primitive(data, klass)
+
+    return decode
+
+
+def _decode_datetime(data):
+    """Parses ISO 8601 strings with datetime.fromisoformat, which is orders of magnitude
+    faster than dateutil and returns an equal value. Other strings are parsed by the
+    generated deserialize_datetime.
+    """
+    if isinstance(data, str):
+        try:
+            return datetime.datetime.fromisoformat(data)
+        except ValueError:
+            pass
+    return util.deserialize_datetime(data)
+
+
+def _decode_object(data):
+    return data
+
+
+def _compile_type_decoder(klass) -> Callable[[Any], Any]:
+    """Returns a function deserializing values of type klass, mirroring the dispatch of the
+    generated ``util._deserialize``.
+    """
+    if klass in (int, float, str, bool, bytearray):
+        return _decode_primitive(klass)
+    elif klass is object:
+        return _decode_object
+    elif klass is datetime.date:
+        return util.deserialize_date
+    elif klass is datetime.datetime:
+        return _decode_datetime
+    elif typing_utils.is_generic(klass):
+        if typing_utils.is_list(klass):
+            decode_item = _compile_type_decoder(klass.__args__[0])
+            return lambda data: None if data is None else [decode_item(d) for d in data]
+        if typing_utils.is_dict(klass):
+            decode_value = _compile_type_decoder(klass.__args__[1])
+            return lambda data: (
+                None if data is None else {k: decode_value(v) for k, v in data.items()}
+            )
+        return lambda data: None
+    else:
+        # resolved on call, so models may reference themselves
+        return lambda data: None if data is None else deserialize_model(data, klass)
+
+
+def compile_model_decoder(klass) -> Callable[[Any], Any]:
+    """Builds a function deserializing dicts into klass instances.
+
+    The ``openapi_types`` of the model are only inspected once, the field decoders are
+    resolved ahead of time and the assignments are generated as straight-line code. The
+    setters of the model are still called, so the result is the same as with
+    :data:`deserialize_model_reflective`.
+    """
+    prototype = klass()
+    if not prototype.openapi_types:
+        return _decode_object
+
+    namespace = {"klass": klass}
+    lines = [
+        "def decode(data):",
+        "    instance = klass()",
+        "    if data is None or not isinstance(data, (list, dict)):",
+        "        return instance",
+    ]
+    for i, (attr, attr_type) in enumerate(prototype.openapi_types.items()):
+        key = prototype.attribute_map[attr]
+        namespace[f"_d{i}"] = _compile_type_decoder(attr_type)
+        lines.append(f"    if {key!r} in data:")
+        lines.append(f"        instance.{attr} = _d{i}(data[{key!r}])")
+    lines.append("    return instance")
+    source = "\n".join(lines) + "\n"
+    exec(compile(source, f"<decoder {klass.__name__}>", "exec"), namespace)
+    return namespace["decode"]
+
+
+def install() -> None:
+    """Lets the generated models and ``util._deserialize`` use the compiled decoders."""
+    util.deserialize_model = deserialize_model
@@ -4,13 +4,16 @@
 # This source code is licensed under the BSD-style license found in the
 # LICENSE file in the root directory of this source tree.
 
+from grader_service import model_decoder
 from grader_service.orm.api_token import APIToken
 from grader_service.orm.assignment import Assignment
 from grader_service.orm.base import Base
 from grader_service.orm.lecture import Lecture
+from grader_service.orm.lti_sync_queue import LTISyncBatch, LTISyncQueue
 from grader_service.orm.oauthclient import OAuthClient
 from grader_service.orm.oauthcode import OAuthCode
 from grader_service.orm.submission import Submission
+from grader_service.orm.submission_grade import SubmissionGrade
 from grader_service.orm.submission_logs import SubmissionLogs
 from grader_service.orm.submission_properties import SubmissionProperties
 from grader_service.orm.takepart import Role
@@ -28,4 +31,10 @@ __all__ = [
     "APIToken",
     "SubmissionLogs",
     "SubmissionProperties",
+    "SubmissionGrade",
+    "LTISyncQueue",
+    "LTISyncBatch",
 ]
+
+# the OpenAPI models decoded by the ORM and the handlers use the compiled decoders
+model_decoder.install()
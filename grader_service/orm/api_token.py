@@ -1,4 +1,11 @@
+import asyncio
+import hmac
+import secrets
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
 
 from sqlalchemy import Column, DateTime, ForeignKey, Integer, Unicode, inspect, or_
 from sqlalchemy.orm import relationship
@@ -10,6 +17,92 @@ from grader_service.orm.json_util import JSONList
 from grader_service.utils import compare_token, hash_token, new_token, utcnow
 
 
+def _seconds_until(expires_at: Optional[datetime]) -> Optional[float]:
+    if expires_at is None:
+        return None
+    if expires_at.tzinfo is None:
+        # timestamps are stored as naive UTC
+        expires_at = expires_at.replace(tzinfo=timezone.utc)
+    return (expires_at - utcnow()).total_seconds()
+
+
+class VerifiedTokenCache:
+    """Bounded in-process cache of verified tokens.
+
+    Maps a keyed digest of a presented token to the id and hash of the
+    matching database row, so that repeated requests with the same token skip
+    the slow hash comparison. The digest key is random per process and the
+    plain token is never stored. Entries expire after ``ttl`` seconds or when
+    the token expires. On a hit the row is loaded by primary key and its hash
+    compared again, so revoked (deleted) tokens are never served from the cache.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._key = secrets.token_bytes(32)
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _digest(self, token: str) -> bytes:
+        return hmac.digest(self._key, token.encode("utf8", "replace"), "sha256")
+
+    def get(self, token: str) -> Optional[Tuple[int, str]]:
+        """Returns the id and hash of the verified token or None."""
+        digest = self._digest(token)
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    del self._entries[digest]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(digest)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def set(self, token: str, orm_token: "Hashed") -> None:
+        deadline = time.monotonic() + self.ttl
+        expires_in = _seconds_until(orm_token.expires_at)
+        if expires_in is not None:
+            deadline = min(deadline, time.monotonic() + expires_in)
+        digest = self._digest(token)
+        with self._lock:
+            self._entries[digest] = (deadline, orm_token.id, orm_token.hashed)
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        """Returns the hit and miss counters and the number of cached tokens."""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+    def invalidate(self, token_id: int) -> None:
+        with self._lock:
+            for digest in [d for d, e in self._entries.items() if e[1] == token_id]:
+                del self._entries[digest]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+def _match_index(hashes, token) -> Optional[int]:
+    """Returns the index of the first hash matching the token or None."""
+    for i, hashed in enumerate(hashes):
+        if compare_token(hashed, token):
+            return i
+    return None
+
+
+verified_tokens = VerifiedTokenCache()
+
+
 class Expiring:
     """Mixin for expiring entries
 
@@ -110,7 +203,9 @@ class Hashed(Expiring):
         # since we can't filter on hashed values, filter on prefix
         # so we aren't comparing with all tokens
         prefix_match = db.query(cls).filter_by(prefix=prefix)
-        prefix_match = prefix_match.filter(or_(cls.expires_at is None, cls.expires_at >= cls.now))
+        prefix_match = prefix_match.filter(
+            or_(cls.expires_at.is_(None), cls.expires_at >= utcnow(with_tz=False))
+        )
         return prefix_match
 
     @classmethod
@@ -184,17 +279,58 @@ class APIToken(Hashed, Base):
             client_id=self.client_id,
         )
 
+    @classmethod
+    def _find_verified(cls, db, token):
+        """Look up a token verified before in `verified_tokens`."""
+        cached = verified_tokens.get(token)
+        if cached is None:
+            return None
+        token_id, hashed = cached
+        orm_token = db.get(cls, token_id)
+        if orm_token is not None and orm_token.hashed == hashed and orm_token.user_id is not None:
+            expires_in = _seconds_until(orm_token.expires_at)
+            if expires_in is None or expires_in > 0:
+                return orm_token
+        verified_tokens.invalidate(token_id)
+        return None
+
     @classmethod
     def find(cls, db, token):
         """Find a token object by value. Returns None if not found."""
+        orm_token = cls._find_verified(db, token)
+        if orm_token is not None:
+            return orm_token
         prefix_match = cls.find_prefix(db, token)
         prefix_match = prefix_match.filter(cls.user_id.isnot(None))
         for orm_token in prefix_match:
             if orm_token.match(token):
                 # Only purge if it's explicitly broken (has no client *and* shouldn't exist)
                 # But we now support client-less tokens.
+                verified_tokens.set(token, orm_token)
                 return orm_token
 
+    @classmethod
+    async def find_async(cls, db, token):
+        """Find a token object by value. Returns None if not found.
+
+        Same as `find`, but the hash comparison runs in the default executor
+        of the event loop instead of blocking it.
+        """
+        orm_token = cls._find_verified(db, token)
+        if orm_token is not None:
+            return orm_token
+        prefix_match = cls.find_prefix(db, token)
+        candidates = prefix_match.filter(cls.user_id.isnot(None)).all()
+        if not candidates:
+            return None
+        loop = asyncio.get_running_loop()
+        hashes = [orm_token.hashed for orm_token in candidates]
+        index = await loop.run_in_executor(None, _match_index, hashes, token)
+        if index is None:
+            return None
+        verified_tokens.set(token, candidates[index])
+        return candidates[index]
+
     @classmethod
     def new(
         cls,
@@ -240,7 +376,7 @@ class APIToken(Hashed, Base):
         orm_token.user = user
 
         if expires_in is not None:
-            orm_token.expires_at = cls.now + timedelta(seconds=expires_in)
+            orm_token.expires_at = utcnow(with_tz=False) + timedelta(seconds=expires_in)
 
         db.commit()
         return orm_token if return_orm else token
@@ -9,11 +9,12 @@ from datetime import date, datetime, timezone
 from typing import Any, Set, Union
 
 from sqlalchemy import DECIMAL, Column, DateTime, Enum, ForeignKey, Integer, String, Text
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import deferred, relationship
 
 from grader_service.api.models import assignment
 from grader_service.api.models.assignment_settings import AssignmentSettings
 from grader_service.orm.base import Base, DeleteState, Serializable
+from grader_service.orm.json_util import CompressedText
 
 
 def get_utc_time():
@@ -37,10 +38,12 @@ class Assignment(Base, Serializable):
     points = Column(DECIMAL(10, 3), nullable=True)
     status = Column(Enum("created", "pushed", "released", "complete"), default="created")
     deleted = Column(Enum(DeleteState), nullable=False, unique=False)
-    properties = Column(Text, nullable=True, unique=False)
+    # the gradebook JSON and the settings are only loaded on first access,
+    # so that listing and authorisation queries do not fetch them
+    properties = deferred(Column(CompressedText, nullable=True, unique=False))
     created_at = Column(DateTime, default=get_utc_time, nullable=False)
     updated_at = Column(DateTime, default=get_utc_time, onupdate=get_utc_time, nullable=False)
-    _settings = Column("settings", Text, server_default="", nullable=False)
+    _settings = deferred(Column("settings", Text, server_default="", nullable=False))
 
     lecture = relationship("Lecture", back_populates="assignments")
     submissions = relationship(
@@ -50,6 +53,14 @@ class Assignment(Base, Serializable):
         passive_deletes=True,
     )
 
+    serialize_fields = {
+        "id": "id",
+        "name": "name",
+        "status": "status",
+        "points": "points",
+        "settings": lambda a: a.settings.to_dict(),
+    }
+
     @property
     def settings(self) -> AssignmentSettings:
         if self._settings is None:
@@ -6,6 +6,7 @@
 
 import enum
 import sqlite3
+from typing import Callable, ClassVar, Dict, Optional, Union
 
 from sqlalchemy import Engine, event
 from sqlalchemy.orm import declarative_base
@@ -16,12 +17,51 @@ Base = declarative_base()
 
 
 class Serializable(object):
+    # Maps the keys of the serialized dict to the attribute holding the value or
+    # to a callable computing it from the instance. If set, ``serialize`` skips
+    # building the API model and uses a function compiled once per class instead.
+    # The result has to be identical to ``self.model.to_dict()``.
+    serialize_fields: ClassVar[Optional[Dict[str, Union[str, Callable]]]] = None
+
     @property
     def model(self) -> Model:
         return Model()
 
     def serialize(self) -> dict:
-        return self.model.to_dict()
+        serializer = _serializers.get(type(self))
+        if serializer is None:
+            serializer = _serializers[type(self)] = compile_serializer(type(self))
+        return serializer(self)
+
+
+_serializers: Dict[type, Callable[[Serializable], dict]] = {}
+
+
+def compile_serializer(cls: type) -> Callable[[Serializable], dict]:
+    """Builds the serialization function of a :class:`Serializable` class.
+
+    The generated function is a single dict literal. Attribute fields are read
+    from the instance ``__dict__``, where SQLAlchemy keeps loaded column values,
+    and only fall back to the (much slower) instrumented attribute access for
+    unloaded attributes and properties.
+    """
+    fields = cls.serialize_fields
+    if fields is None:
+        return lambda obj: obj.model.to_dict()
+
+    namespace = {}
+    items = []
+    for i, (key, field) in enumerate(fields.items()):
+        if callable(field):
+            namespace[f"_f{i}"] = field
+            items.append(f"{key!r}: _f{i}(obj)")
+        elif field.isidentifier():
+            items.append(f"{key!r}: d[{field!r}] if {field!r} in d else obj.{field}")
+        else:
+            raise ValueError(f"Invalid serialize field {field!r} of {cls.__name__}")
+    source = f"def serialize(obj):\n    d = obj.__dict__\n    return {{{', '.join(items)}}}\n"
+    exec(compile(source, f"<serializer {cls.__name__}>", "exec"), namespace)
+    return namespace["serialize"]
 
 
 class DeleteState(enum.IntEnum):
@@ -1,5 +1,6 @@
+import gzip
 import json
-from base64 import decodebytes, encodebytes
+from base64 import b64decode, b64encode, decodebytes, encodebytes
 
 from sqlalchemy import TypeDecorator
 from sqlalchemy.types import Text
@@ -66,3 +67,40 @@ class JSONList(JSONDict):
         else:
             value = json.loads(value)
         return value
+
+
+class CompressedText(TypeDecorator):
+    """Text column that transparently compresses large values.
+
+    Values longer than ``threshold`` characters are stored gzip-compressed and
+    base64-encoded behind a marker prefix, so that the column stays a plain
+    text column on every database backend. Smaller values and rows written
+    before compression was introduced are stored and returned as is.
+
+    Usage::
+
+               CompressedText(threshold=16384)
+
+    """
+
+    impl = Text
+    cache_ok = True
+
+    marker = "gzip+b64:"
+
+    def __init__(self, threshold: int = 16384, compresslevel: int = 6, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.threshold = threshold
+        self.compresslevel = compresslevel
+
+    def process_bind_param(self, value, dialect):
+        if value is None or len(value) < self.threshold:
+            return value
+        data = gzip.compress(value.encode("utf-8"), compresslevel=self.compresslevel, mtime=0)
+        return self.marker + b64encode(data).decode("ascii")
+
+    def process_result_value(self, value, dialect):
+        if value is None or not value.startswith(self.marker):
+            return value
+        data = b64decode(value[len(self.marker) :])
+        return gzip.decompress(data).decode("utf-8")
@@ -39,6 +39,13 @@ class Lecture(Base, Serializable):
         "Role", back_populates="lecture", cascade="all, delete-orphan", passive_deletes=True
     )
 
+    serialize_fields = {
+        "id": "id",
+        "name": "name",
+        "code": "code",
+        "complete": lambda lec: lec.state == LectureState.complete,
+    }
+
     @property
     def model(self) -> lecture.Lecture:
         return lecture.Lecture(
@@ -0,0 +1,127 @@
+# Copyright (c) 2022, TU Wien
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+from datetime import timedelta
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from grader_service.orm.base import Base
+from grader_service.utils import utcnow
+
+
+class LTISyncQueue(Base):
+    """Submissions waiting to be synced to the LTI platform after feedback generation.
+
+    Feedback-triggered syncs of an assignment are collected here and published as one
+    batch, so that the LTI platform is not called once for every generated feedback.
+    """
+
+    __tablename__ = "lti_sync_queue"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    assignid = Column(
+        Integer, ForeignKey("assignment.id", ondelete="CASCADE"), nullable=False, index=True
+    )
+    sub_id = Column(Integer, ForeignKey("submission.id", ondelete="CASCADE"), nullable=False)
+    # number of failed batch syncs that included the entry
+    attempts = Column(Integer, nullable=False, default=0, server_default="0")
+
+    @classmethod
+    def push(cls, db: Session, assignment_id: int, sub_ids: Iterable[int]) -> None:
+        """Queue the submissions and commit."""
+        entries = [cls(assignid=assignment_id, sub_id=sub_id) for sub_id in sub_ids]
+        if entries:
+            db.add_all(entries)
+            db.commit()
+
+    @classmethod
+    def peek(cls, db: Session, assignment_id: int) -> Tuple[List[int], List[int]]:
+        """Return the pending entries of the assignment without removing them.
+
+        :return: the ids of the entries and the ids of the queued submissions
+        """
+        entries = db.query(cls.id, cls.sub_id).filter(cls.assignid == assignment_id).all()
+        entry_ids = [entry.id for entry in entries]
+        return entry_ids, list(dict.fromkeys(entry.sub_id for entry in entries))
+
+    @classmethod
+    def remove(cls, db: Session, entry_ids: List[int]) -> None:
+        """Remove the entries, e.g. after they were synced, and commit."""
+        if entry_ids:
+            db.query(cls).filter(cls.id.in_(entry_ids)).delete(synchronize_session=False)
+            db.commit()
+
+    @classmethod
+    def record_failure(cls, db: Session, entry_ids: List[int]) -> None:
+        """Count a failed sync attempt of the entries and commit."""
+        if entry_ids:
+            db.query(cls).filter(cls.id.in_(entry_ids)).update(
+                {cls.attempts: cls.attempts + 1}, synchronize_session=False
+            )
+            db.commit()
+
+    @classmethod
+    def drop_exhausted(cls, db: Session, assignment_id: int, max_attempts: int) -> List[int]:
+        """Remove the entries of the assignment that failed max_attempts times and commit.
+
+        :return: the ids of the dropped submissions
+        """
+        query = db.query(cls).filter(cls.assignid == assignment_id, cls.attempts >= max_attempts)
+        sub_ids = list(dict.fromkeys(sub_id for (sub_id,) in query.with_entities(cls.sub_id)))
+        if sub_ids:
+            query.delete(synchronize_session=False)
+            db.commit()
+        return sub_ids
+
+    @classmethod
+    def pending_attempts(cls, db: Session, assignment_id: int) -> Optional[int]:
+        """Return the lowest number of failed attempts of the pending entries of the
+        assignment, or None if no entries are pending.
+        """
+        return db.query(func.min(cls.attempts)).filter(cls.assignid == assignment_id).scalar()
+
+
+class LTISyncBatch(Base):
+    """Marks that the batch sync of an assignment is scheduled, so that concurrent
+    feedback generations and batch syncs schedule it only once.
+    """
+
+    __tablename__ = "lti_sync_batch"
+
+    #: a batch that did not run this long after it was due is considered lost,
+    #: e.g. because the worker stopped, and can be scheduled again
+    timeout = timedelta(hours=1)
+
+    assignid = Column(Integer, ForeignKey("assignment.id", ondelete="CASCADE"), primary_key=True)
+    due_at = Column(DateTime, nullable=False)
+
+    @classmethod
+    def schedule(cls, db: Session, assignment_id: int, countdown: float) -> bool:
+        """Claim the scheduling of the batch sync of the assignment and commit.
+
+        :return: True if the caller has to schedule the batch sync in countdown seconds,
+            False if it is already scheduled
+        """
+        now = utcnow(with_tz=False)
+        db.query(cls).filter(cls.assignid == assignment_id, cls.due_at < now - cls.timeout).delete(
+            synchronize_session=False
+        )
+        db.add(cls(assignid=assignment_id, due_at=now + timedelta(seconds=countdown)))
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            return False
+        return True
+
+    @classmethod
+    def release(cls, db: Session, assignment_id: int) -> None:
+        """Remove the claim of the assignment, once its batch sync ran, and commit."""
+        db.query(cls).filter(cls.assignid == assignment_id).delete(synchronize_session=False)
+        db.commit()
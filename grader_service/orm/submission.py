@@ -3,7 +3,6 @@
 # grader service orm
 # This source code is licensed under the BSD-style license found in the
 # LICENSE file in the root directory of this source tree.
-from datetime import UTC, datetime
 from enum import StrEnum
 
 from sqlalchemy import Boolean, Column, DateTime, Enum, Float, ForeignKey, Integer, String
@@ -11,6 +10,7 @@ from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import relationship
 
 from grader_service.api.models import submission
+from grader_service.orm.assignment import get_utc_time
 from grader_service.orm.base import Base, DeleteState, Serializable
 
 
@@ -56,9 +56,7 @@ class Submission(Base, Serializable):
     )
     deleted = Column(Enum(DeleteState), nullable=False, unique=False, default=DeleteState.active)
     edited = Column(Boolean, nullable=False)
-    updated_at = Column(
-        DateTime, default=datetime.now(UTC), onupdate=datetime.now(UTC), nullable=False
-    )
+    updated_at = Column(DateTime, default=get_utc_time, onupdate=get_utc_time, nullable=False)
     grading_score = Column(Float, nullable=False)
     score_scaling = Column(Float, server_default="1.0", nullable=False)
 
@@ -78,6 +76,28 @@ class Submission(Base, Serializable):
         cascade="all, delete-orphan",
         passive_deletes=True,
     )
+    grades = relationship(
+        "SubmissionGrade",
+        back_populates="submission",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+    )
+
+    serialize_fields = {
+        "id": "id",
+        "submitted_at": lambda s: None if s.date is None else s.date.isoformat("T", "milliseconds"),
+        "auto_status": "auto_status",
+        "manual_status": "manual_status",
+        "user_id": "user_id",
+        "user_display_name": "user_display_name",
+        "grading_score": "grading_score",
+        "score_scaling": "score_scaling",
+        "score": "score",
+        "assignid": "assignid",
+        "commit_hash": "commit_hash",
+        "feedback_status": "feedback_status",
+        "edited": "edited",
+    }
 
     @hybrid_property
     def user_display_name(self) -> str:
@@ -108,6 +128,6 @@ class Submission(Base, Serializable):
         Returns:
             dict: The serialized submission data including user information.
         """
-        model = self.model.to_dict()
+        model = self.serialize()
         model["user"] = self.user.serialize()
         return model
@@ -0,0 +1,74 @@
+# Copyright (c) 2022, TU Wien
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+from typing import TYPE_CHECKING, List
+
+from sqlalchemy import Boolean, Column, Float, ForeignKey, Index, Integer, String
+from sqlalchemy.orm import Session, relationship
+
+from grader_service.orm.base import Base, Serializable
+
+if TYPE_CHECKING:
+    from grader_service.convert.gradebook.models import GradeBookModel
+
+
+class SubmissionGrade(Base, Serializable):
+    """Per-cell scores of a submission.
+
+    The rows mirror the ``grades_dict`` entries of the gradebook stored in
+    :class:`~grader_service.orm.submission_properties.SubmissionProperties`,
+    so that statistics can be computed with SQL aggregates instead of parsing
+    the gradebook JSON of every submission.
+    """
+
+    __tablename__ = "submission_grade"
+    __table_args__ = (Index("ix_submission_grade_notebook_cell", "notebook_id", "cell_id"),)
+
+    sub_id = Column(Integer, ForeignKey("submission.id", ondelete="CASCADE"), primary_key=True)
+    notebook_id = Column(String(255), primary_key=True)
+    cell_id = Column(String(255), primary_key=True)
+    auto_score = Column(Float, nullable=True)
+    manual_score = Column(Float, nullable=True)
+    extra_credit = Column(Float, nullable=True)
+    max_score = Column(Float, nullable=True)
+    failed_tests = Column(Boolean, nullable=True)
+    needs_manual_grade = Column(Boolean, nullable=True)
+
+    submission = relationship("Submission", back_populates="grades")
+
+    @property
+    def score(self) -> float:
+        """The overall score, with the same precedence rules as the gradebook grade."""
+        score = self.manual_score if self.manual_score is not None else self.auto_score
+        return (score or 0.0) + (self.extra_credit or 0.0)
+
+    @classmethod
+    def from_gradebook(cls, sub_id: int, gradebook: "GradeBookModel") -> List["SubmissionGrade"]:
+        """Create one row for every grade in every notebook of the gradebook."""
+        return [
+            cls(
+                sub_id=sub_id,
+                notebook_id=notebook_id,
+                cell_id=grade_id,
+                auto_score=grade.auto_score,
+                manual_score=grade.manual_score,
+                extra_credit=grade.extra_credit,
+                max_score=grade.max_score,
+                failed_tests=grade.failed_tests,
+                needs_manual_grade=grade.needs_manual_grade,
+            )
+            for notebook_id, notebook in gradebook.notebooks.items()
+            for grade_id, grade in notebook.grades_dict.items()
+        ]
+
+    @classmethod
+    def replace(cls, db: Session, sub_id: int, gradebook: "GradeBookModel") -> None:
+        """Replace the stored grades of a submission with the ones of the gradebook.
+
+        The changes are added to the session but not committed.
+        """
+        db.query(cls).filter(cls.sub_id == sub_id).delete(synchronize_session=False)
+        db.add_all(cls.from_gradebook(sub_id, gradebook))
@@ -1,12 +1,13 @@
-from sqlalchemy import Column, ForeignKey, Integer, Text
+from sqlalchemy import Column, ForeignKey, Integer
 from sqlalchemy.orm import relationship
 
 from grader_service.orm.base import Base, Serializable
+from grader_service.orm.json_util import CompressedText
 
 
 class SubmissionLogs(Base, Serializable):
     __tablename__ = "submission_logs"
     sub_id = Column(Integer, ForeignKey("submission.id", ondelete="CASCADE"), primary_key=True)
-    logs = Column(Text, nullable=True)
+    logs = Column(CompressedText, nullable=True)
 
     submission = relationship("Submission", back_populates="logs")
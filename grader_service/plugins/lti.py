@@ -1,17 +1,148 @@
+import asyncio
 import datetime
 import json
 import os
+import re
+import threading
 import time
+from collections import OrderedDict
 from http import HTTPStatus
-from urllib.parse import urlparse
+from typing import Awaitable, Dict, List, Optional, Tuple
+from typing import Callable as CallableType
+from typing import Union as UnionType
+from urllib.parse import urljoin, urlparse
+from weakref import WeakKeyDictionary
 
 import jwt
 from tornado.escape import json_decode, url_escape
-from tornado.httpclient import AsyncHTTPClient, HTTPClientError, HTTPRequest
+from tornado.httpclient import AsyncHTTPClient, HTTPClientError, HTTPRequest, HTTPResponse
 from tornado.web import HTTPError
-from traitlets import Bool, Callable, Unicode, Union
+from traitlets import Bool, Callable, Float, Int, Unicode, Union
+from traitlets import List as ListTrait
 from traitlets.config import SingletonConfigurable
 
+# expiry assumed if the platform does not return expires_in (as recommended by LTI Advantage)
+DEFAULT_TOKEN_EXPIRES_IN = 3600
+
+TokenKey = Tuple[str, str, Tuple[str, ...]]
+
+
+class LTITokenCache:
+    """Process-wide cache of LTI access tokens keyed by (token_url, client_id, scopes).
+
+    Tokens are reused until ``expires_in`` of the token response minus a safety
+    margin has passed. Concurrent syncs waiting for the same token share a single
+    token request. The locks are kept per event loop because every celery task
+    runs its sync in a new loop.
+    """
+
+    def __init__(self):
+        self._tokens: Dict[TokenKey, Tuple[float, str]] = {}
+        self._locks: WeakKeyDictionary = WeakKeyDictionary()
+
+    async def get(
+        self,
+        key: TokenKey,
+        request_token: CallableType[[], Awaitable[UnionType[dict, str]]],
+        expiry_margin: float = 0,
+    ) -> str:
+        """Returns the cached access token or requests a new one with ``request_token``,
+        which returns either the decoded token response of the platform or only the access
+        token, which is then assumed to expire after DEFAULT_TOKEN_EXPIRES_IN seconds.
+        """
+        token = self._valid_token(key)
+        if token is not None:
+            return token
+        locks = self._locks.setdefault(asyncio.get_running_loop(), {})
+        async with locks.setdefault(key, asyncio.Lock()):
+            # another sync might have requested the token while we were waiting
+            token = self._valid_token(key)
+            if token is not None:
+                return token
+            response = await request_token()
+            if isinstance(response, str):
+                response = {"access_token": response}
+            expires_in = response.get("expires_in")
+            if expires_in is None:
+                expires_in = DEFAULT_TOKEN_EXPIRES_IN
+            expires_in = float(expires_in)
+            token = response["access_token"]
+            self._tokens[key] = (time.monotonic() + expires_in - expiry_margin, token)
+            return token
+
+    def invalidate(self, key: TokenKey, token: Optional[str] = None) -> None:
+        """Removes the cached token of the key, e.g. after the platform rejected it.
+        If token is given, the cached token is only removed if it is still this token,
+        so that concurrent requests rejecting the same token request a new one only once.
+        """
+        entry = self._tokens.get(key)
+        if entry is not None and (token is None or entry[1] == token):
+            self._tokens.pop(key, None)
+
+    def clear(self) -> None:
+        self._tokens.clear()
+        self._locks.clear()
+
+    def _valid_token(self, key: TokenKey) -> Optional[str]:
+        entry = self._tokens.get(key)
+        if entry is None or time.monotonic() >= entry[0]:
+            return None
+        return entry[1]
+
+
+token_cache = LTITokenCache()
+
+
+class LTIContainerCache:
+    """Short-lived process-wide cache of NRPS membership containers and AGS line item
+    lists keyed by their URL.
+
+    Besides the items, the ETag of the response is kept so that expired entries can be
+    revalidated with If-None-Match instead of downloading the container again.
+    """
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, url: str) -> Optional[Tuple[float, Optional[str], list]]:
+        """Returns (fetched_at, etag, items) of the url, regardless of its age."""
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is not None:
+                self._entries.move_to_end(url)
+            return entry
+
+    def set(self, url: str, etag: Optional[str], items: list) -> None:
+        with self._lock:
+            self._entries[url] = (time.monotonic(), etag, items)
+            self._entries.move_to_end(url)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, url: str) -> None:
+        with self._lock:
+            self._entries.pop(url, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+container_cache = LTIContainerCache()
+
+_LINK_NEXT = re.compile(r'<([^>]*)>\s*;(?:[^,]*;)?\s*rel="?next"?', re.IGNORECASE)
+
+
+def next_page_url(response) -> Optional[str]:
+    """Returns the target of the Link header with rel="next" used for paging by NRPS and AGS."""
+    for link in response.headers.get_list("Link"):
+        match = _LINK_NEXT.search(link)
+        if match is not None:
+            return urljoin(response.effective_url, match.group(1))
+    return None
+
 
 def default_lti_username_match(member, submission, log) -> bool:
     return False
@@ -72,8 +203,84 @@ class LTISyncGrades(SingletonConfigurable):
         help="Returns membership and lineitem URL needed for grade sync",
     )
 
-    # cache for lti token
-    cache_token = {"token": None, "ttl": datetime.datetime.now()}
+    scopes = ListTrait(
+        Unicode(),
+        default_value=[
+            "https://purl.imsglobal.org/spec/lti-ags/scope/score",
+            "https://purl.imsglobal.org/spec/lti-ags/scope/lineitem",
+            "https://purl.imsglobal.org/spec/lti-nrps/scope/contextmembership.readonly",
+        ],
+        config=True,
+        help="Scopes requested for the access token used to sync grades.",
+    )
+    token_expiry_margin = Int(
+        60,
+        config=True,
+        help="Seconds before the expiry of an access token at which a new token is requested.",
+    )
+
+    feedback_sync_window = Int(
+        30,
+        config=True,
+        help="""
+        Seconds for which syncs triggered by feedback generation are collected per
+        assignment and then published as one batch. If 0, every feedback generation
+        syncs its submission immediately.
+        """,
+    )
+    feedback_sync_max_attempts = Int(
+        5,
+        config=True,
+        help="""
+        How often a batch of feedback-triggered syncs is attempted before its submissions
+        are dropped. Failed batches are retried after feedback_sync_window seconds, doubled
+        for every further attempt. Submissions rejected by the platform with a 4xx response
+        other than 429 are dropped immediately.
+        """,
+    )
+    container_cache_ttl = Int(
+        60,
+        config=True,
+        help="""
+        Seconds for which the membership and line items of a course are reused by
+        subsequent syncs before they are revalidated with the platform.
+        """,
+    )
+
+    member_key = Callable(
+        default_value=None,
+        config=True,
+        allow_none=True,
+        help="""
+        Function returning the key of an LTI member object, e.g. its username. If set
+        together with submission_key, members are indexed by this key and submissions are
+        matched by lookup instead of calling username_match for every member.
+        """,
+    )
+    submission_key = Callable(
+        default_value=None,
+        config=True,
+        allow_none=True,
+        help="""
+        Function returning the key of a submission object (including user information)
+        that is looked up in the member index built with member_key.
+        """,
+    )
+
+    max_concurrent_requests = Int(
+        8, config=True, help="Maximum number of scores published to the LTI platform in parallel."
+    )
+    max_retries = Int(
+        3, config=True, help="How often publishing a score is retried after a 429 or 5xx response."
+    )
+    retry_backoff = Float(
+        0.5,
+        config=True,
+        help="""
+        Seconds to wait before the first retry, doubled for every further retry.
+        A Retry-After header of the platform takes precedence.
+        """,
+    )
 
     def check_if_lti_enabled(self, lecture, assignment, submissions, feedback_sync):
         if callable(self.enabled):
@@ -99,15 +306,7 @@ class LTISyncGrades(SingletonConfigurable):
 
         # 1. request bearer token
         self.log.debug("LTI: request bearer token")
-        stamp = datetime.datetime.now()
-        if self.cache_token["token"] and self.cache_token["ttl"] > stamp - datetime.timedelta(
-            minutes=50
-        ):
-            token = self.cache_token["token"]
-        else:
-            token = await self.request_bearer_token()
-            self.cache_token["token"] = token
-            self.cache_token["ttl"] = datetime.datetime.now()
+        await self.access_token()
 
         # 2. resolve lti urls
         self.log.debug("LTI: resolve lti url")
@@ -121,55 +320,39 @@ class LTISyncGrades(SingletonConfigurable):
             raise e
         # 3. get all members
         self.log.debug("LTI: request all members of lti course")
-        httpclient = AsyncHTTPClient()
         try:
-            response = await httpclient.fetch(
-                HTTPRequest(
-                    url=membership_url,
-                    method="GET",
-                    headers={
-                        "Authorization": "Bearer " + self.cache_token["token"],
-                        "Accept": "application/vnd.ims.lti-nrps.v2.membershipcontainer+json",
-                    },
-                )
+            members = await self.fetch_container(
+                membership_url,
+                accept="application/vnd.ims.lti-nrps.v2.membershipcontainer+json",
+                get_items=lambda body: body["members"],
             )
         except HTTPClientError as e:
             self.log.error(e.response)
             raise HTTPError(e.code, reason="Unable to get users of course:" + e.response.reason)
-        members = json_decode(response.body)["members"]
 
         # 4. match usernames of submissions to lti memberships
         # and generate for each submission a request body -> grades list
         self.log.debug("LTI: match grader usernames with lti identifier")
         grades = []
-        syncable_user_count = 0
-        for submission in submissions:
-            for member in members:
-                if self.username_match(member, submission, self.log):
-                    syncable_user_count += 1
-                    grades.append(
-                        self.build_grade_publish_body(
-                            member["user_id"], submission["score"], float(assignment["points"])
-                        )
-                    )
+        for submission, member in self.match_members(members, submissions):
+            grades.append(
+                self.build_grade_publish_body(
+                    member["user_id"], submission["score"], float(assignment["points"])
+                )
+            )
+        syncable_user_count = len(grades)
         self.log.info(f"LTI: matched {syncable_user_count} users")
         # 6. get all lineitems
         self.log.debug("LTI: resolve lti url")
         try:
-            response = await httpclient.fetch(
-                HTTPRequest(
-                    url=lineitems_url,
-                    method="GET",
-                    headers={
-                        "Authorization": "Bearer " + self.cache_token["token"],
-                        "Accept": "application/vnd.ims.lis.v2.lineitemcontainer+json",
-                    },
-                )
+            lineitems = await self.fetch_container(
+                lineitems_url,
+                accept="application/vnd.ims.lis.v2.lineitemcontainer+json",
+                get_items=lambda body: body,
             )
         except HTTPClientError as e:
             self.log.error(e.response)
             raise HTTPError(e.code, reason="Unable to get lineitems of course:" + e.response.reason)
-        lineitems = json_decode(response.body)
         self.log.debug(f"LTI found lineitems: {lineitems}")
 
         # 7. check if a lineitem with assignment name exists
@@ -192,15 +375,12 @@ class LTISyncGrades(SingletonConfigurable):
                 "endDateTime": str(datetime.date.today() + datetime.timedelta(days=1, hours=1)),
             }
             try:
-                response = await httpclient.fetch(
+                response = await self.fetch(
                     HTTPRequest(
                         url=lineitems_url,
                         method="POST",
                         body=json.dumps(lineitem_body),
-                        headers={
-                            "Authorization": "Bearer " + self.cache_token["token"],
-                            "Content-Type": "application/vnd.ims.lis.v2.lineitem+json",
-                        },
+                        headers={"Content-Type": "application/vnd.ims.lis.v2.lineitem+json"},
                     )
                 )
             except HTTPClientError as e:
@@ -208,6 +388,7 @@ class LTISyncGrades(SingletonConfigurable):
                 raise HTTPError(
                     e.code, reason="Unable to create new lineitem in course:" + e.response.reason
                 )
+            container_cache.invalidate(lineitems_url)
             # due to different "interpretations" of the ims lti standard,
             # the response is sometimes a list containing the lineitem or
             # just the lineitem json
@@ -229,27 +410,188 @@ class LTISyncGrades(SingletonConfigurable):
 
         # 9. push grades to lineitem
         url_parsed = urlparse(lineitem["id"])
-        lineitem = url_parsed._replace(path=url_parsed.path + "/scores").geturl()
+        scores_url = url_parsed._replace(path=url_parsed.path + "/scores").geturl()
         self.log.debug("LTI: start sending grades to LTI course")
-        synced_user = 0
-        for grade in grades:
+        failed_users = await self.publish_grades(scores_url, grades)
+        synced_user = syncable_user_count - len(failed_users)
+        self.log.info(
+            f"LTI Grade Sync finished: {synced_user} of {syncable_user_count} scores published"
+        )
+        return {
+            "syncable_users": syncable_user_count,
+            "synced_user": synced_user,
+            "failed_users": failed_users,
+        }
+
+    async def access_token(self) -> str:
+        """Returns the cached access token of the platform or requests a new one."""
+        return await token_cache.get(
+            self._token_key, self._request_token, expiry_margin=self.token_expiry_margin
+        )
+
+    async def _request_token(self) -> UnionType[dict, str]:
+        # an overridden request_bearer_token only returns the access token
+        if getattr(self.request_bearer_token, "__func__", None) is not (
+            LTISyncGrades.request_bearer_token
+        ):
+            return await self.request_bearer_token()
+        return await self.request_token_response()
+
+    @property
+    def _token_key(self) -> TokenKey:
+        return (self.token_url, self.client_id, tuple(self.scopes))
+
+    async def fetch(self, request: HTTPRequest) -> HTTPResponse:
+        """Fetches the request with the access token of the platform.
+
+        If the platform rejects the token with 401, e.g. because it was revoked before it
+        expired, the token is invalidated and the request is retried once with a new token.
+        """
+        for attempt in range(2):
+            token = await self.access_token()
+            request.headers["Authorization"] = "Bearer " + token
             try:
-                response = await httpclient.fetch(
-                    HTTPRequest(
-                        url=lineitem,
-                        method="POST",
-                        body=json.dumps(grade),
-                        headers={
-                            "Authorization": "Bearer " + self.cache_token["token"],
-                            "Content-Type": "application/vnd.ims.lis.v1.score+json",
-                        },
-                    )
+                return await AsyncHTTPClient().fetch(request)
+            except HTTPClientError as e:
+                if e.code != HTTPStatus.UNAUTHORIZED or attempt == 1:
+                    raise
+                self.log.warning("LTI: access token was rejected, requesting a new one")
+                token_cache.invalidate(self._token_key, token)
+
+    async def fetch_container(
+        self, url: str, accept: str, get_items: CallableType[[dict], list]
+    ) -> list:
+        """Returns the items of a paged NRPS or AGS container, e.g. the members of a course.
+
+        The items are cached for container_cache_ttl seconds. Afterwards, the first page is
+        revalidated with its ETag and the cached items are reused if the platform responds
+        with 304 Not Modified. Containers that span several pages are always fetched again
+        since the ETag only covers the first page.
+
+        :param get_items: returns the list of items from a decoded page
+        """
+        cached = container_cache.get(url)
+        if cached is not None and time.monotonic() - cached[0] < self.container_cache_ttl:
+            self.log.debug(f"LTI: using cached container {url}")
+            return cached[2]
+
+        headers = {"Accept": accept}
+        revalidate = cached is not None and cached[1] is not None
+        if revalidate:
+            headers["If-None-Match"] = cached[1]
+        try:
+            response = await self.fetch(HTTPRequest(url=url, method="GET", headers=headers))
+        except HTTPClientError as e:
+            if e.code != HTTPStatus.NOT_MODIFIED:
+                raise
+            if revalidate:
+                self.log.debug(f"LTI: container {url} not modified")
+                container_cache.set(url, cached[1], cached[2])
+                return cached[2]
+            # not a response to our revalidation, e.g. of a caching proxy, so there are
+            # no cached items to reuse
+            self.log.debug(f"LTI: unexpected 304 for container {url}, fetching it again")
+            response = await self.fetch(
+                HTTPRequest(
+                    url=url, method="GET", headers={"Accept": accept, "Cache-Control": "no-cache"}
                 )
-                synced_user += 1
+            )
+
+        items = list(get_items(json_decode(response.body)))
+        next_url = next_page_url(response)
+        etag = response.headers.get("ETag") if next_url is None else None
+        while next_url is not None:
+            response = await self.fetch(
+                HTTPRequest(url=next_url, method="GET", headers={"Accept": accept})
+            )
+            items.extend(get_items(json_decode(response.body)))
+            next_url = next_page_url(response)
+        container_cache.set(url, etag, items)
+        return items
+
+    def match_members(self, members: List[dict], submissions: List[dict]) -> List[tuple]:
+        """Returns (submission, member) pairs of all submissions matching an LTI member.
+
+        Uses an index of the members if member_key and submission_key are configured,
+        otherwise username_match is called for every pair.
+        """
+        if self.member_key is None or self.submission_key is None:
+            return [
+                (submission, member)
+                for submission in submissions
+                for member in members
+                if self.username_match(member, submission, self.log)
+            ]
+
+        index: Dict[str, List[dict]] = {}
+        for member in members:
+            index.setdefault(self.member_key(member), []).append(member)
+        return [
+            (submission, member)
+            for submission in submissions
+            for member in index.get(self.submission_key(submission), [])
+        ]
+
+    async def publish_grades(self, scores_url: str, grades: List[dict]) -> List[dict]:
+        """Posts the grades to the scores endpoint of the lineitem with at most
+        max_concurrent_requests requests in flight.
+
+        :return: the user id, status code and reason of every score that could not be published
+        """
+        semaphore = asyncio.Semaphore(max(1, self.max_concurrent_requests))
+
+        async def publish(grade: dict) -> Optional[dict]:
+            async with semaphore:
+                error = await self._post_score(scores_url, grade)
+            if error is None:
+                return None
+            self.log.error(f"LTI: could not publish score of user {grade['userId']}: {error!r}")
+            status = error.code if isinstance(error, HTTPClientError) else None
+            return {
+                "user_id": grade["userId"],
+                "status": status,
+                "reason": str(error) or repr(error),
+            }
+
+        results = await asyncio.gather(*[publish(grade) for grade in grades])
+        return [failure for failure in results if failure is not None]
+
+    async def _post_score(self, scores_url: str, grade: dict):
+        """Posts a single score, retrying on rate limits, server and connection errors.
+
+        :return: None on success, else the last HTTPClientError or OSError
+        """
+        request = HTTPRequest(
+            url=scores_url,
+            method="POST",
+            body=json.dumps(grade),
+            headers={"Content-Type": "application/vnd.ims.lis.v1.score+json"},
+        )
+        for attempt in range(self.max_retries + 1):
+            try:
+                await self.fetch(request)
+                return None
             except HTTPClientError as e:
-                self.log.error(e.response)
-        self.log.info("LTI Grade Sync finished successfully")
-        return {"syncable_users": syncable_user_count, "synced_user": synced_user}
+                # 599 is used by tornado for timeouts
+                retryable = e.code == HTTPStatus.TOO_MANY_REQUESTS or e.code >= 500
+                if not retryable or attempt == self.max_retries:
+                    return e
+                await asyncio.sleep(self._retry_delay(e, attempt))
+            except OSError as e:
+                # connection errors, e.g. ConnectionRefusedError, are raised by tornado as is
+                if attempt == self.max_retries:
+                    return e
+                await asyncio.sleep(self._retry_delay(e, attempt))
+
+    def _retry_delay(self, error: Exception, attempt: int) -> float:
+        response = getattr(error, "response", None)
+        retry_after = response.headers.get("Retry-After") if response else None
+        if retry_after is not None:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+        return self.retry_backoff * 2**attempt
 
     def build_grade_publish_body(self, uid: str, score: float, max_score: float):
         return {
@@ -264,7 +606,21 @@ class LTISyncGrades(SingletonConfigurable):
             "userId": uid,
         }
 
-    async def request_bearer_token(self):
+    async def request_bearer_token(self) -> str:
+        """Requests an access token from the platform with the client credentials grant.
+
+        Subclasses overriding this method are still supported; their tokens are cached
+        for DEFAULT_TOKEN_EXPIRES_IN seconds since the expiry of the token is unknown.
+
+        :return: the access token
+        """
+        return (await self.request_token_response())["access_token"]
+
+    async def request_token_response(self) -> dict:
+        """Requests an access token from the platform with the client credentials grant.
+
+        :return: the decoded token response including access_token and expires_in
+        """
         # get config variables
         if self.client_id is None:
             raise HTTPError(
@@ -300,12 +656,7 @@ class LTISyncGrades(SingletonConfigurable):
             raise HTTPError(
                 HTTPStatus.UNPROCESSABLE_ENTITY, reason=f"Unable to encode payload: {str(e)}"
             )
-        scopes = [
-            "https://purl.imsglobal.org/spec/lti-ags/scope/score",
-            "https://purl.imsglobal.org/spec/lti-ags/scope/lineitem",
-            "https://purl.imsglobal.org/spec/lti-nrps/scope/contextmembership.readonly",
-        ]
-        scopes = url_escape(" ".join(scopes))
+        scopes = url_escape(" ".join(self.scopes))
         data = (
             f"grant_type=client_credentials&client_assertion_type=urn%3Aietf%3Aparams%3Aoauth%3Aclient-assertion"
             f"-type%3Ajwt-bearer&client_assertion={encoded}&scope={scopes}"
@@ -326,4 +677,4 @@ class LTISyncGrades(SingletonConfigurable):
         except HTTPClientError as e:
             self.log.error(e.response)
             raise HTTPError(e.code, reason="Unable to request token:" + e.response.reason)
-        return json_decode(response.body)["access_token"]
+        return json_decode(response.body)
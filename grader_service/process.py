@@ -0,0 +1,88 @@
+# Copyright (c) 2022, TU Wien
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+"""Runs subprocesses of the service without blocking the event loop.
+
+All short-lived processes started by request handlers go through ProcessRunner, which
+limits the number of processes running at the same time and kills processes that exceed
+the timeout. The streaming git RPCs are not run through it.
+"""
+
+import asyncio
+import subprocess
+import weakref
+from typing import Mapping, Optional, Sequence
+
+from traitlets import Integer
+from traitlets.config import SingletonConfigurable
+
+
+class ProcessRunner(SingletonConfigurable):
+    max_concurrent = Integer(
+        default_value=16,
+        allow_none=False,
+        config=True,
+        help="Maximum number of processes run by request handlers at the same time. "
+        "Further processes wait until one of them finishes.",
+    )
+
+    timeout = Integer(
+        default_value=300,
+        allow_none=False,
+        config=True,
+        help="Seconds after which a process run by a request handler is killed, "
+        "0 disables the timeout.",
+    )
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        # an asyncio.Semaphore can only be used by the event loop it was first used in
+        self._semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]"
+        self._semaphores = weakref.WeakKeyDictionary()
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self.max_concurrent)
+        return semaphore
+
+    async def run(
+        self,
+        args: Sequence[str],
+        cwd: Optional[str] = None,
+        env: Optional[Mapping[str, str]] = None,
+        input: Optional[bytes] = None,
+        check: bool = True,
+        timeout: Optional[float] = None,
+    ) -> subprocess.CompletedProcess:
+        """Runs the command and returns its result like subprocess.run with captured output.
+
+        :param timeout: seconds after which the process is killed, defaults to self.timeout
+        :raises subprocess.CalledProcessError: if check is set and the process fails
+        :raises subprocess.TimeoutExpired: if the process was killed because of the timeout
+        :raises FileNotFoundError: if the executable or cwd do not exist
+        """
+        if timeout is None:
+            timeout = self.timeout or None
+        async with self._semaphore():
+            process = await asyncio.create_subprocess_exec(
+                *args,
+                stdin=subprocess.DEVNULL if input is None else subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                cwd=cwd,
+                env=env,
+            )
+            try:
+                stdout, stderr = await asyncio.wait_for(process.communicate(input), timeout)
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+                raise subprocess.TimeoutExpired(list(args), timeout)
+
+        if check and process.returncode != 0:
+            raise subprocess.CalledProcessError(process.returncode, list(args), stdout, stderr)
+        return subprocess.CompletedProcess(list(args), process.returncode, stdout, stderr)
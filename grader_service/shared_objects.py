@@ -0,0 +1,196 @@
+# Copyright (c) 2022, TU Wien
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+"""Shared-object mode of the git repositories of an assignment.
+
+The user, autograde, feedback and edit repositories of an assignment mostly contain
+the objects of its release repository. In shared-object mode they borrow these objects
+through ``objects/info/alternates`` instead of storing their own copies. Objects that
+are pushed to a repository are still stored in the repository itself.
+
+Since borrowing repositories break if objects of the release repository are removed,
+unreachable objects of the release repository are never pruned (``gc.pruneExpire``).
+Edit repositories borrow from the user repository instead, which keeps the submitted
+commit reachable through ``refs/edit/<submission id>`` until the submission is collected.
+"""
+
+import argparse
+import logging
+import os
+import subprocess
+from typing import Iterator, List, Tuple
+
+from grader_service.handlers.handler_utils import GitRepoType
+
+logger = logging.getLogger(__name__)
+
+# repository types that can borrow objects from the release repository
+BORROWING_REPO_TYPES = (
+    GitRepoType.USER,
+    GitRepoType.AUTOGRADE,
+    GitRepoType.FEEDBACK,
+    GitRepoType.EDIT,
+)
+
+
+def _alternates_file(repo_path: str) -> str:
+    return os.path.join(repo_path, "objects", "info", "alternates")
+
+
+def get_alternates(repo_path: str) -> List[str]:
+    """Returns the object directories the bare repository borrows objects from."""
+    try:
+        with open(_alternates_file(repo_path)) as f:
+            lines = f.read().splitlines()
+    except FileNotFoundError:
+        return []
+    objects_path = os.path.join(repo_path, "objects")
+    return [
+        os.path.normpath(os.path.join(objects_path, line))
+        for line in lines
+        if line and not line.startswith("#")
+    ]
+
+
+def share_objects(repo_path: str, release_repo_path: str, never_prune: bool = True) -> bool:
+    """Lets the bare repository borrow objects from the release repository.
+
+    Edit repositories also use this to borrow the objects of the user repository, which
+    is passed as release_repo_path then. The alternate is stored relative to the
+    repository, so that the grader service directory can be moved.
+
+    :param never_prune: disable pruning of unreachable objects in the release repository.
+        Callers that protect the borrowed objects with a ref pass False.
+    :return: True if the alternate was added, False if the release repository does not
+        exist or is already an alternate
+    """
+    release_objects = os.path.join(release_repo_path, "objects")
+    if not os.path.isdir(release_objects):
+        return False
+    if os.path.normpath(release_objects) in get_alternates(repo_path):
+        return False
+
+    if never_prune:
+        subprocess.run(
+            ["git", "config", "gc.pruneExpire", "never"],
+            cwd=release_repo_path,
+            check=True,
+            capture_output=True,
+        )
+    alternates_file = _alternates_file(repo_path)
+    os.makedirs(os.path.dirname(alternates_file), exist_ok=True)
+    relative = os.path.relpath(release_objects, os.path.join(repo_path, "objects"))
+    with open(alternates_file, "a") as f:
+        f.write(relative + "\n")
+    return True
+
+
+def _loose_objects(repo_path: str) -> Iterator[Tuple[str, str]]:
+    """Yields (object id, file path) of the loose objects of the repository."""
+    objects_path = os.path.join(repo_path, "objects")
+    for prefix in os.listdir(objects_path):
+        if len(prefix) != 2 or not os.path.isdir(os.path.join(objects_path, prefix)):
+            continue
+        for name in os.listdir(os.path.join(objects_path, prefix)):
+            yield prefix + name, os.path.join(objects_path, prefix, name)
+
+
+def drop_shared_objects(repo_path: str, release_repo_path: str) -> None:
+    """Removes the objects of the repository that are available from the release repository.
+
+    Packed objects are dropped by repacking without borrowed objects. Loose objects are
+    not touched by repack, so the ones that exist in the release repository are deleted.
+    """
+    subprocess.run(
+        ["git", "repack", "-a", "-d", "-l", "-q"], cwd=repo_path, check=True, capture_output=True
+    )
+    loose = dict(_loose_objects(repo_path))
+    if not loose:
+        return
+    out = subprocess.run(
+        ["git", "cat-file", "--batch-check=%(objectname)"],
+        cwd=release_repo_path,
+        input="\n".join(loose) + "\n",
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    for line in out.splitlines():
+        # missing objects are reported as "<oid> missing"
+        if line in loose:
+            os.remove(loose[line])
+
+
+def iter_borrowing_repos(gitbase: str) -> Iterator[Tuple[str, str]]:
+    """Yields (repo_path, release_repo_path) of all repositories that can borrow objects,
+    based on the layout created by GraderBaseHandler.construct_git_dir.
+    """
+    for lecture in sorted(os.listdir(gitbase)):
+        lecture_path = os.path.join(gitbase, lecture)
+        if not os.path.isdir(lecture_path):
+            continue
+        for assignment in sorted(os.listdir(lecture_path)):
+            assignment_path = os.path.join(lecture_path, assignment)
+            release = os.path.join(assignment_path, GitRepoType.RELEASE)
+            if not os.path.isdir(release):
+                continue
+            for repo_type in BORROWING_REPO_TYPES:
+                type_path = os.path.join(assignment_path, repo_type)
+                if repo_type in {GitRepoType.AUTOGRADE, GitRepoType.FEEDBACK}:
+                    type_path = os.path.join(type_path, "user")
+                if not os.path.isdir(type_path):
+                    continue
+                for name in sorted(os.listdir(type_path)):
+                    repo_path = os.path.join(type_path, name)
+                    if os.path.isdir(os.path.join(repo_path, "objects")):
+                        yield repo_path, release
+
+
+def migrate(gitbase: str, repack: bool = True) -> int:
+    """Switches all existing repositories below gitbase to shared-object mode.
+
+    :param repack: remove the objects that are now available from the release repository
+    :return: number of migrated repositories
+    """
+    count = 0
+    for repo_path, release in iter_borrowing_repos(gitbase):
+        try:
+            if not share_objects(repo_path, release):
+                continue
+            if repack:
+                drop_shared_objects(repo_path, release)
+        except subprocess.CalledProcessError as e:
+            logger.error(f"Could not migrate {repo_path}: {e.stderr}")
+            continue
+        logger.info(f"Migrated {repo_path}")
+        count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Let existing user, autograde, feedback and edit repositories borrow "
+        "objects from the release repository of their assignment."
+    )
+    parser.add_argument("--config", "-f", required=True, help="Path to the config file")
+    parser.add_argument(
+        "--no-repack",
+        action="store_true",
+        help="Only add the alternates without removing the duplicated objects",
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    from grader_service.main import GraderService
+
+    service = GraderService.instance()
+    service.load_config_file(args.config)
+    gitbase = os.path.join(service.grader_service_dir, "git")
+    count = migrate(gitbase, repack=not args.no_repack)
+    logger.info(f"Migrated {count} repositories to shared-object mode")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+# Copyright (c) 2022, TU Wien
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+import asyncio
+import json
+from unittest.mock import patch
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from grader_service.auth.lti13.error import TokenError
+from grader_service.auth.lti13.validator import JWKSCache, LTI13LaunchValidator, jwks_cache
+
+JWKS_ENDPOINT = "https://platform.example.com/jwks"
+
+
+def _new_key(kid: str):
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    public_jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(private_key.public_key()))
+    public_jwk.update(kid=kid, use="sig", alg="RS256")
+    return private_key, public_jwk
+
+
+def _encode(private_key, kid: str) -> str:
+    return jwt.encode(
+        {"iss": "platform", "aud": "client"}, private_key, algorithm="RS256", headers={"kid": kid}
+    )
+
+
+@pytest.fixture
+def validator():
+    jwks_cache.clear()
+    validator = LTI13LaunchValidator()
+    yield validator
+    jwks_cache.clear()
+
+
+def _patch_fetch(*key_sets):
+    """Patch the JWKS fetch to return the given public keys, one list per fetch."""
+    responses = iter(key_sets)
+
+    async def fetch(jwks_endpoint):
+        await asyncio.sleep(0)
+        return jwt.PyJWKSet.from_dict({"keys": next(responses)})
+
+    return patch.object(JWKSCache, "_fetch", side_effect=fetch)
+
+
+async def _verify(validator, encoded_jwt):
+    return await validator.verify_and_decode_jwt(
+        encoded_jwt,
+        issuer="platform",
+        audience="client",
+        jwks_endpoint=JWKS_ENDPOINT,
+        jwks_algorithms=["RS256"],
+    )
+
+
+async def test_concurrent_launches_fetch_key_set_once(validator):
+    private_key, public_jwk = _new_key("key1")
+    encoded_jwt = _encode(private_key, "key1")
+
+    with _patch_fetch([public_jwk]) as fetch:
+        id_tokens = await asyncio.gather(*[_verify(validator, encoded_jwt) for _ in range(10)])
+        assert await _verify(validator, encoded_jwt) == id_tokens[0]
+
+    assert id_tokens[0]["iss"] == "platform"
+    assert fetch.call_count == 1
+
+
+async def test_unknown_kid_refreshes_key_set(validator):
+    old_key, old_jwk = _new_key("old")
+    new_key, new_jwk = _new_key("new")
+    validator.jwks_refresh_interval = 0
+
+    with _patch_fetch([old_jwk], [old_jwk, new_jwk]) as fetch:
+        await _verify(validator, _encode(old_key, "old"))
+        await _verify(validator, _encode(new_key, "new"))
+
+    assert fetch.call_count == 2
+
+
+async def test_unknown_kid_refresh_is_rate_limited(validator):
+    private_key, public_jwk = _new_key("key1")
+    other_key, _ = _new_key("other")
+
+    with _patch_fetch([public_jwk]) as fetch:
+        await _verify(validator, _encode(private_key, "key1"))
+        with pytest.raises(TokenError):
+            await _verify(validator, _encode(other_key, "other"))
+
+    assert fetch.call_count == 1
+
+
+async def test_expired_key_set_is_fetched_again(validator):
+    private_key, public_jwk = _new_key("key1")
+    encoded_jwt = _encode(private_key, "key1")
+    validator.jwks_cache_ttl = 0
+
+    with _patch_fetch([public_jwk], [public_jwk]) as fetch:
+        await _verify(validator, encoded_jwt)
+        await _verify(validator, encoded_jwt)
+
+    assert fetch.call_count == 2
+
+
+async def test_fetch_error_raises_token_error(validator):
+    private_key, _ = _new_key("key1")
+
+    with patch(
+        "grader_service.auth.lti13.validator.AsyncHTTPClient.fetch", side_effect=OSError("down")
+    ):
+        with pytest.raises(TokenError):
+            await _verify(validator, _encode(private_key, "key1"))
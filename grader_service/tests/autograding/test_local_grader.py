@@ -14,6 +14,7 @@ from grader_service.autograding.local_grader import (
 )
 from grader_service.orm import Assignment
 from grader_service.orm.submission import AutoStatus
+from grader_service.tests.handlers.db_util import get_gradebook_dict
 
 
 @pytest.fixture
@@ -63,6 +64,7 @@ def test_local_autograde_start_outcome_on_success(
     """Test the results of successfully calling `start`"""
     # Mock grades in the gradebook
     mock_notebook.score = 1
+    mock_notebook.grades_dict = {}
     mock_notebook_2 = copy.deepcopy(mock_notebook)
     mock_notebook_2.score = 2
     mock_gradebook.return_value.notebooks = {
@@ -300,6 +302,22 @@ def test_gradebook_writing(local_autograde_executor):
     assert content == gradebook_content
 
 
+def test_set_properties_stores_grades(local_autograde_executor):
+    """Test that the per-cell grades of the gradebook are stored next to the properties"""
+
+    os.makedirs(local_autograde_executor.output_path, exist_ok=True)
+    local_autograde_executor._write_gradebook(json.dumps(get_gradebook_dict(auto_score=1.5)))
+
+    local_autograde_executor._set_properties()
+
+    session = local_autograde_executor.session
+    (grades,), _ = session.add_all.call_args
+    assert [(g.sub_id, g.notebook_id, g.cell_id, g.auto_score) for g in grades] == [
+        (123, "nb1", "cell1", 1.5)
+    ]
+    assert local_autograde_executor.submission.grading_score == 1.5
+
+
 # =============== LocalAutogradeProcessExecutor tests ===============
 
 
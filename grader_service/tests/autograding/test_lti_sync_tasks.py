@@ -0,0 +1,174 @@
+# Copyright (c) 2022, TU Wien
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, MagicMock, PropertyMock, patch
+
+import pytest
+from tornado.web import HTTPError
+
+from grader_service.autograding.celery import tasks
+from grader_service.orm import Assignment, LTISyncBatch, LTISyncQueue, Submission
+from grader_service.orm.base import DeleteState
+from grader_service.tests.handlers.db_util import insert_student, insert_submission
+
+
+@pytest.fixture
+def session(sql_alchemy_sessionmaker):
+    session = sql_alchemy_sessionmaker()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def lti_plugin():
+    plugin = MagicMock()
+    plugin.feedback_sync_window = 30
+    plugin.feedback_sync_max_attempts = 3
+    plugin.check_if_lti_enabled.return_value = True
+    plugin.start = AsyncMock(return_value={"syncable_users": 1, "synced_user": 1})
+    with patch.object(tasks.LTISyncGrades, "instance", return_value=plugin):
+        yield plugin
+
+
+@pytest.fixture
+def apply_async(session):
+    with (
+        patch.object(tasks, "CeleryApp"),
+        patch.object(tasks.GraderTask, "session", new_callable=PropertyMock, return_value=session),
+        patch.object(tasks.lti_sync_batch_task, "apply_async") as apply_async,
+    ):
+        yield apply_async
+
+
+def _submission(session, user_id, username, days_ago=0, deleted=False):
+    submission = insert_submission(session.get_bind(), 1, username, user_id)
+    submission = session.get(Submission, submission.id)
+    submission.date = datetime.now(tz=timezone.utc) - timedelta(days=days_ago)
+    if deleted:
+        submission.deleted = DeleteState.deleted
+    session.commit()
+    return submission
+
+
+def test_feedback_sync_schedules_one_batch(session, lti_plugin, apply_async):
+    assignment = session.get(Assignment, 1)
+    lecture, model = assignment.lecture.serialize(), assignment.serialize()
+    subs = [_submission(session, 1, "ubuntu") for _ in range(2)]
+
+    for sub in subs:
+        tasks.lti_sync_task(lecture, model, [{"id": sub.id}], feedback_sync=True)
+
+    apply_async.assert_called_once_with((lecture["id"], 1), countdown=30)
+    lti_plugin.start.assert_not_called()
+    assert LTISyncQueue.peek(session, 1)[1] == [sub.id for sub in subs]
+
+    # a feedback generation after the batch ran schedules the next batch
+    LTISyncBatch.release(session, 1)
+    tasks.lti_sync_task(lecture, model, [{"id": subs[0].id}], feedback_sync=True)
+    assert apply_async.call_count == 2
+
+
+def test_batch_syncs_latest_submission_per_user(session, lti_plugin, apply_async):
+    student = insert_student(session.get_bind(), "student", 1)
+    older = _submission(session, 1, "ubuntu", days_ago=2)
+    latest = _submission(session, 1, "ubuntu", days_ago=1)
+    deleted = _submission(session, student.id, "student", deleted=True)
+    LTISyncQueue.push(session, 1, [latest.id, older.id, deleted.id])
+    lecture_id = session.get(Assignment, 1).lecture.id
+
+    tasks.lti_sync_batch_task(lecture_id, 1)
+
+    lti_plugin.start.assert_awaited_once()
+    _, _, submissions = lti_plugin.start.await_args.args
+    assert [s["id"] for s in submissions] == [latest.id]
+    assert LTISyncQueue.pending_attempts(session, 1) is None
+    apply_async.assert_not_called()
+
+
+def test_batch_only_deleted_submissions(session, lti_plugin, apply_async):
+    deleted = _submission(session, 1, "ubuntu", deleted=True)
+    LTISyncQueue.push(session, 1, [deleted.id])
+
+    assert tasks.lti_sync_batch_task(session.get(Assignment, 1).lecture.id, 1) is None
+
+    lti_plugin.start.assert_not_called()
+    assert LTISyncQueue.pending_attempts(session, 1) is None
+    apply_async.assert_not_called()
+
+
+def test_batch_reschedules_entries_queued_during_sync(session, lti_plugin, apply_async):
+    first, second = _submission(session, 1, "ubuntu"), _submission(session, 1, "ubuntu")
+    LTISyncQueue.push(session, 1, [first.id])
+    LTISyncBatch.schedule(session, 1, 30)
+    lecture_id = session.get(Assignment, 1).lecture.id
+
+    async def start(*args):
+        LTISyncQueue.push(session, 1, [second.id])
+        assert LTISyncBatch.schedule(session, 1, 30) is False
+
+    lti_plugin.start.side_effect = start
+    tasks.lti_sync_batch_task(lecture_id, 1)
+
+    assert LTISyncQueue.peek(session, 1)[1] == [second.id]
+    apply_async.assert_called_once_with((lecture_id, 1), countdown=30)
+
+
+def test_batch_keeps_entries_when_sync_fails(session, lti_plugin, apply_async):
+    submission = _submission(session, 1, "ubuntu")
+    LTISyncQueue.push(session, 1, [submission.id])
+    lecture_id = session.get(Assignment, 1).lecture.id
+
+    lti_plugin.start.side_effect = ConnectionRefusedError()
+    for countdown in [60, 120]:
+        with pytest.raises(HTTPError):
+            tasks.lti_sync_batch_task(lecture_id, 1)
+        assert LTISyncQueue.peek(session, 1)[1] == [submission.id]
+        apply_async.assert_called_once_with((lecture_id, 1), countdown=countdown)
+        apply_async.reset_mock()
+
+    # the entries are dropped after feedback_sync_max_attempts
+    with pytest.raises(HTTPError):
+        tasks.lti_sync_batch_task(lecture_id, 1)
+    assert LTISyncQueue.pending_attempts(session, 1) is None
+    apply_async.assert_not_called()
+
+
+@pytest.mark.parametrize("status, dropped", [(403, True), (429, False), (503, False)])
+def test_batch_drops_entries_rejected_by_platform(
+    session, lti_plugin, apply_async, status, dropped
+):
+    submission = _submission(session, 1, "ubuntu")
+    LTISyncQueue.push(session, 1, [submission.id])
+    lecture_id = session.get(Assignment, 1).lecture.id
+
+    lti_plugin.start.side_effect = HTTPError(status, reason="rejected")
+    with pytest.raises(HTTPError):
+        tasks.lti_sync_batch_task(lecture_id, 1)
+
+    assert (LTISyncQueue.pending_attempts(session, 1) is None) == dropped
+    assert apply_async.called != dropped
+
+
+def test_batch_not_scheduled_twice(session, lti_plugin, apply_async):
+    submission = _submission(session, 1, "ubuntu")
+    LTISyncQueue.push(session, 1, [submission.id])
+    lecture_id = session.get(Assignment, 1).lecture.id
+
+    async def start(*args):
+        # a feedback generation finishing while the batch is running
+        LTISyncQueue.push(session, 1, [submission.id])
+
+    lti_plugin.start.side_effect = start
+    tasks.lti_sync_batch_task(lecture_id, 1)
+    # a feedback generation racing with the reschedule of the batch
+    tasks.lti_sync_task(
+        session.get(Assignment, 1).lecture.serialize(),
+        session.get(Assignment, 1).serialize(),
+        [{"id": submission.id}],
+        feedback_sync=True,
+    )
+
+    apply_async.assert_called_once_with((lecture_id, 1), countdown=30)
@@ -27,6 +27,21 @@ from grader_service.tests.handlers.db_util import (
 )
 
 
+def pytest_addoption(parser):
+    parser.addoption(
+        "--run-benchmarks", action="store_true", help="Run the tests marked as benchmark."
+    )
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--run-benchmarks"):
+        return
+    skip = pytest.mark.skip(reason="benchmark, use --run-benchmarks to run it")
+    for item in items:
+        if "benchmark" in item.keywords:
+            item.add_marker(skip)
+
+
 @pytest.fixture(scope="function")
 def enable_foreign_keys_for_sqlite():
     """
@@ -2,11 +2,13 @@ import os
 import shutil
 from unittest.mock import patch
 
+import nbformat
 import pytest
 from nbclient.client import NotebookClient
 
 from grader_service.api.models.assignment_settings import AssignmentSettings
 from grader_service.convert.converters import Autograde
+from grader_service.convert.preprocessors import ClearOutput, SaveAutoGrades
 from grader_service.tests.convert.converters import (
     _create_input_output_dirs,
     _generate_test_submission,
@@ -166,3 +168,74 @@ def test_autograde_with_missing_submission_file(tmp_path):
     assert autograder.notebooks == [str(student_nb)]
     assert (output_dir2 / "gradebook.json").exists()
     assert (output_dir2 / "student.ipynb").exists()
+
+
+@pytest.mark.parametrize("checkpoint", [False, True])
+def test_autograde_passes_sanitized_notebook_in_memory(tmp_path, checkpoint):
+    input_dir, output_dir = _create_input_output_dirs(tmp_path, ["simple.ipynb"])
+    _generate_test_submission(input_dir, output_dir)
+
+    output_dir2 = tmp_path / "output_dir2"
+    output_dir2.mkdir()
+    shutil.copyfile(output_dir / "gradebook.json", output_dir2 / "gradebook.json")
+
+    write_patch = patch.object(
+        Autograde,
+        "write_single_notebook",
+        autospec=True,
+        side_effect=Autograde.write_single_notebook,
+    )
+    read_patch = patch("nbformat.read", wraps=nbformat.read)
+    with (
+        patch.object(NotebookClient, "kernel_name", "python3"),
+        read_patch as read,
+        write_patch as write,
+    ):
+        Autograde(
+            input_dir=str(output_dir),
+            output_dir=str(output_dir2),
+            file_pattern="*.ipynb",
+            assignment_settings=AssignmentSettings(),
+            sanitize_checkpoint=checkpoint,
+            config=None,
+        ).start()
+
+    assert read.call_count == 1
+    assert write.call_count == (2 if checkpoint else 1)
+    nb = nbformat.read(output_dir2 / "simple.ipynb", as_version=4)
+    assert any(cell.get("outputs") for cell in nb.cells)
+
+
+def test_autograde_sets_notebook_metadata(tmp_path):
+    input_dir, output_dir = _create_input_output_dirs(tmp_path, ["simple.ipynb"])
+    _generate_test_submission(input_dir, output_dir)
+
+    output_dir2 = tmp_path / "output_dir2"
+    output_dir2.mkdir()
+    shutil.copyfile(output_dir / "gradebook.json", output_dir2 / "gradebook.json")
+
+    metadata = []
+
+    def preprocess(self, nb, resources):
+        metadata.append(dict(resources["metadata"]))
+        return nb, resources
+
+    with (
+        patch.object(NotebookClient, "kernel_name", "python3"),
+        patch.object(ClearOutput, "preprocess", preprocess),
+        patch.object(SaveAutoGrades, "preprocess", preprocess),
+    ):
+        Autograde(
+            input_dir=str(output_dir),
+            output_dir=str(output_dir2),
+            file_pattern="*.ipynb",
+            assignment_settings=AssignmentSettings(),
+            config=None,
+        ).start()
+
+    # like Exporter.from_filename of the submitted and of the sanitized notebook
+    assert [(m["name"], m["path"]) for m in metadata] == [
+        ("simple", str(output_dir)),
+        ("simple", str(output_dir2)),
+    ]
+    assert all(m["modified_date"] for m in metadata)
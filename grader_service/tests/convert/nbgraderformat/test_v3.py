@@ -293,3 +293,32 @@ def test_celltype_changed():
     with unittest.mock.patch.object(logger, "warning") as mock_waring:
         MetadataValidatorV3().validate_cell(cell)
         mock_waring.assert_called_with("Cell type has changed from markdown to code!", cell)
+
+
+def test_validate_nb_skips_unchanged_cells():
+    MetadataValidatorV3.clear_validation_cache()
+    validator = MetadataValidatorV3()
+    nb = new_notebook()
+    nb.cells = [
+        create_grade_cell("", "code", "foo", 5, 3),
+        create_solution_cell("", "code", "bar", 3),
+        create_regular_cell("", "code"),
+    ]
+    assert validator.validate_nb(nb) == 3
+    assert MetadataValidatorV3().validate_nb(nb) == 0
+
+    nb.cells[0].metadata.nbgrader["points"] = "foo"
+    with pytest.raises(ValidationError):
+        validator.validate_nb(nb)
+    with pytest.raises(ValidationError):
+        validator.validate_nb(nb)
+
+    # the duplicate ids are checked for every notebook
+    nb.cells[0].metadata.nbgrader["points"] = 5
+    nb.cells[1].metadata.nbgrader["grade_id"] = nb.cells[0].metadata.nbgrader["grade_id"]
+    with pytest.raises(ValidationError):
+        validator.validate_nb(nb)
+
+    MetadataValidatorV3.clear_validation_cache()
+    nb.cells[1].metadata.nbgrader["grade_id"] = "bar"
+    assert validator.validate_nb(nb) == 3
@@ -2,6 +2,7 @@ import os
 
 from nbconvert.exporters.exporter import ResourcesDict
 from nbconvert.preprocessors import ExecutePreprocessor
+from nbformat.v4 import new_code_cell, new_notebook
 
 from grader_service.convert.preprocessors import Execute
 
@@ -26,3 +27,26 @@ class TestExecute(BaseTestPreprocessor):
         nb, resources = pp.preprocess(nb, res)
         assert nb is not None
         assert resources is not None
+
+    def test_output_is_truncated_while_executing(self):
+        nb = new_notebook()
+        nb.cells = [
+            new_code_cell("import sys\nfor i in range(100):\n    print(i); sys.stdout.flush()"),
+            new_code_cell("print('x' * 100)\nprint('é' * 100)"),
+            new_code_cell("from IPython.display import display\nfor i in range(3): display(i)"),
+        ]
+        pp = Execute(timeout=60, kernel_name="python3", max_output_lines=10, max_output_bytes=150)
+        nb, _ = pp.preprocess(nb, ResourcesDict())
+
+        text = "".join(output.text for output in nb.cells[0].outputs)
+        assert text == "".join(f"{i}\n" for i in range(10)) + "... Output truncated ...\n"
+
+        text = "".join(output.text for output in nb.cells[1].outputs)
+        assert text == "x" * 100 + "\n" + "é" * 24 + "\n... Output truncated ...\n"
+
+        data = [output.data["text/plain"] for output in nb.cells[2].outputs]
+        assert data == ["0", "1", "2"]
+        pp.max_output_bytes = 1
+        nb, _ = pp.preprocess(nb, ResourcesDict())
+        data = [output.data["text/plain"] for output in nb.cells[2].outputs]
+        assert data == ["0", "... Output truncated ...", "... Output truncated ..."]
@@ -1,6 +1,7 @@
 import os
 
 import pytest
+from nbformat.v4 import new_code_cell, new_notebook, new_output
 
 from grader_service.convert.preprocessors import LimitOutput
 
@@ -35,3 +36,26 @@ class TestLimitOutput(BaseTestPreprocessor):
         (cell,) = nb.cells
         (output,) = cell.outputs
         assert len(output.traceback) == 100
+
+    @pytest.mark.parametrize("lines", [[5], [3, 3], [2, 10], [1, 1, 1, 1, 1, 1], [0, 7]])
+    def test_split_outputs(self, lines):
+        nb = new_notebook()
+        text = ["\n".join(f"line {i}" for i in range(n)) for n in lines]
+        nb.cells = [
+            new_code_cell(outputs=[new_output("stream", name="stdout", text=t) for t in text])
+        ]
+
+        pp = LimitOutput(max_lines=4)
+        nb, resources = pp.preprocess(nb, {})
+
+        # the reference implementation splits the whole text of the outputs
+        expected, length = [], 0
+        for t in text:
+            if length == 4:
+                continue
+            split = t.split("\n")
+            if len(split) + length > 4:
+                split = split[: 4 - length - 1] + ["... Output truncated ..."]
+            length += len(split)
+            expected.append("\n".join(split))
+        assert [output.text for output in nb.cells[0].outputs] == expected
@@ -1,8 +1,10 @@
 # coding: utf-8
 
+import hashlib
 import os
 import shutil
 import tempfile
+import time
 import zipfile
 from os.path import join
 
@@ -244,6 +246,80 @@ def test_compute_checksum_whitespace():
     assert utils.compute_checksum(cell1) != utils.compute_checksum(cell2)
 
 
+def _legacy_checksum(cell):
+    m = hashlib.md5()
+    m.update(cell.source.encode("utf-8"))
+    m.update(cell.cell_type.encode("utf-8"))
+    m.update(str(utils.is_grade(cell)).encode("utf-8"))
+    m.update(str(utils.is_solution(cell)).encode("utf-8"))
+    m.update(str(utils.is_locked(cell)).encode("utf-8"))
+    m.update(cell.metadata.nbgrader["grade_id"].encode("utf-8"))
+    if utils.is_grade(cell):
+        m.update(str(float(cell.metadata.nbgrader["points"])).encode("utf-8"))
+    return m.hexdigest()
+
+
+def test_verify_checksum():
+    cell = create_grade_and_solution_cell("hello", "code", "foo", 2)
+    md5 = utils.compute_checksum(cell)
+    blake2b = utils.compute_checksum(cell, "blake2b")
+    assert md5 == _legacy_checksum(cell)
+    assert blake2b.startswith("blake2b:")
+    assert utils.checksum_algorithm(md5) == "md5"
+    assert utils.checksum_algorithm(blake2b) == "blake2b"
+    assert utils.verify_checksum(cell, md5)
+    assert utils.verify_checksum(cell, blake2b)
+    assert not utils.verify_checksum(cell, None)
+    assert not utils.verify_checksum(cell, "sha1:" + md5)
+
+    cell.source = "hello!"
+    assert not utils.verify_checksum(cell, md5)
+    assert not utils.verify_checksum(cell, blake2b)
+
+
+def _checksum_cells():
+    return [
+        create_grade_and_solution_cell("x = {}\n".format(i) * 200, "code", "cell{}".format(i), 1)
+        for i in range(500)
+    ]
+
+
+def test_compute_checksum_cached():
+    cells = _checksum_cells()
+    utils.clear_checksum_cache()
+
+    # the checksums are computed three times per cell during generate and autograde
+    reference = [_legacy_checksum(cell) for _ in range(3) for cell in cells]
+    cached = [utils.compute_checksum(cell) for _ in range(3) for cell in cells]
+    assert cached == reference
+
+
+@pytest.mark.benchmark
+def test_compute_checksum_benchmark():
+    cells = _checksum_cells()
+    utils.clear_checksum_cache()
+
+    start = time.perf_counter()
+    reference = [_legacy_checksum(cell) for _ in range(3) for cell in cells]
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    cached = [utils.compute_checksum(cell) for _ in range(3) for cell in cells]
+    cached_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(3):
+        for cell in cells:
+            utils.compute_checksum(cell, "blake2b")
+    blake2b_time = time.perf_counter() - start
+
+    print(
+        f"checksums of 500 cells: md5 {legacy_time:.3f}s, cached {cached_time:.3f}s, "
+        f"cached blake2b {blake2b_time:.3f}s"
+    )
+    assert cached == reference
+
+
 def test_compute_checksum_source():
     # does the source make a difference?
     cell1 = create_grade_cell("print('hello')", "code", "foo", 1)
@@ -137,6 +137,49 @@ def insert_submission(
     return submission
 
 
+def get_gradebook_dict(
+    auto_score: float = 1.0, manual_score: Optional[float] = None, max_score: float = 2.0
+) -> dict:
+    """Returns a gradebook with a single notebook containing a single autograded cell."""
+    grade_cell = {
+        "_type": "GradeCell",
+        "id": "cell1",
+        "name": "cell1",
+        "notebook_id": "nb1",
+        "grade_id": "cell1",
+        "comment_id": "cell1",
+        "max_score": max_score,
+        "cell_type": "code",
+    }
+    grade = {
+        "_type": "Grade",
+        "id": "cell1",
+        "notebook_id": "nb1",
+        "cell_id": "cell1",
+        "auto_score": auto_score,
+        "manual_score": manual_score,
+        "extra_credit": None,
+        "needs_manual_grade": False,
+        "max_score_gradecell": max_score,
+        "max_score_taskcell": None,
+        "failed_tests": auto_score < max_score,
+    }
+    notebook = {
+        "_type": "Notebook",
+        "id": "nb1",
+        "name": "nb1",
+        "kernelspec": None,
+        "flagged": False,
+        "grade_cells_dict": {"cell1": grade_cell},
+        "solution_cells_dict": {},
+        "task_cells_dict": {},
+        "source_cells_dict": {},
+        "grades_dict": {"cell1": grade},
+        "comments_dict": {},
+    }
+    return {"notebooks": {"nb1": notebook}, "extra_files": []}
+
+
 def insert_student(ex: Engine, username: str, lecture_id: int) -> User:
     """Creates a user with a student role in the specified lecture."""
     session: Session = sessionmaker(ex)(expire_on_commit=False)
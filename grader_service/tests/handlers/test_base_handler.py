@@ -4,14 +4,21 @@
 # This source code is licensed under the BSD-style license found in the
 # LICENSE file in the root directory of this source tree.
 import base64
+import gc
+import json
+import time
+import weakref
 from datetime import datetime, timezone
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 
 import pytest
 
 from grader_service.api.models.error_message import ErrorMessage
 from grader_service.handlers.base_handler import BaseHandler, GraderBaseHandler
-from grader_service.orm import Assignment
+from grader_service.handlers.health import HealthHandler
+from grader_service.orm import APIToken, Assignment, Lecture, Submission, User
+from grader_service.orm.lecture import LectureState
+from grader_service.orm.submission import AutoStatus, FeedbackStatus, ManualStatus
 
 
 def test_string_serialization():
@@ -77,6 +84,62 @@ def test_assignment_serialization():
     assert GraderBaseHandler._serialize(a) == d
 
 
+def _get_submissions(n: int):
+    user = User(id=1, name="user", display_name="User")
+    return [
+        Submission(
+            id=i,
+            date=datetime(2024, 1, 1, 12, 30, tzinfo=timezone.utc),
+            auto_status=AutoStatus.AUTOMATICALLY_GRADED,
+            manual_status=ManualStatus.NOT_GRADED,
+            feedback_status=FeedbackStatus.NOT_GENERATED,
+            score=float(i % 10),
+            grading_score=float(i % 10),
+            score_scaling=1.0,
+            assignid=1,
+            user_id=user.id,
+            user=user,
+            commit_hash="a" * 40,
+            edited=False,
+        )
+        for i in range(n)
+    ]
+
+
+def test_compiled_serializers_match_models():
+    lecture = Lecture(id=1, name="lecture", code="21wle1", state=LectureState.complete)
+    assignment = Assignment(
+        id=1, name="test", lectid=1, points=10, status="released", settings={"max_submissions": 2}
+    )
+    for obj in [lecture, assignment, *_get_submissions(3)]:
+        assert type(obj).serialize_fields is not None
+        assert obj.serialize() == obj.model.to_dict()
+
+
+def test_submission_serialization_matches_model():
+    submissions = _get_submissions(1_000)
+
+    reference = json.dumps([GraderBaseHandler._serialize(s.model.to_dict()) for s in submissions])
+    compiled = GraderBaseHandler._dumps(GraderBaseHandler._serialize(submissions))
+    assert json.loads(compiled) == json.loads(reference)
+
+
+@pytest.mark.benchmark
+def test_submission_serialization_benchmark():
+    submissions = _get_submissions(10_000)
+
+    start = time.perf_counter()
+    reference = json.dumps([GraderBaseHandler._serialize(s.model.to_dict()) for s in submissions])
+    model_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    compiled = GraderBaseHandler._dumps(GraderBaseHandler._serialize(submissions))
+    compiled_time = time.perf_counter() - start
+
+    print(f"serialized 10k submissions: model {model_time:.3f}s, compiled {compiled_time:.3f}s")
+    assert json.loads(compiled) == json.loads(reference)
+
+
 def test_nested_serialization():
     o = [{"b": None}, {"a": 2}, "test", {"z": []}]
     s = GraderBaseHandler._serialize(o)
@@ -99,3 +162,29 @@ def test_get_auth_token(token_str):
     handler = MagicMock()
     handler.request.headers.get = MagicMock(return_value=token_str)
     assert BaseHandler.get_auth_token(self=handler) == "test"
+
+
+async def test_handlers_are_freed_after_request(
+    app, service_base_url, http_server_client, sql_alchemy_sessionmaker
+):
+    session = sql_alchemy_sessionmaker()
+    token = APIToken.new(user=session.get(User, 1))
+    session.close()
+
+    refs = []
+    on_finish = HealthHandler.on_finish
+
+    def track_on_finish(self):
+        refs.append(weakref.ref(self))
+        on_finish(self)
+
+    with patch.object(HealthHandler, "on_finish", track_on_finish):
+        for _ in range(3):
+            response = await http_server_client.fetch(
+                service_base_url + "health", headers={"Authorization": f"Token {token}"}
+            )
+            assert response.code == 200
+
+    gc.collect()
+    assert len(refs) == 3
+    assert all(ref() is None for ref in refs)
@@ -3,13 +3,20 @@
 #
 # This source code is licensed under the BSD-style license found in the
 # LICENSE file in the root directory of this source tree.
+import asyncio
 import os
+import subprocess
+import sys
 from http import HTTPStatus
-from unittest.mock import Mock
+from pathlib import Path
+from typing import Tuple
+from unittest.mock import AsyncMock, Mock, patch
 
 import pytest
+from tornado.iostream import StreamClosedError
 from tornado.web import HTTPError
 
+from grader_service.handlers.base_handler import RequestHandlerConfig
 from grader_service.handlers.git.server import GitBaseHandler
 from grader_service.handlers.handler_utils import GitRepoType
 from grader_service.orm import User
@@ -18,6 +25,8 @@ from grader_service.orm.lecture import Lecture
 from grader_service.orm.submission import Submission
 from grader_service.orm.takepart import Role, Scope
 
+from .db_util import insert_assignments
+
 
 def get_query_side_effect(
     lid=1, code="ivs21s", scope: Scope = Scope.student, username="test_user", user_id=137, a_id=1
@@ -49,11 +58,12 @@ def get_query_side_effect(
     return query_side_effect
 
 
-def test_git_lookup_instructor(tmpdir):
+async def test_git_lookup_instructor(tmpdir):
     path = "/git/iv21s/1/source"
     git_dir = str(tmpdir.mkdir("git"))
 
     handler_mock = Mock()
+    handler_mock.is_base_git_dir = GitBaseHandler.is_base_git_dir
     handler_mock.request.path = path
     handler_mock.gitbase = git_dir
     handler_mock.user.name = "test_user"
@@ -70,7 +80,7 @@ def test_git_lookup_instructor(tmpdir):
     )
     handler_mock.construct_git_dir = Mock(return_value=constructed_git_dir)
 
-    lookup_dir = GitBaseHandler.gitlookup(handler_mock, "send-pack")
+    lookup_dir = await GitBaseHandler.gitlookup(handler_mock, "send-pack")
 
     assert os.path.exists(lookup_dir)
     assert os.path.exists(os.path.join(lookup_dir, "HEAD"))  # is git dir
@@ -79,11 +89,12 @@ def test_git_lookup_instructor(tmpdir):
     assert created_paths == "iv21s/1/source"
 
 
-def test_git_lookup_release_pull_instructor(tmpdir):
+async def test_git_lookup_release_pull_instructor(tmpdir):
     path = "/git/iv21s/1/release"
     git_dir = str(tmpdir.mkdir("git"))
 
     handler_mock = Mock()
+    handler_mock.is_base_git_dir = GitBaseHandler.is_base_git_dir
     handler_mock.request.path = path
     handler_mock.gitbase = git_dir
     handler_mock.user.name = "test_user"
@@ -100,7 +111,7 @@ def test_git_lookup_release_pull_instructor(tmpdir):
     )
     handler_mock.construct_git_dir = Mock(return_value=constructed_git_dir)
 
-    lookup_dir = GitBaseHandler.gitlookup(handler_mock, "upload-pack")
+    lookup_dir = await GitBaseHandler.gitlookup(handler_mock, "upload-pack")
 
     assert os.path.exists(lookup_dir)
     assert os.path.exists(os.path.join(lookup_dir, "HEAD"))  # is git dir
@@ -151,27 +162,27 @@ def test_git_lookup_source_push_student_error(tmpdir):
     assert e.value.status_code == 403
 
 
-def mock_git_lookup(rpc: str):
+async def mock_git_lookup(rpc: str):
     if rpc == "bad":
         return None
     else:
         return "/path/to"
 
 
-def test_get_gitdir_not_found(tmpdir):
+async def test_get_gitdir_not_found(tmpdir):
     handler_mock = Mock()
     handler_mock.request.path = "/abc"
     handler_mock.gitlookup = mock_git_lookup
     with pytest.raises(HTTPError) as e:
-        GitBaseHandler.get_gitdir(handler_mock, "bad")
+        await GitBaseHandler.get_gitdir(handler_mock, "bad")
     assert e.value.status_code == HTTPStatus.NOT_FOUND
 
 
-def test_get_gitdir(tmpdir):
+async def test_get_gitdir(tmpdir):
     handler_mock = Mock()
     handler_mock.request.path = "/abc"
     handler_mock.gitlookup = mock_git_lookup
-    path = GitBaseHandler.get_gitdir(handler_mock, "/abc")
+    path = await GitBaseHandler.get_gitdir(handler_mock, "/abc")
     assert path == "/path/to"
 
 
@@ -248,11 +259,12 @@ def test_git_lookup_push_feedback_student_error():
     assert e.value.status_code == 403
 
 
-def test_git_lookup_pull_autograde_instructor(tmpdir):
+async def test_git_lookup_pull_autograde_instructor(tmpdir):
     path = "/git/iv21s/1/autograde/1"
     git_dir = str(tmpdir.mkdir("git"))
 
     handler_mock = Mock()
+    handler_mock.is_base_git_dir = GitBaseHandler.is_base_git_dir
     handler_mock.request.path = path
     handler_mock.gitbase = git_dir
     handler_mock.user.name = "test_user"
@@ -272,7 +284,7 @@ def test_git_lookup_pull_autograde_instructor(tmpdir):
     )
     handler_mock.construct_git_dir = Mock(return_value=constructed_git_dir)
 
-    lookup_dir = GitBaseHandler.gitlookup(handler_mock, "upload-pack")
+    lookup_dir = await GitBaseHandler.gitlookup(handler_mock, "upload-pack")
 
     assert os.path.exists(lookup_dir)
     assert os.path.exists(os.path.join(lookup_dir, "HEAD"))  # is git dir
@@ -300,11 +312,12 @@ def test_git_lookup_pull_autograde_student_error():
     assert e.value.status_code == 403
 
 
-def test_git_lookup_pull_feedback_instructor(tmpdir):
+async def test_git_lookup_pull_feedback_instructor(tmpdir):
     path = "/git/iv21s/1/feedback/1"
     git_dir = str(tmpdir.mkdir("git"))
 
     handler_mock = Mock()
+    handler_mock.is_base_git_dir = GitBaseHandler.is_base_git_dir
     handler_mock.request.path = path
     handler_mock.gitbase = git_dir
     handler_mock.user.name = "test_user"
@@ -320,7 +333,7 @@ def test_git_lookup_pull_feedback_instructor(tmpdir):
     )
     handler_mock.construct_git_dir = Mock(return_value=constructed_git_dir)
 
-    lookup_dir = GitBaseHandler.gitlookup(handler_mock, "upload-pack")
+    lookup_dir = await GitBaseHandler.gitlookup(handler_mock, "upload-pack")
 
     assert os.path.exists(lookup_dir)
     assert os.path.exists(os.path.join(lookup_dir, "HEAD"))  # is git dir
@@ -329,11 +342,12 @@ def test_git_lookup_pull_feedback_instructor(tmpdir):
     assert created_paths == f"iv21s/1/feedback/user/{handler_mock.user.name}"
 
 
-def test_git_lookup_pull_feedback_student_with_valid_id(tmpdir):
+async def test_git_lookup_pull_feedback_student_with_valid_id(tmpdir):
     path = "/git/iv21s/1/feedback/1"
     git_dir = str(tmpdir.mkdir("git"))
 
     handler_mock = Mock()
+    handler_mock.is_base_git_dir = GitBaseHandler.is_base_git_dir
     handler_mock.request.path = path
     handler_mock.gitbase = git_dir
     handler_mock.user.name = "test_user"
@@ -349,7 +363,7 @@ def test_git_lookup_pull_feedback_student_with_valid_id(tmpdir):
     )
     handler_mock.construct_git_dir = Mock(return_value=constructed_git_dir)
 
-    lookup_dir = GitBaseHandler.gitlookup(handler_mock, "upload-pack")
+    lookup_dir = await GitBaseHandler.gitlookup(handler_mock, "upload-pack")
 
     assert os.path.exists(lookup_dir)
     assert os.path.exists(os.path.join(lookup_dir, "HEAD"))  # is git dir
@@ -358,11 +372,12 @@ def test_git_lookup_pull_feedback_student_with_valid_id(tmpdir):
     assert created_paths == f"iv21s/1/feedback/user/{handler_mock.user.name}"
 
 
-def test_git_lookup_pull_feedback_student_with_valid_id_extra(tmpdir):
+async def test_git_lookup_pull_feedback_student_with_valid_id_extra(tmpdir):
     path = "/git/iv21s/1/feedback/1/info/refs&service=git-upload-pack"
     git_dir = str(tmpdir.mkdir("git"))
 
     handler_mock = Mock()
+    handler_mock.is_base_git_dir = GitBaseHandler.is_base_git_dir
     handler_mock.request.path = path
     handler_mock.gitbase = git_dir
     handler_mock.user.name = "test_user"
@@ -378,7 +393,7 @@ def test_git_lookup_pull_feedback_student_with_valid_id_extra(tmpdir):
     )
     handler_mock.construct_git_dir = Mock(return_value=constructed_git_dir)
 
-    lookup_dir = GitBaseHandler.gitlookup(handler_mock, "upload-pack")
+    lookup_dir = await GitBaseHandler.gitlookup(handler_mock, "upload-pack")
 
     assert os.path.exists(lookup_dir)
     assert os.path.exists(os.path.join(lookup_dir, "HEAD"))  # is git dir
@@ -465,3 +480,306 @@ def test_git_lookup_pull_feedback_student_bad_id_error():
     with pytest.raises(HTTPError) as e:
         GitBaseHandler._check_git_repo_permissions(handler_mock, "upload-pack", role, pathlets)
     assert e.value.status_code == 403
+
+
+async def test_data_received_waits_for_git_stdin():
+    handler_mock = Mock()
+    handler_mock.process.stdin.closed.return_value = False
+    written = asyncio.get_running_loop().create_future()
+    handler_mock.process.stdin.write.return_value = written
+
+    receive = asyncio.ensure_future(GitBaseHandler.data_received(handler_mock, b"chunk"))
+    await asyncio.sleep(0.01)
+    # the next chunk of the request body is not read before git consumed this one
+    assert not receive.done()
+    written.set_result(None)
+    await receive
+    handler_mock.process.stdin.write.assert_called_once_with(b"chunk")
+
+
+async def test_data_received_git_exited():
+    handler_mock = Mock()
+    handler_mock.process.stdin.closed.return_value = False
+    handler_mock.process.stdin.write = AsyncMock(side_effect=StreamClosedError())
+    await GitBaseHandler.data_received(handler_mock, b"chunk")
+
+    handler_mock.process.stdin.closed.return_value = True
+    await GitBaseHandler.data_received(handler_mock, b"chunk")
+    assert handler_mock.process.stdin.write.call_count == 1
+
+
+async def test_git_response_chunk_size():
+    RequestHandlerConfig.instance().git_response_chunk_size = 1024
+    handler_mock = Mock()
+    handler_mock.flush = AsyncMock()
+    handler_mock.process.stdout.read_bytes = AsyncMock(side_effect=[b"a" * 1024, b"b", b""])
+    try:
+        await GitBaseHandler.git_response(handler_mock)
+    finally:
+        RequestHandlerConfig.instance().git_response_chunk_size = 64 * 1024
+
+    handler_mock.process.stdout.read_bytes.assert_called_with(1024, partial=True)
+    assert [call.args[0] for call in handler_mock.write.call_args_list] == [b"a" * 1024, b"b"]
+    assert handler_mock.flush.await_count == 2
+
+
+@pytest.fixture
+def policy_repo(tmp_path):
+    """A bare repository using the installed pre-receive hook and a clone to push from."""
+    hooks_path = str(tmp_path / "git_hooks")
+    GitBaseHandler.install_hooks(hooks_path)
+    remote = tmp_path / "remote"
+    work = tmp_path / "work"
+    subprocess.run(["git", "init", "--bare", str(remote)], check=True, capture_output=True)
+    subprocess.run(["git", "clone", str(remote), str(work)], check=True, capture_output=True)
+    env = GitBaseHandler.get_hook_env()
+    # like RPCHandler, enable the hooks with core.hooksPath of receive-pack
+    receive_pack = f"--receive-pack=git -c core.hooksPath={hooks_path} receive-pack"
+
+    def push(files: dict, refspec: str = "HEAD:main", **policy) -> subprocess.CompletedProcess:
+        if files:
+            for name, content in files.items():
+                (work / name).write_text(content)
+            subprocess.run(["git", "add", "-A"], cwd=work, check=True)
+            subprocess.run(["git", "commit", "-qm", "commit"], cwd=work, check=True)
+        push_env = {**env, **{f"GRADER_GIT_{k.upper()}": str(v) for k, v in policy.items()}}
+        return subprocess.run(
+            ["git", "push", receive_pack, "origin", refspec],
+            cwd=work,
+            env=push_env,
+            capture_output=True,
+            text=True,
+        )
+
+    return push
+
+
+def test_install_hooks(tmp_path):
+    hooks_path = str(tmp_path / "git_hooks")
+    GitBaseHandler.install_hooks(hooks_path)
+    hook_file = os.path.join(hooks_path, "pre-receive")
+    with open(hook_file) as f:
+        assert f.readline() == f"#!{sys.executable}\n"
+    assert os.access(hook_file, os.X_OK)
+
+    # the hook is rewritten if it was removed or changed
+    os.remove(hook_file)
+    GitBaseHandler.install_hooks(hooks_path)
+    assert os.access(hook_file, os.X_OK)
+    with open(hook_file, "w") as f:
+        f.write("#!/bin/sh\nexit 0\n")
+    GitBaseHandler.install_hooks(hooks_path)
+    with open(hook_file) as f:
+        assert f.readline() == f"#!{sys.executable}\n"
+
+    # an unchanged hook is not read again
+    with patch.object(Path, "read_text") as read_text:
+        GitBaseHandler.install_hooks(hooks_path)
+    read_text.assert_not_called()
+
+
+def test_pre_receive_hook_accepts_push(policy_repo):
+    result = policy_repo({"a.ipynb": "{}", "b.py": "print()"}, file_allow_pattern="\\.py|\\.ipynb")
+    assert result.returncode == 0, result.stderr
+    assert "Validation successful!" in result.stderr
+
+
+def test_pre_receive_hook_rejects_file_count(policy_repo):
+    result = policy_repo({f"{i}.py": "" for i in range(3)}, max_file_count=2)
+    assert result.returncode != 0
+    assert "Exceeded maximum number of files" in result.stderr
+
+
+def test_pre_receive_hook_rejects_file_size(policy_repo):
+    result = policy_repo({"a.py": "print()"}, max_file_size_mb=0)
+    assert result.returncode != 0
+    assert "The file a.py is larger than 0 MB" in result.stderr
+
+
+def test_pre_receive_hook_checks_changed_files(policy_repo):
+    assert policy_repo({"a.txt": "a"}).returncode == 0
+    # only files changed by the push have to match the allowed extensions
+    result = policy_repo({"b.py": "b"}, file_allow_pattern="\\.py")
+    assert result.returncode == 0, result.stderr
+    result = policy_repo({"c.txt": "c"}, file_allow_pattern="\\.py")
+    assert result.returncode != 0
+    assert "The file c.txt has a file extension that has been disallowed!" in result.stderr
+
+
+def test_pre_receive_hook_protects_edit_refs(policy_repo, tmp_path):
+    assert policy_repo({"a.py": ""}).returncode == 0
+    result = policy_repo({}, refspec="HEAD:refs/edit/1")
+    assert result.returncode != 0
+    assert "The ref refs/edit/1 is managed by the grader service!" in result.stderr
+
+    # refs created by the service cannot be deleted by a push either
+    remote = str(tmp_path / "remote")
+    subprocess.run(["git", "update-ref", "refs/edit/1", "main"], cwd=remote, check=True)
+    assert policy_repo({}, refspec=":refs/edit/1").returncode != 0
+    subprocess.run(["git", "rev-parse", "--verify", "refs/edit/1"], cwd=remote, check=True)
+
+
+async def _run_git(*args: str, cwd=None, env=None) -> Tuple[int, str]:
+    # run git without blocking the loop of the test server
+    process = await asyncio.create_subprocess_exec(
+        "git",
+        *args,
+        cwd=cwd,
+        env={**os.environ, **(env or {})},
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.STDOUT,
+    )
+    output, _ = await process.communicate()
+    return process.returncode, output.decode()
+
+
+@pytest.mark.parametrize("protocol", ["0", "2"])
+async def test_fetch_over_http(
+    app,
+    http_server_client,
+    sql_alchemy_engine,
+    default_roles,
+    default_user_login,
+    tmp_path,
+    protocol,
+):
+    l_code = "22wle1"  # default user is instructor
+    insert_assignments(sql_alchemy_engine, 3)
+    source = os.path.join(app.grader_service_dir, "git", l_code, "3", "source")
+    work = tmp_path / "work"
+    subprocess.run(["git", "init", "--bare", source], check=True, capture_output=True)
+    subprocess.run(["git", "init", "-b", "main", str(work)], check=True, capture_output=True)
+    (work / "a.py").write_text("print()")
+    subprocess.run(["git", "add", "-A"], cwd=work, check=True)
+    subprocess.run(["git", "commit", "-qm", "commit"], cwd=work, check=True)
+    subprocess.run(["git", "push", source, "main", "main:feedback_1"], cwd=work, check=True)
+
+    url = http_server_client.get_url(f"/git/{l_code}/3/source")
+    clone = tmp_path / "clone"
+    subprocess.run(["git", "init", str(clone)], check=True, capture_output=True)
+    code, output = await _run_git(
+        "-c",
+        f"protocol.version={protocol}",
+        "fetch",
+        url,
+        "main",
+        cwd=clone,
+        env={"GIT_TRACE_PACKET": "1"},
+    )
+    assert code == 0, output
+    if protocol == "2":
+        # only the requested refs are listed by the server
+        assert "fetch< version 2" in output
+        assert "ref-prefix refs/heads/main" in output
+        assert "refs/heads/feedback_1" not in output
+    else:
+        assert "version 2" not in output
+        assert "refs/heads/feedback_1" in output
+
+    code, output = await _run_git("show", "FETCH_HEAD:a.py", cwd=clone)
+    assert (code, output) == (0, "print()")
+
+
+async def test_push_over_http(
+    app, http_server_client, sql_alchemy_engine, default_roles, default_user_login, tmp_path
+):
+    l_code = "22wle1"  # default user is instructor
+    insert_assignments(sql_alchemy_engine, 3)
+    os.mkdir(os.path.join(app.grader_service_dir, "git"))
+    url = http_server_client.get_url(f"/git/{l_code}/3/source")
+    work = tmp_path / "work"
+    subprocess.run(["git", "init", "-b", "main", str(work)], check=True, capture_output=True)
+    (work / "a.py").write_text("x" * 1_000_000)
+    subprocess.run(["git", "add", "-A"], cwd=work, check=True)
+    subprocess.run(["git", "commit", "-qm", "commit"], cwd=work, check=True)
+
+    code, output = await _run_git("push", url, "main", cwd=work)
+    assert code == 0, output
+    assert "Validation successful!" in output
+
+    config = RequestHandlerConfig.instance()
+    config.git_allowed_file_extensions = ["ipynb"]
+    try:
+        (work / "b.py").write_text("print()")
+        subprocess.run(["git", "add", "-A"], cwd=work, check=True)
+        subprocess.run(["git", "commit", "-qm", "commit"], cwd=work, check=True)
+        code, output = await _run_git("push", url, "main", cwd=work)
+    finally:
+        config.git_allowed_file_extensions = []
+    assert code != 0
+    assert "The file b.py has a file extension that has been disallowed!" in output
+
+
+def _git_output(repo, *args: str) -> str:
+    return subprocess.run(
+        ["git", *args], cwd=repo, check=True, capture_output=True, text=True
+    ).stdout.strip()
+
+
+def _push_files(remote: str, work, files: dict) -> None:
+    if not work.exists():
+        subprocess.run(["git", "init", "-b", "main", str(work)], check=True, capture_output=True)
+    for name, content in files.items():
+        (work / name).parent.mkdir(parents=True, exist_ok=True)
+        (work / name).write_text(content)
+    subprocess.run(["git", "add", "-A"], cwd=work, check=True)
+    subprocess.run(["git", "commit", "-qm", "commit"], cwd=work, check=True)
+    subprocess.run(["git", "push", "-q", remote, "main"], cwd=work, check=True)
+
+
+async def test_commit_release_tree_overlays_user_files(tmp_path):
+    release = str(tmp_path / "release")
+    user = str(tmp_path / "user")
+    for repo in [release, user]:
+        subprocess.run(["git", "init", "--bare", repo], check=True, capture_output=True)
+    _push_files(release, tmp_path / "release_work", {"a.py": "new", "__pycache__/a.pyc": ""})
+    _push_files(user, tmp_path / "user_work", {"a.py": "old", "b.py": "user"})
+    parent = _git_output(user, "rev-parse", "main")
+
+    commit = await GitBaseHandler._commit_release_tree(release, user, "Reset Assignment")
+
+    assert _git_output(user, "rev-parse", "main") == commit
+    assert _git_output(user, "rev-parse", "main^") == parent
+    assert _git_output(user, "log", "-1", "--format=%s") == "Reset Assignment"
+    assert _git_output(user, "ls-tree", "-r", "--name-only", "main").split() == ["a.py", "b.py"]
+    assert _git_output(user, "show", "main:a.py") == "new"
+
+
+async def test_commit_release_tree_non_utf8_path(tmp_path):
+    release = str(tmp_path / "release")
+    user = str(tmp_path / "user")
+    for repo in [release, user]:
+        subprocess.run(["git", "init", "--bare", repo], check=True, capture_output=True)
+    work = tmp_path / "release_work"
+    _push_files(release, work, {"a.py": "new"})
+    with open(os.path.join(os.fsencode(work), b"caf\xe9.py"), "w") as f:
+        f.write("latin-1")
+    _push_files(release, work, {})
+
+    commit = await GitBaseHandler._commit_release_tree(release, user, "Reset Assignment")
+
+    names = subprocess.run(
+        ["git", "ls-tree", "-r", "-z", "--name-only", commit],
+        cwd=user,
+        check=True,
+        capture_output=True,
+    ).stdout
+    assert names.split(b"\0") == [b"a.py", b"caf\xe9.py", b""]
+
+
+async def test_fetch_user_repo_initializes_with_release(
+    app, http_server_client, sql_alchemy_engine, default_roles, default_user_login, tmp_path
+):
+    l_code = "22wle1"  # default user is instructor
+    insert_assignments(sql_alchemy_engine, 3)
+    release = os.path.join(app.grader_service_dir, "git", l_code, "3", "release")
+    subprocess.run(["git", "init", "--bare", release], check=True, capture_output=True)
+    _push_files(release, tmp_path / "work", {"a.py": "print()"})
+
+    url = http_server_client.get_url(f"/git/{l_code}/3/user")
+    code, output = await _run_git("clone", "-b", "main", url, str(tmp_path / "clone"))
+    assert code == 0, output
+
+    clone = tmp_path / "clone"
+    assert (clone / "a.py").read_text() == "print()"
+    assert _git_output(clone, "log", "--format=%s") == "Initialize with Release"
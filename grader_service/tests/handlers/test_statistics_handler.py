@@ -0,0 +1,236 @@
+# Copyright (c) 2022, TU Wien
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+import json
+
+import numpy as np
+import pytest
+from sqlalchemy.orm import sessionmaker
+from tornado.httpclient import HTTPClientError
+
+from grader_service.convert.gradebook.models import GradeBookModel
+from grader_service.handlers.statistics import (
+    compute_cell_statistics,
+    compute_score_statistics,
+    register_cache_invalidation,
+    statistics_cache,
+)
+from grader_service.orm.submission import Submission
+from grader_service.orm.submission_grade import SubmissionGrade
+from grader_service.server import GraderServer
+
+from .db_util import get_gradebook_dict, insert_assignments, insert_student, insert_submission
+
+
+@pytest.fixture(autouse=True)
+def clear_statistics_cache():
+    statistics_cache.clear()
+    yield
+    statistics_cache.clear()
+
+
+def _insert_graded_submission(engine, a_id, user, score, auto_score):
+    submission = insert_submission(engine, a_id, user.name, user.id, score=score)
+    session = sessionmaker(engine)()
+    gradebook = GradeBookModel.from_dict(get_gradebook_dict(auto_score=auto_score))
+    SubmissionGrade.replace(session, submission.id, gradebook)
+    session.commit()
+    session.close()
+    return submission
+
+
+def test_compute_score_statistics():
+    stats = compute_score_statistics(np.array([0.0, 5.0, 10.0, 10.0]), bins=2, max_score=10.0)
+    assert stats["count"] == 4
+    assert stats["mean"] == 6.25
+    assert stats["median"] == 7.5
+    assert stats["min"] == 0.0
+    assert stats["max"] == 10.0
+    assert stats["percentiles"]["50"] == 7.5
+    assert stats["histogram"] == {"bin_edges": [0.0, 5.0, 10.0], "counts": [1, 3]}
+
+
+def test_compute_score_statistics_empty():
+    stats = compute_score_statistics(np.array([]), bins=10, max_score=10.0)
+    assert stats["count"] == 0
+    assert stats["mean"] is None
+    assert stats["percentiles"]["90"] is None
+    assert stats["histogram"] == {"bin_edges": [], "counts": []}
+
+
+def test_compute_cell_statistics():
+    rows = [
+        ("nb1", "cell1", 1.0, None, None, 2.0, True),
+        ("nb1", "cell1", 1.0, 2.0, None, 2.0, False),
+        ("nb1", "cell2", 3.0, None, 1.0, 3.0, None),
+    ]
+    cells = compute_cell_statistics(rows)
+    assert len(cells) == 2
+    cell1, cell2 = cells
+    assert (cell1["notebook_id"], cell1["cell_id"]) == ("nb1", "cell1")
+    assert cell1["count"] == 2
+    assert cell1["mean"] == 1.5
+    assert cell1["max_score"] == 2.0
+    assert cell1["pass_rate"] == 0.5
+    assert cell1["full_score_rate"] == 0.5
+    assert cell2["mean"] == 4.0
+    assert cell2["pass_rate"] is None
+    assert cell2["full_score_rate"] == 1.0
+
+
+async def test_get_assignment_statistics(
+    app: GraderServer,
+    service_base_url,
+    http_server_client,
+    default_user,
+    default_token,
+    sql_alchemy_engine,
+    default_roles,
+    default_user_login,
+):
+    l_id = 3  # default user is instructor
+    a_id = 3
+    engine = sql_alchemy_engine
+    insert_assignments(engine, l_id)
+    student = insert_student(engine, "user1", l_id)
+    _insert_graded_submission(engine, a_id, default_user, score=4.0, auto_score=2.0)
+    _insert_graded_submission(engine, a_id, default_user, score=2.0, auto_score=1.0)
+    _insert_graded_submission(engine, a_id, student, score=8.0, auto_score=2.0)
+
+    url = service_base_url + f"lectures/{l_id}/assignments/{a_id}/stats"
+    response = await http_server_client.fetch(
+        url, method="GET", headers={"Authorization": f"Token {default_token}"}
+    )
+    assert response.code == 200
+    stats = json.loads(response.body.decode())
+    assert stats["submission_count"] == 2
+    assert stats["score"]["mean"] == 5.0
+    assert stats["score"]["max"] == 8.0
+    assert len(stats["score"]["histogram"]["counts"]) == 10
+    assert len(stats["cells"]) == 1
+    assert stats["cells"][0]["mean"] == 1.5
+    assert stats["cells"][0]["pass_rate"] == 0.5
+
+    response = await http_server_client.fetch(
+        url + "?filter=best&bins=4",
+        method="GET",
+        headers={"Authorization": f"Token {default_token}"},
+    )
+    stats = json.loads(response.body.decode())
+    assert stats["score"]["mean"] == 6.0
+    assert len(stats["score"]["histogram"]["counts"]) == 4
+    assert stats["cells"][0]["pass_rate"] == 1.0
+
+
+async def test_get_assignment_statistics_invalidated_on_commit(
+    app: GraderServer,
+    service_base_url,
+    http_server_client,
+    default_user,
+    default_token,
+    sql_alchemy_engine,
+    default_roles,
+    default_user_login,
+):
+    l_id = 3  # default user is instructor
+    a_id = 3
+    engine = sql_alchemy_engine
+    insert_assignments(engine, l_id)
+    submission = _insert_graded_submission(engine, a_id, default_user, score=4.0, auto_score=2.0)
+
+    url = service_base_url + f"lectures/{l_id}/assignments/{a_id}/stats"
+    headers = {"Authorization": f"Token {default_token}"}
+    stats = json.loads((await http_server_client.fetch(url, headers=headers)).body.decode())
+    assert stats["score"]["mean"] == 4.0
+
+    # only commits of the registered sessions invalidate the cache
+    session = sessionmaker(engine)()
+    session.get(Submission, submission.id).score = 6.0
+    session.commit()
+    session.close()
+    stats = json.loads((await http_server_client.fetch(url, headers=headers)).body.decode())
+    assert stats["score"]["mean"] == 4.0
+
+    register_cache_invalidation(app.session_maker)
+    session = app.session_maker()
+    session.get(Submission, submission.id).score = 8.0
+    session.commit()
+    app.session_maker.remove()
+
+    stats = json.loads((await http_server_client.fetch(url, headers=headers)).body.decode())
+    assert stats["score"]["mean"] == 8.0
+
+
+@pytest.mark.parametrize("query", ["filter=all", "bins=0", "bins=abc", "unknown=1"])
+async def test_get_assignment_statistics_invalid_parameters(
+    app: GraderServer,
+    service_base_url,
+    http_server_client,
+    default_token,
+    sql_alchemy_engine,
+    default_roles,
+    default_user_login,
+    query,
+):
+    l_id = 3  # default user is instructor
+    a_id = 3
+    insert_assignments(sql_alchemy_engine, l_id)
+
+    url = service_base_url + f"lectures/{l_id}/assignments/{a_id}/stats?{query}"
+    with pytest.raises(HTTPClientError) as exc_info:
+        await http_server_client.fetch(url, headers={"Authorization": f"Token {default_token}"})
+    assert exc_info.value.code == 400
+
+
+async def test_get_assignment_statistics_student(
+    app: GraderServer,
+    service_base_url,
+    http_server_client,
+    default_token,
+    sql_alchemy_engine,
+    default_roles,
+    default_user_login,
+):
+    l_id = 1  # default user is student
+    a_id = 1
+
+    url = service_base_url + f"lectures/{l_id}/assignments/{a_id}/stats"
+    with pytest.raises(HTTPClientError) as exc_info:
+        await http_server_client.fetch(url, headers={"Authorization": f"Token {default_token}"})
+    assert exc_info.value.code == 403
+
+
+@pytest.mark.parametrize("submission_filter", ["best", "latest"])
+async def test_get_assignment_statistics_ties(
+    app: GraderServer,
+    service_base_url,
+    http_server_client,
+    default_user,
+    default_token,
+    sql_alchemy_engine,
+    default_roles,
+    default_user_login,
+    submission_filter,
+):
+    l_id = 3  # default user is instructor
+    a_id = 3
+    engine = sql_alchemy_engine
+    insert_assignments(engine, l_id)
+    submissions = [
+        _insert_graded_submission(engine, a_id, default_user, score=4.0, auto_score=2.0)
+        for _ in range(2)
+    ]
+    session = sessionmaker(engine)()
+    date = session.get(Submission, submissions[0].id).date
+    session.get(Submission, submissions[1].id).date = date
+    session.commit()
+    session.close()
+
+    url = service_base_url + f"lectures/{l_id}/assignments/{a_id}/stats?filter={submission_filter}"
+    headers = {"Authorization": f"Token {default_token}"}
+    stats = json.loads((await http_server_client.fetch(url, headers=headers)).body.decode())
+    assert stats["submission_count"] == 1
+    assert stats["score"]["count"] == 1
+    assert [cell["count"] for cell in stats["cells"]] == [1]
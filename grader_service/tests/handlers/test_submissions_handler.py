@@ -7,6 +7,7 @@ import csv
 import json
 import os
 import secrets
+import subprocess
 from datetime import datetime, timedelta, timezone
 from http import HTTPStatus
 from unittest.mock import MagicMock, patch
@@ -27,11 +28,14 @@ from grader_service.orm import Role
 from grader_service.orm.base import DeleteState
 from grader_service.orm.submission import AutoStatus, FeedbackStatus, ManualStatus
 from grader_service.orm.submission import Submission as SubmissionORM
+from grader_service.orm.submission_grade import SubmissionGrade
 from grader_service.orm.takepart import Scope
+from grader_service.process import ProcessRunner
 from grader_service.server import GraderServer
 
 from .db_util import (
     create_user_submission_with_repo,
+    get_gradebook_dict,
     insert_assignments,
     insert_student,
     insert_submission,
@@ -906,7 +910,7 @@ async def test_post_submission_by_student(
 
     with (
         patch("os.path.exists"),
-        patch("subprocess.run"),
+        patch.object(ProcessRunner, "run"),
         patch("grader_service.autograding.celery.tasks.CeleryApp", autospec=True),
         patch("grader_service.handlers.submissions.chain", autospec=True) as mock_chain,
     ):
@@ -941,7 +945,7 @@ async def test_post_submission_by_instructor(
     url = service_base_url + f"lectures/{l_id}/assignments/{a_id}/submissions/"
 
     with (
-        patch("subprocess.run"),
+        patch.object(ProcessRunner, "run"),
         patch.object(SubmissionHandler, "construct_git_dir", str(tmp_path)),
         patch("grader_service.handlers.submissions.chain", autospec=True) as mock_chain,
     ):
@@ -1057,7 +1061,7 @@ async def test_post_submission_max_submissions_assignment(
     url = service_base_url + f"lectures/{l_id}/assignments/{a_id}/submissions/"
     post_body = {"commit_hash": secrets.token_hex(20)}
 
-    with patch("subprocess.run"), patch("os.path.exists"):
+    with patch.object(ProcessRunner, "run"), patch("os.path.exists"):
         response = await http_server_client.fetch(
             url,
             method="POST",
@@ -1114,6 +1118,46 @@ async def test_submission_properties(
     assert assignment_props == prop
 
 
+async def test_submission_properties_updates_grades(
+    app: GraderServer,
+    service_base_url,
+    http_server_client,
+    default_user,
+    default_token,
+    sql_alchemy_engine,
+    default_roles,
+    default_user_login,
+):
+    l_id = 3  # default user is instructor
+    a_id = 4
+
+    url = service_base_url + f"lectures/{l_id}/assignments/{a_id}/submissions/1/properties"
+
+    engine = sql_alchemy_engine
+    insert_assignments(engine, l_id)
+    insert_submission(engine, a_id, default_user.name, default_user.id)
+
+    for manual_score in [None, 2.0]:
+        put_response = await http_server_client.fetch(
+            url,
+            method="PUT",
+            headers={"Authorization": f"Token {default_token}"},
+            body=json.dumps(get_gradebook_dict(auto_score=1.0, manual_score=manual_score)),
+        )
+        assert put_response.code == 200
+
+    session = sessionmaker(engine)()
+    grades = session.query(SubmissionGrade).filter(SubmissionGrade.sub_id == 1).all()
+    assert len(grades) == 1
+    assert grades[0].notebook_id == "nb1"
+    assert grades[0].cell_id == "cell1"
+    assert grades[0].auto_score == 1.0
+    assert grades[0].manual_score == 2.0
+    assert grades[0].max_score == 2.0
+    assert grades[0].score == 2.0
+    session.close()
+
+
 async def test_submission_properties_not_correct(
     app: GraderServer,
     service_base_url,
@@ -1340,7 +1384,19 @@ async def test_submission_create_edit_repo(
     assert submission_dict["edited"] is True
     assert submission_dict["commit_hash"] == commit_hash
     assert submission_dict["user_display_name"] == student_username
-    assert os.path.exists(gitbase_dir / l_code / str(a_id) / "edit" / str(submission_dict["id"]))
+    edit_repo = gitbase_dir / l_code / str(a_id) / "edit" / str(submission_dict["id"])
+    assert os.path.exists(edit_repo)
+
+    def git(*args) -> str:
+        return subprocess.run(
+            ["git", *args], cwd=edit_repo, check=True, capture_output=True, text=True
+        ).stdout.strip()
+
+    # the edit repository contains the tree of the submission as its only commit
+    assert git("rev-parse", "main^{tree}") == git("rev-parse", f"{commit_hash}^{{tree}}")
+    assert git("rev-list", "--count", "main") == "1"
+    # and borrows the objects from the user repository
+    assert git("count-objects", "-v").splitlines()[0] == "count: 1"
 
 
 async def test_submission_cannot_edit_submission_created_by_instructor(
@@ -1365,7 +1421,7 @@ async def test_submission_cannot_edit_submission_created_by_instructor(
     post_url = service_base_url + f"lectures/{l_id}/assignments/{a_id}/submissions/"
 
     with (
-        patch("subprocess.run"),
+        patch.object(ProcessRunner, "run"),
         patch.object(SubmissionHandler, "construct_git_dir", str(tmp_path)),
         patch("grader_service.handlers.submissions.chain", autospec=True),
     ):
@@ -0,0 +1,58 @@
+# Copyright (c) 2022, TU Wien
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+from datetime import datetime, timedelta, timezone
+
+from grader_service.orm import APIToken, User
+from grader_service.orm.api_token import verified_tokens
+
+
+def _new_api_token(session, **kwargs):
+    user = session.get(User, 1)
+    orm_token = APIToken.new(
+        token="presented-token", user=user, generated=False, return_orm=True, **kwargs
+    )
+    verified_tokens.clear()
+    return orm_token
+
+
+def test_verified_token_cache(sql_alchemy_sessionmaker):
+    session = sql_alchemy_sessionmaker()
+    orm_token = _new_api_token(session)
+
+    assert APIToken.find(session, "presented-token").id == orm_token.id
+    assert APIToken.find(session, "presented-token").id == orm_token.id
+    assert APIToken.find(session, "wrong-token") is None
+    assert verified_tokens.stats() == {"hits": 1, "misses": 2, "size": 1}
+
+    # revoked tokens are not served from the cache
+    session.delete(orm_token)
+    session.commit()
+    assert APIToken.find(session, "presented-token") is None
+    assert verified_tokens.stats()["size"] == 0
+    session.close()
+
+
+def test_verified_token_cache_expiry(sql_alchemy_sessionmaker):
+    session = sql_alchemy_sessionmaker()
+    orm_token = _new_api_token(session, expires_in=3600)
+    assert APIToken.find(session, "presented-token").id == orm_token.id
+
+    orm_token.expires_at = datetime.now(tz=timezone.utc) - timedelta(seconds=1)
+    session.commit()
+    assert APIToken._find_verified(session, "presented-token") is None
+    assert verified_tokens.stats()["size"] == 0
+    session.close()
+
+
+async def test_verified_token_find_async(sql_alchemy_sessionmaker):
+    session = sql_alchemy_sessionmaker()
+    orm_token = _new_api_token(session)
+
+    assert (await APIToken.find_async(session, "presented-token")).id == orm_token.id
+    assert await APIToken.find_async(session, "wrong-token") is None
+    assert (await APIToken.find_async(session, "presented-token")).id == orm_token.id
+    assert verified_tokens.stats() == {"hits": 1, "misses": 2, "size": 1}
+    session.close()
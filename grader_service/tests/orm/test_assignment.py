@@ -0,0 +1,20 @@
+# Copyright (c) 2022, TU Wien
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+from sqlalchemy import inspect
+
+from grader_service.orm import Assignment as AssignmentORM
+
+
+def test_assignment_properties_and_settings_are_deferred(sql_alchemy_sessionmaker):
+    session = sql_alchemy_sessionmaker()
+
+    assignment = session.get(AssignmentORM, 1)
+
+    unloaded = inspect(assignment).unloaded
+    assert "properties" in unloaded
+    assert "_settings" in unloaded
+    assert assignment.settings.deadline is not None
+    session.close()
@@ -0,0 +1,47 @@
+# Copyright (c) 2022, TU Wien
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+import json
+
+from sqlalchemy import text
+
+from grader_service.orm import SubmissionLogs, SubmissionProperties
+from grader_service.orm.json_util import CompressedText
+from grader_service.tests.handlers.db_util import insert_submission
+
+
+def test_large_submission_properties_are_stored_compressed(sql_alchemy_sessionmaker):
+    session = sql_alchemy_sessionmaker()
+    engine = session.get_bind()
+    sub = insert_submission(engine, 1, "ubuntu", 1, with_properties=False)
+    properties = json.dumps({"notebooks": {"nb": {"cells": ["x" * 100] * 1000}}})
+
+    session.add(SubmissionProperties(sub_id=sub.id, properties=properties))
+    session.commit()
+
+    raw = session.execute(
+        text("SELECT properties FROM submission_properties WHERE sub_id = :id"), {"id": sub.id}
+    ).scalar_one()
+    assert raw.startswith(CompressedText.marker)
+    assert len(raw) < len(properties)
+
+    session.expire_all()
+    assert session.get(SubmissionProperties, sub.id).properties == properties
+    session.close()
+
+
+def test_small_and_legacy_values_are_returned_unchanged(sql_alchemy_sessionmaker):
+    session = sql_alchemy_sessionmaker()
+    engine = session.get_bind()
+    sub = insert_submission(engine, 1, "ubuntu", 1, with_properties=False)
+
+    session.execute(
+        text("INSERT INTO submission_logs (sub_id, logs) VALUES (:id, :logs)"),
+        {"id": sub.id, "logs": "legacy logs"},
+    )
+    session.commit()
+
+    assert session.get(SubmissionLogs, sub.id).logs == "legacy logs"
+    session.close()
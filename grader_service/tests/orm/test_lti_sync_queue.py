@@ -0,0 +1,53 @@
+# Copyright (c) 2022, TU Wien
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+from grader_service.orm import LTISyncBatch, LTISyncQueue
+from grader_service.tests.handlers.db_util import insert_submission
+
+
+def test_lti_sync_queue(sql_alchemy_sessionmaker):
+    session = sql_alchemy_sessionmaker()
+    engine = session.get_bind()
+    subs = [insert_submission(engine, 1, "ubuntu", 1) for _ in range(3)]
+
+    LTISyncQueue.push(session, 1, [subs[0].id])
+    LTISyncQueue.push(session, 1, [subs[1].id, subs[0].id])
+    LTISyncQueue.push(session, 2, [subs[2].id])
+    LTISyncQueue.push(session, 1, [])
+
+    entry_ids, sub_ids = LTISyncQueue.peek(session, 1)
+    assert sub_ids == [subs[0].id, subs[1].id]
+    assert len(entry_ids) == 3
+    assert LTISyncQueue.pending_attempts(session, 1) == 0
+
+    # failed entries are kept until they failed max_attempts times
+    LTISyncQueue.record_failure(session, entry_ids[:2])
+    assert LTISyncQueue.pending_attempts(session, 1) == 0
+    assert LTISyncQueue.drop_exhausted(session, 1, max_attempts=1) == [subs[0].id, subs[1].id]
+    assert LTISyncQueue.peek(session, 1) == (entry_ids[2:], [subs[0].id])
+
+    # entries are only removed explicitly, e.g. after a successful sync
+    LTISyncQueue.remove(session, entry_ids)
+    assert LTISyncQueue.pending_attempts(session, 1) is None
+    assert LTISyncQueue.pending_attempts(session, 2) == 0
+    assert LTISyncQueue.peek(session, 1) == ([], [])
+    session.close()
+
+
+def test_lti_sync_batch(sql_alchemy_sessionmaker):
+    session = sql_alchemy_sessionmaker()
+
+    # a batch is only scheduled once until it ran
+    assert LTISyncBatch.schedule(session, 1, 30) is True
+    assert LTISyncBatch.schedule(session, 1, 30) is False
+    assert LTISyncBatch.schedule(session, 2, 30) is True
+    LTISyncBatch.release(session, 1)
+    assert LTISyncBatch.schedule(session, 1, 30) is True
+
+    # a batch that did not run long after it was due is scheduled again
+    LTISyncBatch.release(session, 1)
+    assert LTISyncBatch.schedule(session, 1, -LTISyncBatch.timeout.total_seconds() - 1)
+    assert LTISyncBatch.schedule(session, 1, 30) is True
+    session.close()
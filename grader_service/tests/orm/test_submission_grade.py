@@ -0,0 +1,23 @@
+# Copyright (c) 2022, TU Wien
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+from grader_service.convert.gradebook.models import GradeBookModel
+from grader_service.orm import SubmissionGrade
+from grader_service.tests.handlers.db_util import get_gradebook_dict, insert_submission
+
+
+def test_submission_grades_are_replaced(sql_alchemy_sessionmaker):
+    session = sql_alchemy_sessionmaker()
+    engine = session.get_bind()
+    sub = insert_submission(engine, 1, "ubuntu", 1)
+
+    for auto_score in [0.0, 2.0]:
+        gradebook = GradeBookModel.from_dict(get_gradebook_dict(auto_score=auto_score))
+        SubmissionGrade.replace(session, sub.id, gradebook)
+        session.commit()
+
+    grades = session.query(SubmissionGrade).filter(SubmissionGrade.sub_id == sub.id).all()
+    assert [(g.cell_id, g.auto_score, g.failed_tests) for g in grades] == [("cell1", 2.0, False)]
+    session.close()
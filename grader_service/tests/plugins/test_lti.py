@@ -0,0 +1,397 @@
+# Copyright (c) 2022, TU Wien
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+import asyncio
+import io
+import json
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from tornado.httpclient import HTTPClientError, HTTPRequest, HTTPResponse
+from tornado.httputil import HTTPHeaders
+
+from grader_service.plugins.lti import (
+    LTISyncGrades,
+    LTITokenCache,
+    container_cache,
+    next_page_url,
+    token_cache,
+)
+
+SCORES_URL = "https://platform.example.com/lineitems/1/scores"
+
+
+@pytest.fixture
+def lti_plugin():
+    token_cache.clear()
+    container_cache.clear()
+    plugin = LTISyncGrades(retry_backoff=0.0, token_url="https://platform.example.com/token")
+    plugin.username_match = lambda member, submission, log: (
+        member["name"] == submission["user"]["name"]
+    )
+    plugin.request_token_response = AsyncMock(return_value={"access_token": "token"})
+    return plugin
+
+
+def _members(n):
+    return [{"user_id": f"lti-{i}", "name": f"user{i}"} for i in range(n)]
+
+
+def _submissions(n):
+    return [{"user": {"name": f"user{i}"}, "score": float(i)} for i in range(n)]
+
+
+def _buffer(body):
+    return io.BytesIO(json.dumps(body).encode())
+
+
+def _error(request, code, headers=None):
+    response = HTTPResponse(request, code, headers=headers)
+    return HTTPClientError(code, response=response)
+
+
+def test_match_members_with_username_match(lti_plugin):
+    matches = lti_plugin.match_members(_members(3), _submissions(4))
+    assert [(s["user"]["name"], m["user_id"]) for s, m in matches] == [
+        ("user0", "lti-0"),
+        ("user1", "lti-1"),
+        ("user2", "lti-2"),
+    ]
+
+
+def test_match_members_with_index(lti_plugin):
+    lti_plugin.username_match = None
+    lti_plugin.member_key = lambda member: member["name"]
+    lti_plugin.submission_key = lambda submission: submission["user"]["name"]
+    members, submissions = _members(500), _submissions(1000)
+
+    matches = lti_plugin.match_members(members, submissions)
+    assert len(matches) == 500
+    assert all(m["name"] == s["user"]["name"] for s, m in matches)
+
+
+async def test_publish_grades_bounds_concurrency(lti_plugin):
+    lti_plugin.max_concurrent_requests = 3
+    in_flight = 0
+    max_in_flight = 0
+
+    async def fetch(request):
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return HTTPResponse(request, 200)
+
+    grades = [lti_plugin.build_grade_publish_body(f"lti-{i}", i, 10.0) for i in range(10)]
+    with patch("grader_service.plugins.lti.AsyncHTTPClient.fetch", side_effect=fetch) as f:
+        failed = await lti_plugin.publish_grades(SCORES_URL, grades)
+
+    assert failed == []
+    assert f.call_count == 10
+    assert max_in_flight == 3
+
+
+async def test_publish_grades_retries_transient_errors(lti_plugin):
+    attempts = {}
+
+    async def fetch(request):
+        user_id = json.loads(request.body)["userId"]
+        attempts[user_id] = attempts.get(user_id, 0) + 1
+        if user_id == "lti-0" and attempts[user_id] == 1:
+            raise _error(request, 429, headers={"Retry-After": "0"})
+        if user_id == "lti-1" and attempts[user_id] < 3:
+            raise _error(request, 503)
+        if user_id == "lti-2":
+            raise _error(request, 400)
+        if user_id == "lti-3":
+            raise _error(request, 500)
+        if user_id == "lti-5" and attempts[user_id] < 2:
+            raise ConnectionResetError()
+        if user_id == "lti-6":
+            raise ConnectionRefusedError()
+        return HTTPResponse(request, 200)
+
+    grades = [lti_plugin.build_grade_publish_body(f"lti-{i}", i, 10.0) for i in range(7)]
+    with patch("grader_service.plugins.lti.AsyncHTTPClient.fetch", side_effect=fetch):
+        failed = await lti_plugin.publish_grades(SCORES_URL, grades)
+
+    assert attempts == {
+        "lti-0": 2,
+        "lti-1": 3,
+        "lti-2": 1,
+        "lti-3": 4,
+        "lti-4": 1,
+        "lti-5": 2,
+        "lti-6": 4,
+    }
+    assert [(f["user_id"], f["status"]) for f in failed] == [
+        ("lti-2", 400),
+        ("lti-3", 500),
+        ("lti-6", None),
+    ]
+
+
+async def test_start_reports_failed_users(lti_plugin):
+    lti_plugin.resolve_lti_urls = lambda lecture, assignment, submissions: {
+        "lineitems_url": "https://platform.example.com/lineitems",
+        "membership_url": "https://platform.example.com/memberships",
+    }
+
+    async def fetch(request):
+        if request.url.endswith("/memberships"):
+            return HTTPResponse(request, 200, buffer=_buffer({"members": _members(3)}))
+        if request.url.endswith("/lineitems"):
+            lineitems = [{"id": "https://platform.example.com/lineitems/1", "label": "a1"}]
+            return HTTPResponse(request, 200, buffer=_buffer(lineitems))
+        assert request.url == SCORES_URL
+        if json.loads(request.body)["userId"] == "lti-1":
+            raise _error(request, 403)
+        return HTTPResponse(request, 200)
+
+    async def token():
+        return {"access_token": "token", "expires_in": 3600}
+
+    assignment = {"id": 1, "name": "a1", "points": 10}
+    with (
+        patch("grader_service.plugins.lti.AsyncHTTPClient.fetch", side_effect=fetch),
+        patch.object(lti_plugin, "request_token_response", side_effect=token),
+    ):
+        result = await lti_plugin.start({}, assignment, _submissions(3))
+
+    assert result["syncable_users"] == 3
+    assert result["synced_user"] == 2
+    assert [(f["user_id"], f["status"]) for f in result["failed_users"]] == [("lti-1", 403)]
+
+
+async def test_token_cache_single_flight():
+    cache = LTITokenCache()
+    key = ("https://platform.example.com/token", "client", ("scope",))
+    requests = 0
+
+    async def request_token():
+        nonlocal requests
+        requests += 1
+        await asyncio.sleep(0.01)
+        return {"access_token": f"token-{requests}", "expires_in": 3600}
+
+    tokens = await asyncio.gather(*[cache.get(key, request_token) for _ in range(10)])
+    assert tokens == ["token-1"] * 10
+    assert await cache.get(key, request_token) == "token-1"
+    assert requests == 1
+
+
+async def test_token_cache_honours_expires_in():
+    cache = LTITokenCache()
+    key = ("https://platform.example.com/token", "client", ("scope",))
+    lifetimes = iter([30, 3600])
+
+    async def request_token():
+        return {"access_token": "token", "expires_in": next(lifetimes)}
+
+    await cache.get(key, request_token, expiry_margin=60)
+    # the first token expires within the margin and is requested again
+    await cache.get(key, request_token, expiry_margin=60)
+    await cache.get(key, request_token, expiry_margin=60)
+    with pytest.raises(StopIteration):
+        next(lifetimes)
+
+
+async def test_request_bearer_token_returns_access_token(lti_plugin):
+    assert await lti_plugin.request_bearer_token() == "token"
+
+
+async def test_overridden_request_bearer_token_is_cached(lti_plugin):
+    class CustomTokenSync(LTISyncGrades):
+        requests = 0
+
+        async def request_bearer_token(self) -> str:
+            self.requests += 1
+            return "custom"
+
+    plugin = CustomTokenSync(token_url="https://custom.example.com/token")
+    assert await plugin.access_token() == "custom"
+    assert await plugin.access_token() == "custom"
+    assert plugin.requests == 1
+
+
+async def test_token_cache_is_keyed_by_platform():
+    cache = LTITokenCache()
+    counter = 0
+
+    async def request_token():
+        nonlocal counter
+        counter += 1
+        return {"access_token": f"token-{counter}"}
+
+    first = await cache.get(("https://a.example.com", "client", ("scope",)), request_token)
+    second = await cache.get(("https://b.example.com", "client", ("scope",)), request_token)
+    other_scopes = await cache.get(("https://a.example.com", "client", ()), request_token)
+    assert len({first, second, other_scopes}) == 3
+    assert await cache.get(("https://a.example.com", "client", ("scope",)), request_token) == first
+
+
+def test_token_cache_across_event_loops():
+    cache = LTITokenCache()
+    key = ("https://platform.example.com/token", "client", ("scope",))
+    requests = 0
+
+    async def request_token():
+        nonlocal requests
+        requests += 1
+        await asyncio.sleep(0)
+        return {"access_token": "token"}
+
+    async def get_concurrently():
+        await asyncio.gather(cache.get(key, request_token), cache.get(key, request_token))
+
+    # every celery task runs the sync in a new event loop
+    asyncio.run(get_concurrently())
+    cache.invalidate(key)
+    asyncio.run(get_concurrently())
+    assert requests == 2
+
+
+MEMBERSHIP_URL = "https://platform.example.com/memberships"
+NRPS = "application/vnd.ims.lti-nrps.v2.membershipcontainer+json"
+
+
+def _fetch_members(lti_plugin):
+    return lti_plugin.fetch_container(
+        MEMBERSHIP_URL, accept=NRPS, get_items=lambda body: body["members"]
+    )
+
+
+def test_next_page_url():
+    request = HTTPRequest(MEMBERSHIP_URL)
+    link = '<https://platform.example.com/first>; rel="first", </memberships?page=2>; rel="next"'
+    response = HTTPResponse(request, 200, headers=HTTPHeaders({"Link": link}))
+    assert next_page_url(response) == "https://platform.example.com/memberships?page=2"
+    assert next_page_url(HTTPResponse(request, 200, headers=HTTPHeaders())) is None
+
+
+async def test_fetch_container_follows_pages(lti_plugin):
+    members = _members(5)
+
+    async def fetch(request):
+        page = int(request.url.split("page=")[1]) if "page=" in request.url else 0
+        headers = HTTPHeaders({"ETag": '"v1"'})
+        if page < 2:
+            headers.add("Link", f'<{MEMBERSHIP_URL}?page={page + 1}>; rel="next"')
+        body = {"members": members[page * 2 : page * 2 + 2]}
+        return HTTPResponse(request, 200, headers=headers, buffer=_buffer(body))
+
+    with patch("grader_service.plugins.lti.AsyncHTTPClient.fetch", side_effect=fetch) as f:
+        assert await _fetch_members(lti_plugin) == members
+        # the cached container is reused within the ttl
+        assert await _fetch_members(lti_plugin) == members
+    assert f.call_count == 3
+    # the etag of the first page does not cover the other pages
+    assert container_cache.get(MEMBERSHIP_URL)[1] is None
+
+
+async def test_fetch_container_revalidates_with_etag(lti_plugin):
+    lti_plugin.container_cache_ttl = 0
+    members = _members(3)
+    if_none_match = []
+
+    async def fetch(request):
+        if_none_match.append(request.headers.get("If-None-Match"))
+        if request.headers.get("If-None-Match") == '"v1"':
+            raise _error(request, 304)
+        headers = HTTPHeaders({"ETag": '"v1"'})
+        return HTTPResponse(request, 200, headers=headers, buffer=_buffer({"members": members}))
+
+    with patch("grader_service.plugins.lti.AsyncHTTPClient.fetch", side_effect=fetch):
+        assert await _fetch_members(lti_plugin) == members
+        assert await _fetch_members(lti_plugin) == members
+    assert if_none_match == [None, '"v1"']
+
+
+async def test_fetch_container_unexpected_not_modified(lti_plugin):
+    members = _members(2)
+    requests = []
+
+    async def fetch(request):
+        requests.append(dict(request.headers))
+        # e.g. a proxy answering with its own cache
+        if "Cache-Control" not in request.headers:
+            raise _error(request, 304)
+        return HTTPResponse(request, 200, buffer=_buffer({"members": members}))
+
+    with patch("grader_service.plugins.lti.AsyncHTTPClient.fetch", side_effect=fetch):
+        assert await _fetch_members(lti_plugin) == members
+    assert len(requests) == 2
+    assert all("If-None-Match" not in headers for headers in requests)
+    assert container_cache.get(MEMBERSHIP_URL)[2] == members
+
+
+async def test_created_lineitem_invalidates_cache(lti_plugin):
+    lti_plugin.resolve_lti_urls = lambda lecture, assignment, submissions: {
+        "lineitems_url": "https://platform.example.com/lineitems",
+        "membership_url": MEMBERSHIP_URL,
+    }
+    lineitems = []
+
+    async def fetch(request):
+        if request.url == MEMBERSHIP_URL:
+            return HTTPResponse(request, 200, buffer=_buffer({"members": _members(1)}))
+        if request.url.endswith("/lineitems") and request.method == "GET":
+            return HTTPResponse(request, 200, buffer=_buffer(lineitems))
+        if request.url.endswith("/lineitems"):
+            lineitem = {"id": f"https://platform.example.com/lineitems/{len(lineitems)}"}
+            lineitem["label"] = json.loads(request.body)["label"]
+            lineitems.append(lineitem)
+            return HTTPResponse(request, 200, buffer=_buffer(lineitem))
+        return HTTPResponse(request, 200)
+
+    async def token():
+        return {"access_token": "token"}
+
+    with (
+        patch("grader_service.plugins.lti.AsyncHTTPClient.fetch", side_effect=fetch) as f,
+        patch.object(lti_plugin, "request_token_response", side_effect=token),
+    ):
+        for _ in range(2):
+            await lti_plugin.start({}, {"id": 1, "name": "a1", "points": 10}, _submissions(1))
+
+    methods = [(call.args[0].method, call.args[0].url.rsplit("/", 1)[1]) for call in f.mock_calls]
+    assert methods == [
+        ("GET", "memberships"),
+        ("GET", "lineitems"),
+        ("POST", "lineitems"),
+        ("POST", "scores"),
+        # the membership is cached, the line items were invalidated by the POST
+        ("GET", "lineitems"),
+        ("POST", "scores"),
+    ]
+    assert len(lineitems) == 1
+
+
+async def test_rejected_token_is_renewed_once(lti_plugin):
+    lti_plugin.request_token_response.side_effect = [
+        {"access_token": "revoked"},
+        {"access_token": "renewed"},
+        {"access_token": "unused"},
+    ]
+    authorization = []
+
+    async def fetch(request):
+        authorization.append(request.headers["Authorization"])
+        if request.headers["Authorization"] == "Bearer revoked":
+            raise _error(request, 401)
+        if request.url == SCORES_URL and json.loads(request.body)["userId"] == "lti-1":
+            raise _error(request, 401)
+        return HTTPResponse(request, 200, buffer=_buffer({"members": _members(1)}))
+
+    with patch("grader_service.plugins.lti.AsyncHTTPClient.fetch", side_effect=fetch):
+        assert await _fetch_members(lti_plugin) == _members(1)
+        grades = [lti_plugin.build_grade_publish_body(f"lti-{i}", i, 10.0) for i in range(3)]
+        failed = await lti_plugin.publish_grades(SCORES_URL, grades)
+
+    assert authorization[:2] == ["Bearer revoked", "Bearer renewed"]
+    # a request is only retried once, the score of lti-1 is rejected with both tokens
+    assert [(f["user_id"], f["status"]) for f in failed] == [("lti-1", 401)]
+    assert lti_plugin.request_token_response.await_count == 3
@@ -0,0 +1,185 @@
+# Copyright (c) 2022, TU Wien
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+import os
+import secrets
+import subprocess
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from grader_service.git_maintenance import (
+    STAMP_FILE,
+    GitMaintenance,
+    Repo,
+    count_objects,
+    iter_repos,
+)
+from grader_service.handlers.handler_utils import GitRepoType
+from grader_service.orm import SubmissionLogs, SubmissionProperties
+from grader_service.orm.base import DeleteState
+
+from .handlers.db_util import insert_submission
+
+
+def _git(*args, cwd=None) -> str:
+    return subprocess.run(
+        ["git", *args], cwd=cwd, check=True, capture_output=True, text=True
+    ).stdout
+
+
+def _init_repo(gitbase, *path) -> str:
+    repo_path = str(gitbase.joinpath("21wle1", "1", *path))
+    _git("init", "--bare", repo_path)
+    return repo_path
+
+
+def _push_commits(tmp_path, repo_path, n: int, *refspecs: str) -> None:
+    work = tmp_path / "work"
+    if not work.exists():
+        _git("init", "-b", "main", str(work))
+    for i in range(n):
+        (work / f"{secrets.token_hex(4)}.py").write_text(f"print({i})")
+        _git("add", "-A", cwd=work)
+        _git("commit", "-qm", f"commit {i}", cwd=work)
+        _git("push", "-q", repo_path, *(refspecs or ["main"]), cwd=work)
+
+
+@pytest.fixture
+def gitbase(tmp_path):
+    return tmp_path / "git"
+
+
+def test_iter_repos(gitbase):
+    source = _init_repo(gitbase, "source")
+    release = _init_repo(gitbase, "release")
+    user = _init_repo(gitbase, "user", "student")
+    autograde = _init_repo(gitbase, "autograde", "user", "student")
+    edit = _init_repo(gitbase, "edit", "3")
+    os.makedirs(gitbase / "21wle1" / "1" / "feedback" / "user" / "empty")
+
+    assert sorted(iter_repos(str(gitbase))) == sorted(
+        [
+            Repo(source, GitRepoType.SOURCE, "1"),
+            Repo(release, GitRepoType.RELEASE, "1"),
+            Repo(user, GitRepoType.USER, "1", "student"),
+            Repo(autograde, GitRepoType.AUTOGRADE, "1", "student"),
+            Repo(edit, GitRepoType.EDIT, "1", "3"),
+        ]
+    )
+
+
+def _delete_submission(session, submission, days_ago: int) -> None:
+    submission = session.merge(submission)
+    submission.deleted = DeleteState.deleted
+    submission.updated_at = datetime.now(tz=timezone.utc) - timedelta(days=days_ago)
+    session.commit()
+
+
+def test_maintain_prunes_branches_of_deleted_submissions(
+    gitbase, tmp_path, sql_alchemy_sessionmaker
+):
+    engine = sql_alchemy_sessionmaker().get_bind()
+    session = sql_alchemy_sessionmaker()
+    active, recent, old = [
+        insert_submission(engine, commit_hash=secrets.token_hex(20)) for _ in range(3)
+    ]
+    _delete_submission(session, recent, days_ago=1)
+    _delete_submission(session, old, days_ago=31)
+
+    repo_path = _init_repo(gitbase, "autograde", "user", "ubuntu")
+    unknown = secrets.token_hex(20)
+    hashes = [active.commit_hash, recent.commit_hash, old.commit_hash, unknown]
+    branches = [f"submission_{h}" for h in hashes]
+    _push_commits(tmp_path, repo_path, 1, *[f"main:{b}" for b in branches], "main:main")
+
+    maintenance = GitMaintenance(session=session, pause=0)
+    report = maintenance.maintain(Repo(repo_path, GitRepoType.AUTOGRADE, "1", "ubuntu"))
+
+    assert sorted(report.pruned_branches) == sorted([f"refs/heads/{b}" for b in branches[2:]])
+    assert report.maintained
+    refs = _git("for-each-ref", "--format=%(refname)", cwd=repo_path).split()
+    assert refs == sorted(["refs/heads/main"] + [f"refs/heads/{b}" for b in branches[:2]])
+    assert os.path.exists(os.path.join(repo_path, STAMP_FILE))
+
+
+def test_collect_deleted_submissions(gitbase, sql_alchemy_sessionmaker):
+    engine = sql_alchemy_sessionmaker().get_bind()
+    session = sql_alchemy_sessionmaker()
+    active, recent, old = [insert_submission(engine) for _ in range(3)]
+    _delete_submission(session, recent, days_ago=1)
+    _delete_submission(session, old, days_ago=31)
+    session.add(SubmissionLogs(sub_id=old.id, logs="logs"))
+    session.commit()
+    edit_repos = [_init_repo(gitbase, "edit", str(s.id)) for s in [active, recent, old]]
+    user_repo = _init_repo(gitbase, "user", "ubuntu")
+    _push_commits(gitbase.parent, user_repo, 1)
+    for s in [active, recent, old]:
+        _git("update-ref", f"refs/edit/{s.id}", "main", cwd=user_repo)
+
+    maintenance = GitMaintenance(session=session, pause=0)
+    assert maintenance.collect_deleted_submissions(str(gitbase), dry_run=True) == [old.id]
+    assert os.path.exists(edit_repos[2])
+
+    assert maintenance.collect_deleted_submissions(str(gitbase)) == [old.id]
+    assert [os.path.exists(path) for path in edit_repos] == [True, True, False]
+    refs = _git("for-each-ref", "--format=%(refname)", "refs/edit/", cwd=user_repo).split()
+    assert refs == sorted(f"refs/edit/{s.id}" for s in [active, recent])
+    remaining = {sub_id for (sub_id,) in session.query(SubmissionProperties.sub_id)}
+    assert remaining == {active.id, recent.id}
+    assert session.query(SubmissionLogs).count() == 0
+    assert maintenance.collect_deleted_submissions(str(gitbase)) == []
+
+
+def test_maintain_packs_loose_objects(gitbase, tmp_path):
+    repo_path = _init_repo(gitbase, "source")
+    _push_commits(tmp_path, repo_path, 3)
+    repo = Repo(repo_path, GitRepoType.SOURCE, "1")
+
+    maintenance = GitMaintenance(loose_objects_threshold=1, pause=0)
+    report = maintenance.maintain(repo, dry_run=True)
+    assert not report.maintained
+    assert count_objects(repo_path)["packs"] == 0
+
+    report = maintenance.maintain(repo)
+    assert report.maintained
+    stats = count_objects(repo_path)
+    assert (stats["count"], stats["packs"], stats["in-pack"]) == (0, 1, 9)
+    assert os.path.exists(os.path.join(repo_path, "objects", "info", "commit-graphs"))
+    _git("fsck", "--strict", cwd=repo_path)
+
+
+def test_maintain_repacks_many_packs_with_bitmap(gitbase, tmp_path):
+    repo_path = _init_repo(gitbase, "source")
+    for _ in range(3):
+        _push_commits(tmp_path, repo_path, 1)
+        _git("repack", "-q", cwd=repo_path)
+
+    maintenance = GitMaintenance(pack_threshold=3, pause=0)
+    report = maintenance.maintain(Repo(repo_path, GitRepoType.SOURCE, "1"))
+
+    assert report.maintained
+    assert count_objects(repo_path)["packs"] == 1
+    pack_files = os.listdir(os.path.join(repo_path, "objects", "pack"))
+    assert any(f.endswith(".bitmap") for f in pack_files)
+    _git("fsck", "--strict", cwd=repo_path)
+
+
+def test_run_starts_with_least_recently_maintained(gitbase, tmp_path):
+    source = _init_repo(gitbase, "source")
+    release = _init_repo(gitbase, "release")
+    with open(os.path.join(source, STAMP_FILE), "w"):
+        pass
+
+    maintenance = GitMaintenance(pause=0)
+    reports = maintenance.run(str(gitbase))
+    assert [report.path for report in reports] == [release, source]
+
+    # the duration is checked before every repository
+    os.utime(os.path.join(release, STAMP_FILE), (0, 1))
+    maintenance.max_duration = 1
+    maintenance.pause = 1
+    reports = maintenance.run(str(gitbase))
+    assert [report.path for report in reports] == [release]
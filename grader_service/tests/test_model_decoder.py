@@ -0,0 +1,116 @@
+# Copyright (c) 2022, TU Wien
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+import time
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+import pytest
+
+from grader_service import model_decoder
+from grader_service.api import util
+from grader_service.api.models import AssignmentDetail, AssignmentSettings, Lecture, Submission
+
+
+@pytest.fixture(autouse=True)
+def compiled_decoders():
+    model_decoder.install()
+
+
+def _deserialize_reflective(data, klass):
+    # nested models are decoded by util.deserialize_model as well
+    with patch.object(util, "deserialize_model", model_decoder.deserialize_model_reflective):
+        return util.deserialize_model(data, klass)
+
+
+def _assignment_detail_dict():
+    return {
+        "id": 1,
+        "name": "assignment",
+        "status": "released",
+        "points": "10.5",
+        "settings": {
+            "deadline": datetime(2024, 1, 1, 12, tzinfo=timezone.utc).isoformat(),
+            "max_submissions": 3,
+            "allowed_files": ["*.py"],
+            "late_submission": [{"period": "P1D", "scaling": 0.5}],
+            "autograde_type": "full_auto",
+        },
+        "submissions": [
+            {
+                "id": i,
+                "submitted_at": "2024-01-01T12:00:00.000",
+                "auto_status": "automatically_graded",
+                "user_id": 1,
+                "score": i,
+                "edited": False,
+            }
+            for i in range(3)
+        ],
+    }
+
+
+@pytest.mark.parametrize(
+    "klass,data",
+    [
+        (AssignmentDetail, _assignment_detail_dict()),
+        (AssignmentSettings, _assignment_detail_dict()["settings"]),
+        (AssignmentSettings, {"deadline": "1 January 2024", "late_submission": None}),
+        (AssignmentSettings, {}),
+        (AssignmentSettings, None),
+        (Lecture, {"id": "3", "name": "lecture", "complete": True, "unknown": 1}),
+        (Submission, {"auto_status": None}),
+    ],
+)
+def test_compiled_decoder_matches_reflective(klass, data):
+    assert model_decoder.deserialize_model(data, klass) == _deserialize_reflective(data, klass)
+
+
+def test_compiled_decoder_is_cached():
+    Lecture.from_dict({})
+    decoder = model_decoder._model_decoders[Lecture]
+    Lecture.from_dict({})
+    assert model_decoder._model_decoders[Lecture] is decoder
+
+
+def test_compiled_decoder_converts_types():
+    detail = AssignmentDetail.from_dict(_assignment_detail_dict())
+    assert detail.points == 10.5
+    assert detail.settings.deadline == datetime(2024, 1, 1, 12, tzinfo=timezone.utc)
+    assert detail.settings.late_submission[0].scaling == 0.5
+    assert [s.id for s in detail.submissions] == [0, 1, 2]
+    assert detail.submissions[0].score == 0.0
+
+
+def test_compiled_decoder_validates_values():
+    with pytest.raises(ValueError):
+        AssignmentSettings.from_dict({"autograde_type": "invalid"})
+
+
+def test_deserialize_model_matches_reflective():
+    data = [_assignment_detail_dict() for _ in range(200)]
+
+    reference = [_deserialize_reflective(d, AssignmentDetail) for d in data]
+    compiled = [AssignmentDetail.from_dict(d) for d in data]
+    assert compiled == reference
+
+
+@pytest.mark.benchmark
+def test_deserialize_model_benchmark():
+    data = [_assignment_detail_dict() for _ in range(2_000)]
+
+    start = time.perf_counter()
+    reference = [_deserialize_reflective(d, AssignmentDetail) for d in data]
+    reflective_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    compiled = [AssignmentDetail.from_dict(d) for d in data]
+    compiled_time = time.perf_counter() - start
+
+    print(
+        f"deserialized 2k assignments: reflective {reflective_time:.3f}s, "
+        f"compiled {compiled_time:.3f}s"
+    )
+    assert compiled == reference
@@ -0,0 +1,73 @@
+# Copyright (c) 2022, TU Wien
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+import asyncio
+import subprocess
+import sys
+import time
+from unittest.mock import patch
+
+import pytest
+
+from grader_service.process import ProcessRunner
+
+
+@pytest.fixture
+def runner():
+    return ProcessRunner(max_concurrent=2, timeout=10)
+
+
+async def test_run_returns_output(runner):
+    result = await runner.run(
+        [sys.executable, "-c", "import sys; print(sys.stdin.read().upper())"], input=b"abc"
+    )
+    assert result.returncode == 0
+    assert result.stdout == b"ABC\n"
+
+
+async def test_run_raises_on_failure(runner):
+    args = [sys.executable, "-c", "import sys; sys.exit('failed')"]
+    with pytest.raises(subprocess.CalledProcessError) as e:
+        await runner.run(args)
+    assert e.value.stderr == b"failed\n"
+
+    result = await runner.run(args, check=False)
+    assert result.returncode == 1
+
+
+async def test_run_kills_process_after_timeout(runner):
+    start = time.monotonic()
+    with pytest.raises(subprocess.TimeoutExpired):
+        await runner.run([sys.executable, "-c", "import time; time.sleep(10)"], timeout=0.2)
+    assert time.monotonic() - start < 5
+
+
+async def test_run_limits_concurrent_processes(runner):
+    running = 0
+    max_running = 0
+    create_subprocess_exec = asyncio.create_subprocess_exec
+
+    async def start(*args, **kwargs):
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        process = await create_subprocess_exec(*args, **kwargs)
+        communicate = process.communicate
+
+        async def finish(*a):
+            nonlocal running
+            try:
+                return await communicate(*a)
+            finally:
+                running -= 1
+
+        process.communicate = finish
+        return process
+
+    with patch("asyncio.create_subprocess_exec", side_effect=start):
+        await asyncio.gather(
+            *[runner.run([sys.executable, "-c", "import time; time.sleep(0.1)"]) for _ in range(6)]
+        )
+    assert max_running == 2
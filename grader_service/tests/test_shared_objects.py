@@ -0,0 +1,107 @@
+# Copyright (c) 2022, TU Wien
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+import os
+import subprocess
+
+import pytest
+
+from grader_service.shared_objects import (
+    get_alternates,
+    iter_borrowing_repos,
+    migrate,
+    share_objects,
+)
+
+
+def _git(*args, cwd=None, check=True) -> str:
+    return subprocess.run(
+        ["git", *args], cwd=cwd, check=check, capture_output=True, text=True
+    ).stdout
+
+
+def _local_objects(repo_path) -> int:
+    counts = dict(
+        line.split(": ") for line in _git("count-objects", "-v", cwd=repo_path).splitlines()
+    )
+    return int(counts["count"]) + int(counts["in-pack"])
+
+
+@pytest.fixture
+def gitbase(tmp_path):
+    """Git directory with a release repository containing one commit."""
+    gitbase = tmp_path / "git"
+    assignment = gitbase / "lecture" / "1"
+    _git("init", "--bare", str(assignment / "release"))
+    work = tmp_path / "work"
+    _git("init", "-b", "main", str(work))
+    (work / "data.csv").write_text("x," * 10_000)
+    (work / "assignment.ipynb").write_text("{}")
+    _git("add", "-A", cwd=work)
+    _git("commit", "-qm", "release", cwd=work)
+    _git("push", str(assignment / "release"), "main", cwd=work)
+    return gitbase
+
+
+def _init_repo(gitbase, *path) -> str:
+    repo_path = str(gitbase.joinpath("lecture", "1", *path))
+    _git("init", "--bare", repo_path)
+    return repo_path
+
+
+def test_share_objects(gitbase):
+    release = str(gitbase / "lecture" / "1" / "release")
+    user_repo = _init_repo(gitbase, "user", "student")
+
+    assert share_objects(user_repo, release) is True
+    assert share_objects(user_repo, release) is False
+    assert get_alternates(user_repo) == [os.path.join(release, "objects")]
+    # the alternate is relative to the repository
+    with open(os.path.join(user_repo, "objects", "info", "alternates")) as f:
+        assert not os.path.isabs(f.read().strip())
+    assert _git("config", "gc.pruneExpire", cwd=release).strip() == "never"
+
+    # the release commit is available without copying its objects
+    _git("push", user_repo, "main", cwd=release)
+    assert _local_objects(user_repo) == 0
+    assert _git("show", "main:assignment.ipynb", cwd=user_repo) == "{}"
+
+
+def test_share_objects_keeps_pruning(gitbase):
+    release = str(gitbase / "lecture" / "1" / "release")
+    edit_repo = _init_repo(gitbase, "edit", "1")
+
+    assert share_objects(edit_repo, release, never_prune=False) is True
+    assert get_alternates(edit_repo) == [os.path.join(release, "objects")]
+    assert not _git("config", "--get-all", "gc.pruneExpire", cwd=release, check=False)
+
+
+def test_share_objects_without_release(gitbase, tmp_path):
+    user_repo = _init_repo(gitbase, "user", "student")
+    assert share_objects(user_repo, str(tmp_path / "missing")) is False
+    assert get_alternates(user_repo) == []
+
+
+def test_migrate(gitbase):
+    release = str(gitbase / "lecture" / "1" / "release")
+    repos = [
+        _init_repo(gitbase, "user", "student"),
+        _init_repo(gitbase, "autograde", "user", "student"),
+        _init_repo(gitbase, "feedback", "user", "student"),
+        _init_repo(gitbase, "edit", "3"),
+    ]
+    assert sorted(repo for repo, _ in iter_borrowing_repos(str(gitbase))) == sorted(repos)
+    for repo in repos:
+        _git("push", repo, "main", cwd=release)
+        assert _local_objects(repo) > 0
+    # objects can be loose or packed
+    _git("repack", "-a", "-d", cwd=repos[0])
+
+    assert migrate(str(gitbase)) == 4
+    for repo in repos:
+        assert _local_objects(repo) == 0
+        _git("fsck", "--connectivity-only", cwd=repo)
+        assert _git("show", "main:assignment.ipynb", cwd=repo) == "{}"
+    assert migrate(str(gitbase)) == 0